@@ -0,0 +1,388 @@
+from __future__ import print_function
+
+# Copyright (c) 2014, Roger Lew [see LICENSE.txt]
+#
+# The project described was supported by NSF award number IIA-1301792
+# from the NSF Idaho EPSCoR Program and by the National Science Foundation.
+
+'''
+HTTP front end for the elevation Server.
+
+Elevations are served as JSON in the layout of Google's Elevation API so
+clients of that API (and testdata/validation_elevations.txt) can use it as
+a drop in local replacement.
+
+  GET  /elevations?locations=-116.7458,48.0810 -116.5376,47.9406&method=cubic
+
+  POST /elevations
+       body: the same coordinate string, or JSON: a list of coordinates
+       ([[lng, lat], ...] or ["lng,lat", ...]) or
+       {"locations": <coordinates>, "method": "cubic"}
+
+  GET  /profile?path=-116.7458,48.0810 -116.5376,47.9406&spacing=10
+
+  POST /profile
+       body: the path as above or {"path": <coordinates>, "spacing": 10}
+
+Coordinates are lng,lat pairs in any format Server.getElevations accepts,
+in the coordinate system of the DEMs or in the one of the EPSG code given
+with an epsg parameter (e.g. &epsg=26911 for UTM 11N x,y pairs).
+The response is
+
+  {"status": "OK",
+   "results": [{"elevation": 824.26, "location": {"lat": 48.081, "lng": -116.7458}},
+               ...]}
+
+Elevations that can't be interpolated (e.g. on the edge of a DEM) are
+null. Requests with points outside every DEM (or an unknown EPSG code)
+are answered with status INVALID_REQUEST (400). Failures reading the DEMs
+are answered with status UNKNOWN_ERROR (500) and their error_message.
+
+Profiles (see Server.getProfile) sample the path every spacing meters
+(10 by default) and answer with a result per sample:
+
+  {"elevation": 824.26, "location": {"lat": 48.081, "lng": -116.7458},
+   "distance": 10.0, "slope": 0.031, "gain": 2.4, "loss": 0.0}
+
+Points of a profile outside the DEMs have null elevations.
+
+Concurrent requests are coalesced: the points of all requests that arrive
+within a couple of milliseconds are answered by a single vectorized
+Server.getElevations call per interpolation method. Several worker
+processes can share the listening socket (-w), each with its own Server,
+and each process can sample batches from several threads (-t).
+Combine with --memmap so the workers share one copy of the DEMs.
+
+  python elevationServer.py --port 8080 --workers 4 --memmap /var/cache/ned10m
+  python elevationServer.py --port 8080 --threads 8
+'''
+
+# standard library
+import argparse
+import json
+import os
+import signal
+import threading
+import time
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+    import Queue as queue
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+    import queue
+
+from elevationService import Server, parseCoordinates
+
+# requests are coalesced for at most COALESCE_WAIT seconds or until
+# COALESCE_POINTS points are queued
+COALESCE_WAIT = 0.002
+COALESCE_POINTS = 100000
+
+class Coalescer:
+    """
+    Answers the elevation requests of many threads with as few
+    Server.getElevations calls as possible. Requests queued while a batch
+    is being answered are answered together by the next batch.
+
+    Batches are answered by threads threads. Each thread reads the DEMs
+    through its own GDAL handles so batches are sampled concurrently.
+    """
+    def __init__(self, server, wait=COALESCE_WAIT, max_points=COALESCE_POINTS,
+                 threads=1):
+        self.server = server
+        self.wait = wait
+        self.max_points = max_points
+        self.queue = queue.Queue()
+
+        self.threads = []
+        for i in range(max(1, threads)):
+            thread = threading.Thread(target=self._run)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def getElevations(self, coordinates, method='bilinear', epsg=None):
+        """
+        blocks until the elevations of the parsed coordinates are known
+        """
+        request = {'coordinates': coordinates, 'method': method,
+                   'epsg': epsg, 'done': threading.Event()}
+        self.queue.put(request)
+        request['done'].wait()
+
+        if 'error' in request:
+            raise request['error']
+        return request['elevations']
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            n = len(batch[0]['coordinates'])
+            deadline = time.time() + self.wait
+
+            while n < self.max_points:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                n += len(request['coordinates'])
+
+            methods = {}
+            for request in batch:
+                key = (request['method'], request['epsg'])
+                methods.setdefault(key, []).append(request)
+
+            for (method, epsg), requests in methods.items():
+                self._answer(requests, method, epsg)
+
+    def _answer(self, requests, method, epsg):
+        coordinates = []
+        for request in requests:
+            coordinates.extend(request['coordinates'])
+
+        try:
+            elevations = self.server.getElevations(coordinates, method=method,
+                                                   epsg=epsg)
+        except Exception as e:
+            # answer one at a time so a bad request doesn't fail the others
+            if len(requests) > 1:
+                for request in requests:
+                    self._answer([request], method, epsg)
+                return
+            # getElevations asserts every point is inside a DEM. Anything
+            # else but a ValueError (e.g. a bad EPSG code) is a server error
+            # and is passed on as is.
+            if isinstance(e, AssertionError):
+                e = ValueError('locations outside the DEMs')
+            requests[0]['error'] = e
+            requests[0]['done'].set()
+            return
+
+        i = 0
+        for request in requests:
+            n = len(request['coordinates'])
+            request['elevations'] = elevations[i:i + n]
+            request['done'].set()
+            i += n
+
+class ElevationHandler(BaseHTTPRequestHandler):
+    """
+    Serves GET and POST requests of /elevations with the coalescer of the
+    process and of /profile with its Server
+    """
+    coalescer = None
+    verbose = False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        endpoint = url.path.rstrip('/')
+        method = query.get('method', ['bilinear'])[0]
+        epsg = query.get('epsg', [None])[0]
+
+        if endpoint == '/elevations':
+            self._elevations(query.get('locations', [''])[0], method, epsg)
+        elif endpoint == '/profile':
+            self._profile(query.get('path', [''])[0],
+                          query.get('spacing', [10.0])[0], method, epsg)
+        else:
+            self._reply(404, {'status': 'NOT_FOUND', 'results': []})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        endpoint = url.path.rstrip('/')
+        if endpoint not in ('/elevations', '/profile'):
+            return self._reply(404, {'status': 'NOT_FOUND', 'results': []})
+
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = body.decode('utf-8')
+        method = query.get('method', ['bilinear'])[0]
+        spacing = query.get('spacing', [10.0])[0]
+        epsg = query.get('epsg', [None])[0]
+
+        try:
+            locations = json.loads(body)
+        except ValueError:
+            # a plain coordinate string
+            locations = body
+
+        if isinstance(locations, dict):
+            method = locations.get('method', method)
+            spacing = locations.get('spacing', spacing)
+            epsg = locations.get('epsg', epsg)
+            key = ('locations', 'path')[endpoint == '/profile']
+            locations = locations.get(key, '')
+
+        if endpoint == '/profile':
+            self._profile(locations, spacing, method, epsg)
+        else:
+            self._elevations(locations, method, epsg)
+
+    def _profile(self, path, spacing, method, epsg):
+        try:
+            coordinates = [[float(v) for v in coord[:2]]
+                           for coord in parseCoordinates(path)]
+            spacing = float(spacing)
+            if not spacing > 0:
+                raise ValueError
+            if epsg is not None:
+                epsg = int(epsg)
+        except (TypeError, ValueError):
+            return self._reply(400, {'status': 'INVALID_REQUEST',
+                                     'results': []})
+
+        # profiles are sampled in one batch and aren't coalesced
+        try:
+            profile = self.coalescer.server.getProfile(coordinates, spacing,
+                                                       method=method,
+                                                       epsg=epsg)
+        except (AssertionError, ValueError) as e:
+            return self._reply(400, {'status': 'INVALID_REQUEST',
+                                     'error_message': str(e), 'results': []})
+        except Exception as e:
+            return self._replyError(e)
+
+        results = []
+        for i, z in enumerate(profile['elevation']):
+            slope = profile['slope'][i]
+            results.append({'elevation': (None, z)[z == z],
+                            'location': {'lat': profile['lat'][i],
+                                         'lng': profile['lng'][i]},
+                            'distance': profile['distance'][i],
+                            'slope': (None, slope)[slope == slope],
+                            'gain': profile['gain'][i],
+                            'loss': profile['loss'][i]})
+
+        self._reply(200, {'status': 'OK', 'results': results})
+
+    def _elevations(self, locations, method, epsg):
+        try:
+            coordinates = [[float(v) for v in coord[:2]]
+                           for coord in parseCoordinates(locations)]
+            if epsg is not None:
+                epsg = int(epsg)
+        except (TypeError, ValueError):
+            return self._reply(400, {'status': 'INVALID_REQUEST',
+                                     'results': []})
+
+        if len(coordinates) == 0:
+            return self._reply(200, {'status': 'OK', 'results': []})
+
+        try:
+            elevations = self.coalescer.getElevations(coordinates, method,
+                                                      epsg)
+        except ValueError as e:
+            return self._reply(400, {'status': 'INVALID_REQUEST',
+                                     'error_message': str(e), 'results': []})
+        except Exception as e:
+            return self._replyError(e)
+
+        results = []
+        for (lng, lat), z in zip(coordinates, elevations):
+            results.append({'elevation': (None, z)[z == z],
+                            'location': {'lat': lat, 'lng': lng}})
+
+        self._reply(200, {'status': 'OK', 'results': results})
+
+    def _replyError(self, e):
+        # the DEMs couldn't be read (IOError, GDAL errors, MemoryError, ...)
+        BaseHTTPRequestHandler.log_message(self, '%s: %s',
+                                           type(e).__name__, e)
+        return self._reply(500, {'status': 'UNKNOWN_ERROR',
+                                 'error_message': str(e), 'results': []})
+
+    def _reply(self, code, response):
+        body = json.dumps(response).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+class ElevationHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def _serve(httpd, server, threads):
+    ElevationHandler.coalescer = Coalescer(server, threads=threads)
+    httpd.serve_forever()
+
+def serve(host='localhost', port=8080, workers=1, verbose=False, threads=1,
+          **server_kwargs):
+    """
+    Serves the elevation API on host:port from workers processes that share
+    the listening socket, each sampling from threads threads. server_kwargs
+    are passed to Server.getInstance. Platforms without os.fork serve from
+    a single process.
+    """
+    ElevationHandler.verbose = verbose
+    httpd = ElevationHTTPServer((host, port), ElevationHandler)
+
+    # the tile index is read (and the memory mapped copies of the DEMs are
+    # written) once, before the workers are forked
+    server = Server.getInstance(**server_kwargs)
+
+    if workers <= 1 or not hasattr(os, 'fork'):
+        _serve(httpd, server, threads)
+        return
+
+    # GDAL handles can't be shared between processes, every worker opens
+    # its own
+    server.pool.clear()
+
+    pids = []
+    for i in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _serve(httpd, server, threads)
+            finally:
+                os._exit(0)
+        pids.append(pid)
+
+    try:
+        for pid in pids:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        for pid in pids:
+            os.kill(pid, signal.SIGTERM)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', type=str, default='localhost',
+                        help='Interface to listen on      (localhost)')
+    parser.add_argument('-p', '--port', type=int, default=8080,
+                        help='Port to listen on           (8080)')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='Worker processes            (1)')
+    parser.add_argument('-t', '--threads', type=int, default=1,
+                        help='Sampling threads per worker (1)')
+    parser.add_argument('-d', '--neddir', type=str,
+                        help='Directory of the DEMs       ($NED10M_ID_PATH)')
+    parser.add_argument('-c', '--cache', type=int, default=256,
+                        help='Block cache per worker (MB) (256)')
+    parser.add_argument('-m', '--memmap', type=str,
+                        help='Serve memory mapped copies of the DEMs kept in this directory')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='Log every request')
+
+    args = parser.parse_args()
+
+    print('Serving elevations on http://%s:%i/elevations' % \
+          (args.host, args.port))
+    serve(args.host, args.port, args.workers, args.verbose, args.threads,
+          neddir=args.neddir, cache_mb=args.cache, memmap_dir=args.memmap)
@@ -32,33 +32,329 @@ up memory.
 
 # standard library
 import fnmatch
+import hashlib
+import json
 import os
+import threading
+
+from collections import OrderedDict
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
 
 from math import ceil, floor
 
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+
 # 3rd party modules
-from scipy import interpolate
+import numpy as np
 
 from osgeo import gdal
+from osgeo import ogr
 from osgeo import osr
 from osgeo.gdalconst import *
 
 # see: http://www.garyrobinson.net/2004/03/python_singleto.html
 from singletonmixin import Singleton
 
-class GeoTiff:
-    def __init__(self, fname):
+# batch queries are answered window by window. Each window is at most
+# BATCH_WINDOW x BATCH_WINDOW pixels plus a margin for the kernel
+BATCH_WINDOW = 512
+
+# pixels of margin the interpolation kernels need around the pixel
+# holding a point
+_MARGINS = {'nearest': 0, 'bilinear': 1, 'cubic': 2}
+
+# blocks kept by BlockCache are the band's natural blocks grouped to roughly
+# this many pixels so strip organized rasters don't cache single rows
+CACHE_BLOCK_PIXELS = 1 << 16
+
+# the extents of the tiles found in neddir are cached in this file so the
+# Server doesn't open every tile when it starts
+TILE_INDEX_FILENAME = 'ned10m_tiles.json'
+
+# format of the entries of the tile index file. Index files of other
+# versions (or without one) are ignored and rewritten, so bump it whenever
+# GeoTiff.getInfo changes.
+TILE_INDEX_VERSION = 1
+
+# files are written under a temporary name and renamed over the old file.
+# os.replace (python 3) does so atomically on every platform, os.rename
+# only on POSIX.
+_replace = getattr(os, 'replace', os.rename)
+
+# mean radius of the earth (m) used for distances along profiles
+EARTH_RADIUS = 6371008.8
+
+def _groups(keys):
+    """
+    returns (key, indices) pairs grouping the positions of equal keys.
+    Indices keep their original order within a group.
+    """
+    keys = np.asarray(keys)
+    if len(keys) == 0:
+        return []
+
+    order = np.argsort(keys, kind='mergesort')
+    uniq, starts = np.unique(keys[order], return_index=True)
+    ends = list(starts[1:]) + [len(order)]
+    return [(key, order[i0:i1]) for key, i0, i1 in zip(uniq, starts, ends)]
+
+def _weights(t, method):
+    """
+    returns the (len(t), taps) weights of the kernel taps at fractional
+    offsets t from the first tap to the right of the kernel's center tap.
+    Cubic is the Catmull-Rom spline with taps at -1, 0, 1 and 2.
+    """
+    if method == 'bilinear':
+        return np.column_stack((1.0 - t, t))
+
+    t2 = t * t
+    t3 = t2 * t
+    return np.column_stack(((-t3 + 2.0 * t2 - t) * 0.5,
+                            (3.0 * t3 - 5.0 * t2 + 2.0) * 0.5,
+                            (-3.0 * t3 + 4.0 * t2 + t) * 0.5,
+                            (t3 - t2) * 0.5))
+
+def _interpolate(data, u, v, method='cubic'):
+    """
+    interpolates data at the array coordinates u (columns) and v (rows).
+    data[i, j] is located at (j, i). Pixels beyond the edges of data repeat
+    the edge pixels. Unknown methods are 'nearest'.
+    """
+    h, w = data.shape
+
+    if method not in ('bilinear', 'cubic'):
+        cols = np.clip(np.floor(u + 0.5).astype(np.int64), 0, w - 1)
+        rows = np.clip(np.floor(v + 0.5).astype(np.int64), 0, h - 1)
+        return data[rows, cols].astype(np.float64)
+
+    u0, v0 = np.floor(u), np.floor(v)
+    wx, wy = _weights(u - u0, method), _weights(v - v0, method)
+
+    # the taps of each point, -1 is the first tap of the cubic kernel
+    taps = np.arange(wx.shape[1]) - (0, 1)[method == 'cubic']
+    cols = np.clip(u0.astype(np.int64)[:, None] + taps, 0, w - 1)
+    rows = np.clip(v0.astype(np.int64)[:, None] + taps, 0, h - 1)
 
-            # open the image
-            ds = gdal.Open(fname, GA_ReadOnly)
+    values = data[rows[:, :, None], cols[:, None, :]].astype(np.float64)
+    return np.einsum('ni,nij,nj->n', wy, values, wx)
 
+class BlockCache:
+    """
+    LRU cache of decoded DEM blocks shared by GeoTiffs. Blocks are keyed by
+    (fname, column, row) and the least recently used are dropped once the
+    cached arrays take more than maxbytes. Hits, misses and evictions are
+    counted (see stats).
+    """
+    def __init__(self, maxbytes=256 * 1024 * 1024):
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self.blocks = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, read):
+        """
+        returns the block stored under key, calling read() to load it when
+        it isn't cached
+        """
+        with self.lock:
+            block = self.blocks.pop(key, None)
+            if block is not None:
+                self.blocks[key] = block
+                self.hits += 1
+                return block
+            self.misses += 1
+
+        block = read()
+
+        with self.lock:
+            if key not in self.blocks:
+                self.blocks[key] = block
+                self.nbytes += block.nbytes
+                while self.nbytes > self.maxbytes and len(self.blocks) > 1:
+                    _, old = self.blocks.popitem(last=False)
+                    self.nbytes -= old.nbytes
+                    self.evictions += 1
+
+        return block
+
+    def clear(self):
+        with self.lock:
+            self.blocks.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        with self.lock:
+            n = self.hits + self.misses
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'hitrate': (float('nan'), float(self.hits) / n)[n > 0],
+                    'blocks': len(self.blocks),
+                    'nbytes': self.nbytes,
+                    'maxbytes': self.maxbytes}
+
+class HandlePool:
+    """
+    Bounded LRU pool of open GDAL dataset handles shared by GeoTiffs.
+    GDAL handles can't be shared between threads so handles are keyed by
+    (fname, thread). Once more than maxhandles are open the least recently
+    used are dropped; a dropped handle is closed when the last read using
+    it returns. maxhandles=None keeps every handle open.
+    """
+    def __init__(self, maxhandles=64):
+        self.maxhandles = maxhandles
+        self.handles = OrderedDict()
+        self.opens = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, fname):
+        """
+        returns the (dataset, band 1) handle of fname for the calling
+        thread, opening the dataset when the thread has no open handle
+        """
+        key = (fname, threading.current_thread().ident)
+        with self.lock:
+            handle = self.handles.pop(key, None)
+            if handle is not None:
+                self.handles[key] = handle
+                return handle
+
+        ds = gdal.Open(fname, GA_ReadOnly)
+        if ds is None:
+            raise IOError('unable to open %s' % fname)
+        handle = (ds, ds.GetRasterBand(1))
+
+        with self.lock:
+            self.handles[key] = handle
+            self.opens += 1
+            while self.maxhandles is not None and \
+                  len(self.handles) > max(1, self.maxhandles):
+                self.handles.popitem(last=False)
+                self.evictions += 1
+
+        return handle
+
+    def clear(self):
+        with self.lock:
+            self.handles.clear()
+
+    def stats(self):
+        with self.lock:
+            return {'open': len(self.handles),
+                    'opens': self.opens,
+                    'evictions': self.evictions,
+                    'maxhandles': self.maxhandles}
+
+class GeoTiff:
+    def __init__(self, fname, cache=None, pool=None, info=None):
+            """
+            fname - path of the DEM
+            cache - BlockCache shared with other tiles
+            pool - HandlePool shared with other tiles
+            info - the dict returned by getInfo. When given the DEM isn't
+                   opened until it is read.
+            """
             self.fname = fname
-            self.ds = ds
-            self.band = ds.GetRasterBand(1)
-            self.transform = self.ds.GetGeoTransform(can_return_null = True)
+
+            # datasets are opened when they are read through the pool, one
+            # handle per thread (see _getHandle)
+            if pool is None:
+                pool = HandlePool(None)
+            self.pool = pool
+
+            if info is None:
+                info = self.getInfo()
+            self.info = info
+
+            self.transform = tuple(info['transform'])
+            self.xsize, self.ysize = info['size']
+            self.dtype = np.dtype(str(info['dtype']))
+            self.nodata = info.get('nodata')
+            self.wkt = info.get('wkt', '')
 
             self.left, self.upper = self.getLngLat(0,0)
-            self.right, self.lower = self.getLngLat(ds.RasterXSize, ds.RasterYSize)
+            self.right, self.lower = self.getLngLat(self.xsize, self.ysize)
+
+            # windows are assembled from cached blocks when a cache is given
+            self.cache = cache
+
+            w, h = self.xsize, self.ysize
+            bw, bh = info['block']
+            cols = min(w, bw * max(1, CACHE_BLOCK_PIXELS // (bw * bh)))
+            rows = min(h, bh * max(1, CACHE_BLOCK_PIXELS // (cols * bh)))
+            self.blocksize = (cols, rows)
+
+            # set by useMemmap, the copy is mapped when it is first read
+            self.memmap_path = None
+            self.memmap = None
+
+    def getInfo(self):
+        """
+        opens the DEM and returns the geotransform, projection, size,
+        natural block size, dtype and nodata value of band 1 as a dict that
+        can be stored as JSON
+        """
+        ds, band = self._getHandle()
+        return {'transform': ds.GetGeoTransform(can_return_null = True),
+                'size': [ds.RasterXSize, ds.RasterYSize],
+                'block': list(band.GetBlockSize()),
+                'dtype': band.ReadAsArray(0, 0, 1, 1).dtype.str,
+                'nodata': band.GetNoDataValue(),
+                'wkt': ds.GetProjection()}
+
+    def _getHandle(self):
+        """
+        returns the calling thread's (dataset, band) handle of the DEM.
+        Callers keep the dataset referenced while they read the band.
+        """
+        return self.pool.get(self.fname)
+
+    def useMemmap(self, memmap_dir):
+        """
+        serves the DEM from a raw little-endian copy in memmap_dir that is
+        mapped with np.memmap. The copy is (re)written when it is missing or
+        older than the DEM. Processes mapping the same copy share one copy
+        of the pages through the OS page cache.
+        """
+        w, h = self.xsize, self.ysize
+        dtype = self.dtype.newbyteorder('<')
+
+        # tiles are usually all named w001001.adf, so the name carries a
+        # hash of the full path
+        digest = hashlib.md5(os.path.abspath(self.fname).encode('utf-8'))
+        path = os.path.join(memmap_dir, '%s-%s.%s.raw' % \
+                            (os.path.basename(os.path.dirname(self.fname)),
+                             digest.hexdigest()[:12], dtype.str[1:]))
+
+        nbytes = w * h * dtype.itemsize
+        if not os.path.exists(path) or \
+           os.path.getsize(path) != nbytes or \
+           os.path.getmtime(path) < os.path.getmtime(self.fname):
+
+            if not os.path.isdir(memmap_dir):
+                os.makedirs(memmap_dir)
+
+            # written under a temporary name and renamed so other processes
+            # never map a partial copy
+            ds, band = self._getHandle()
+            tmp = '%s.%i.tmp' % (path, os.getpid())
+            rows = max(1, CACHE_BLOCK_PIXELS * 16 // w)
+            with open(tmp, 'wb') as f:
+                for yoff in range(0, h, rows):
+                    data = band.ReadAsArray(0, yoff, w, min(rows, h - yoff))
+                    data.astype(dtype).tofile(f)
+            _replace(tmp, path)
+
+        self.memmap_path = path
+        self.memmap = None
 
 
     def getLngLat(self, x, y):
@@ -91,96 +387,176 @@ class GeoTiff:
 
 
     def getElevation(self, lng, lat, method='cubic'):
+        """
+        Elevation at (lng, lat) interpolated with the 'nearest', 'bilinear'
+        or 'cubic' (Catmull-Rom) kernel, nan outside the raster. Pixel
+        values are located at pixel centers.
+        """
         x, y = self.getPixelCoords(lng, lat)
-        w, h = self.ds.RasterXSize, self.ds.RasterYSize
+        w, h = self.xsize, self.ysize
         
         if x < 0 or x > w or y < 0 or y > h:
             return float('nan')
-        
-        if method == 'bilinear':
-            _x = [int(floor(x))-1, int(ceil(x))-1]
-            if _x[0] < 0 : _x = [0, 1]
-            
-            _y = [int(floor(y))-1, int(ceil(y))-1]
-            if _y[0] < 0 : _y = [0, 1]
-            
-            data = self.band.ReadAsArray(_x[0], _y[0], 2, 2)
-            func = interpolate.interp2d(_x, _y, data, kind='linear')
-            z = func(x, y)[0]
-                
-        elif method == 'cubic':
-            xr, yr = int(round(x)), int(round(y))
 
-            if xr - 2 < 0:
-                _x = [0, 1, 2, 3, 4]
-            elif xr + 2 > w:
-                _x = [w-5, w-4, w-3, w-2, w-1]
-            else:
-                _x = [xr-3, xr-2, xr-1, xr, xr+1]
-                
-            if yr - 2 < 0:
-                _y = [0, 1, 2, 3, 4]
-            elif yr + 2 >= h:
-                _y = [h-5, h-4, h-3, h-2, h-1]
-            else:
-                _y = [yr-3, yr-2, yr-1, yr, yr+1]
-              
-            data = self.band.ReadAsArray(_x[0], _y[0], 5, 5)
-            func = interpolate.interp2d(_x, _y, data, kind='cubic')
-            
-            z = func(x, y)[0]
-            
-        else:
-            x, y = int(round(x)), int(round(y))
+        # the pixel holding the point and the margin the kernel needs
+        margin = _MARGINS.get(method, 0)
+        col, row = min(int(floor(x)), w - 1), min(int(floor(y)), h - 1)
+        xoff, yoff = max(0, col - margin), max(0, row - margin)
+        xend, yend = min(w, col + margin + 1), min(h, row + margin + 1)
+
+        data = self._readWindow(xoff, yoff, xend - xoff, yend - yoff)
+        z = _interpolate(data, np.array([x - 0.5 - xoff]),
+                         np.array([y - 0.5 - yoff]), method)
+        return float(z[0])
+
+    def _readBlock(self, col, row):
+        cols, rows = self.blocksize
+        xoff, yoff = col * cols, row * rows
+        ds, band = self._getHandle()
+        return band.ReadAsArray(xoff, yoff,
+                                min(cols, self.xsize - xoff),
+                                min(rows, self.ysize - yoff))
+
+    def _readWindow(self, xoff, yoff, xsize, ysize):
+        """
+        returns the window of the DEM. Windows are views of the memory map
+        (see useMemmap) or are assembled from the blocks of self.cache when
+        there is one.
+        """
+        if self.memmap_path is not None:
+            if self.memmap is None:
+                self.memmap = np.memmap(self.memmap_path, mode='r',
+                                        dtype=self.dtype.newbyteorder('<'),
+                                        shape=(self.ysize, self.xsize))
+            return self.memmap[yoff:yoff + ysize, xoff:xoff + xsize]
+
+        if self.cache is None:
+            ds, band = self._getHandle()
+            return band.ReadAsArray(xoff, yoff, xsize, ysize)
+
+        cols, rows = self.blocksize
+        col0, col1 = xoff // cols, (xoff + xsize - 1) // cols
+        row0, row1 = yoff // rows, (yoff + ysize - 1) // rows
+
+        # the common case of a window inside one block is a view
+        if col0 == col1 and row0 == row1:
+            block = self.cache.get((self.fname, col0, row0),
+                                   lambda: self._readBlock(col0, row0))
+            x0, y0 = xoff - col0 * cols, yoff - row0 * rows
+            return block[y0:y0 + ysize, x0:x0 + xsize]
+
+        data = None
+        for row in range(row0, row1 + 1):
+            for col in range(col0, col1 + 1):
+                block = self.cache.get((self.fname, col, row),
+                                       lambda: self._readBlock(col, row))
+                if data is None:
+                    data = np.empty((ysize, xsize), dtype=block.dtype)
+
+                # overlap of the block and the window in raster pixels
+                bx0, by0 = col * cols, row * rows
+                x0, x1 = max(xoff, bx0), min(xoff + xsize, bx0 + cols)
+                y0, y1 = max(yoff, by0), min(yoff + ysize, by0 + rows)
+                data[y0 - yoff:y1 - yoff, x0 - xoff:x1 - xoff] = \
+                    block[y0 - by0:y1 - by0, x0 - bx0:x1 - bx0]
 
-            if x == w : x = w-1
-            if y == h : y = h-1
-            
-            z = self.band.ReadAsArray(x, y, 1, 1)
+        return data
+
+    def getElevations(self, lngs, lats, method='cubic'):
+        """
+        Batch version of getElevation for arrays of lng and lat. Returns an
+        array of elevations, nan for points outside the raster.
+
+        Points are grouped by the BATCH_WINDOW x BATCH_WINDOW pixel window
+        they fall in. Each window is read once, with a margin for the
+        interpolation kernel, and all of its points are interpolated
+        together. Pixel values are located at pixel centers.
+        """
+        x, y = self.getPixelCoords(np.asarray(lngs, dtype=np.float64),
+                                   np.asarray(lats, dtype=np.float64))
+        w, h = self.xsize, self.ysize
+
+        z = np.empty(len(x))
+        z.fill(np.nan)
+
+        margin = _MARGINS.get(method, 0)
+
+        pts = np.nonzero((x >= 0) & (x <= w) & (y >= 0) & (y <= h))[0]
+        wx = np.minimum(x[pts], w - 1).astype(np.int64) // BATCH_WINDOW
+        wy = np.minimum(y[pts], h - 1).astype(np.int64) // BATCH_WINDOW
+        nwx = (w + BATCH_WINDOW - 1) // BATCH_WINDOW
+
+        for key, g in _groups(wy * nwx + wx):
+            g = pts[g]
+            xoff = max(0, int(key % nwx) * BATCH_WINDOW - margin)
+            yoff = max(0, int(key // nwx) * BATCH_WINDOW - margin)
+            xend = min(w, (int(key % nwx) + 1) * BATCH_WINDOW + margin)
+            yend = min(h, (int(key // nwx) + 1) * BATCH_WINDOW + margin)
+
+            data = self._readWindow(xoff, yoff, xend - xoff, yend - yoff)
+            z[g] = _interpolate(data, x[g] - 0.5 - xoff, y[g] - 0.5 - yoff,
+                                method)
 
-            if z is not None:
-                return z[0,0]
-            else:
-                return float('nan')
-            
         return z
                 
-    def getMaskFromPolyCoords(self, poly_coords):
+    def getPolyWindow(self, rings):
+        """
+        returns the (xoff, yoff, xsize, ysize) window of the pixels under
+        the bounding box of the rings clipped to the raster, None when they
+        don't overlap the raster
         """
-        build a blurred mask for merging bathymetry into
-        DEM
+        coords = np.concatenate([np.asarray(ring, dtype=np.float64)[:, :2]
+                                 for ring in rings])
+        x, y = self.getPixelCoords(coords[:, 0], coords[:, 1])
 
-        poly_coords - a list of (lng, lat) coordinates
-        src - file name of the DEM used for merging
+        xoff, yoff = max(0, int(floor(x.min()))), max(0, int(floor(y.min())))
+        xend = min(self.xsize, int(ceil(x.max())))
+        yend = min(self.ysize, int(ceil(y.max())))
 
-        returns a 2D np.array with values between [0-1]
-        Should be 1 around the convex hull of the zero_coords
+        if xend <= xoff or yend <= yoff:
+            return None
+        return xoff, yoff, xend - xoff, yend - yoff
+
+    def getMaskFromPolyCoords(self, poly_coords, window=None,
+                              all_touched=False):
         """
-        ref_data = self.band.ReadAsArray()
-        srs = self.srs
-        proj = self.proj
-        transform = self.transform
-        xsize, ysize = self.xsize, self.ysize
+        rasterizes a polygon over a window of the DEM
 
-        # Create a new raster dataset in memory 
-        driver = gdal.GetDriverByName('MEM')
-        dst_ds = driver.Create('', xsize, ysize, 
-                               1, gdal.GDT_Float32)
-        dst_ds.SetGeoTransform(transform)
-        dst_ds.SetProjection(proj)
+        poly_coords - the (lng, lat) coordinates of a ring, or a list of
+                      rings: the outer ring followed by its holes
+        window - (xoff, yoff, xsize, ysize) window of the DEM to rasterize,
+                 defaults to the window under the polygon (see getPolyWindow)
+        all_touched - burns every pixel the polygon touches instead of the
+                      pixels whose centers are inside it
+
+        returns a 2D np.uint8 array of the window's shape that is 1 inside
+        the polygon
+        """
+        rings = _rings(poly_coords)
+        if window is None:
+            window = self.getPolyWindow(rings)
+        if window is None:
+            return np.zeros((0, 0), dtype=np.uint8)
+
+        xoff, yoff, xsize, ysize = window
+        xOrigin, xPixSize, xZero, yOrigin, yZero, yPixSize = self.transform
 
-        data = np.zeros((ysize, xsize))
-        dst_band = dst_ds.GetRasterBand(1)
-        dst_band.WriteArray(data)
+        # Create a new raster dataset in memory covering the window
+        driver = gdal.GetDriverByName('MEM')
+        dst_ds = driver.Create('', xsize, ysize, 1, gdal.GDT_Byte)
+        dst_ds.SetGeoTransform((xOrigin + xPixSize*xoff, xPixSize, xZero,
+                                yOrigin + yPixSize*yoff, yZero, yPixSize))
 
         # Create a memory layer to rasterize from.
         rast_ogr_ds = \
                   ogr.GetDriverByName('Memory').CreateDataSource( 'wrk' )
-        rast_mem_lyr = rast_ogr_ds.CreateLayer( 'poly', srs=srs )
+        rast_mem_lyr = rast_ogr_ds.CreateLayer( 'poly' )
 
         # Add a polygon.
-        coord_str = ','.join(['%f %f'%(lng,lat) for lng,lat in zero_coords])
-        wkt_geom = 'POLYGON((' + coord_str + '))'
+        ring_strs = ['(' + ','.join(['%.12f %.12f' % (lng, lat)
+                                     for lng, lat in ring]) + ')'
+                     for ring in rings]
+        wkt_geom = 'POLYGON(' + ','.join(ring_strs) + ')'
 
         feat = ogr.Feature( rast_mem_lyr.GetLayerDefn() )
         feat.SetGeometryDirectly( ogr.Geometry(wkt = wkt_geom) )
@@ -188,15 +564,344 @@ class GeoTiff:
         rast_mem_lyr.CreateFeature( feat )
 
         # Run the algorithm.
+        options = (['ALL_TOUCHED=TRUE'] if all_touched else [])
         err = gdal.RasterizeLayer( dst_ds, [1], rast_mem_lyr,
-                                   burn_values = [1.0] )
+                                   burn_values = [1], options = options )
 
         # Pull data back out of the dataset
-        data = dst_band.ReadAsArray()
-        
+        data = dst_ds.GetRasterBand(1).ReadAsArray()
+
         dst_ds = None # close dataset to make sure memory is released
 
         return data
+
+def _loadTileInfo(fname):
+    """
+    returns {path: info} stored in the tile index file, {} when it is
+    missing, unreadable or of another TILE_INDEX_VERSION
+    """
+    try:
+        with open(fname) as f:
+            index = json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+    if not isinstance(index, dict) or \
+       index.get('version') != TILE_INDEX_VERSION:
+        return {}
+    return index.get('tiles', {})
+
+def _saveTileInfo(fname, infos):
+    """
+    writes the tile index file. Read only DEM directories are not an error,
+    the index just isn't cached.
+    """
+    tmp = '%s.%i.tmp' % (fname, os.getpid())
+    try:
+        with open(tmp, 'w') as f:
+            json.dump({'version': TILE_INDEX_VERSION, 'tiles': infos}, f)
+        _replace(tmp, fname)
+    except (IOError, OSError):
+        pass
+
+def _rings(poly_coords):
+    """
+    returns the closed rings of a polygon given as one ring or as a list
+    of rings (the outer ring followed by holes) as lists of (lng, lat).
+    A ring is a list of coordinates in the formats of parseCoordinates or
+    a space separated coordinate string.
+    """
+    def isRing(coords):
+        if isinstance(coords, basestring):
+            return True
+        # a list of "lng,lat" strings rather than of ring strings
+        if isinstance(coords[0], basestring):
+            return len(coords[0].split()) == 1
+        # a list of coordinates rather than of rings
+        return np.isscalar(coords[0][0]) and \
+               not isinstance(coords[0][0], basestring)
+
+    if isRing(poly_coords):
+        poly_coords = [poly_coords]
+
+    rings = []
+    for ring in poly_coords:
+        ring = [(float(c[0]), float(c[1])) for c in parseCoordinates(ring)]
+        if ring[0] != ring[-1]:
+            ring.append(ring[0])
+        rings.append(ring)
+
+    return rings
+
+def readKmlPolygons(fname):
+    """
+    returns the polygons of a KML file (e.g. testdata/subcatchments.kml) as
+    a list of (name, rings) pairs. name is the Placemark's first SimpleData
+    value (the DN of the subcatchment) or its name, rings are the outer ring
+    and the holes of the polygon. The file is parsed incrementally.
+    """
+    def tag(elem):
+        # drops the namespace
+        return elem.tag.split('}')[-1]
+
+    polygons = []
+    for event, elem in ElementTree.iterparse(fname):
+        if tag(elem) != 'Placemark':
+            continue
+
+        names = [child.text for child in elem.iter()
+                 if tag(child) in ('SimpleData', 'name')]
+        name = (None, names[0])[len(names) > 0]
+
+        for poly in elem.iter():
+            if tag(poly) != 'Polygon':
+                continue
+
+            # the outer boundary comes before the inner boundaries
+            rings = [parseCoordinates(coords.text.strip())
+                     for boundary in poly
+                     if tag(boundary) in ('outerBoundaryIs', 'innerBoundaryIs')
+                     for coords in boundary.iter()
+                     if tag(coords) == 'coordinates']
+            polygons.append((name, rings))
+
+        elem.clear()
+
+    return polygons
+
+# CoordinateTransformations aren't thread safe, each thread caches its own
+_transforms = threading.local()
+
+def _getTransform(epsg, wkt):
+    """
+    returns the calling thread's cached osr.CoordinateTransformation from
+    the EPSG code epsg to the coordinate system of the wkt. Coordinates are
+    in x/lng, y/lat order for both.
+    """
+    cache = getattr(_transforms, 'cache', None)
+    if cache is None:
+        cache = _transforms.cache = {}
+
+    ct = cache.get((epsg, wkt))
+    if ct is None:
+        src, dst = osr.SpatialReference(), osr.SpatialReference()
+        try:
+            err = src.ImportFromEPSG(int(epsg))
+        except RuntimeError:
+            err = 1
+        if err != 0:
+            raise ValueError('unknown EPSG code %s' % epsg)
+        if dst.ImportFromWkt(wkt) != 0:
+            raise ValueError('the DEMs have no coordinate system')
+
+        # GDAL 3 otherwise uses the lat/lng order of the EPSG definition
+        for srs in (src, dst):
+            if hasattr(srs, 'SetAxisMappingStrategy'):
+                srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+        ct = cache[(epsg, wkt)] = osr.CoordinateTransformation(src, dst)
+
+    return ct
+
+def transformCoordinates(xs, ys, epsg, wkt):
+    """
+    transforms arrays of x/lng and y/lat in the EPSG code epsg to the
+    coordinate system of the wkt with one TransformPoints call. Returns
+    the transformed arrays.
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    if len(xs) == 0:
+        return xs, ys
+
+    ct = _getTransform(epsg, wkt)
+    pts = np.array(ct.TransformPoints(list(zip(xs.tolist(), ys.tolist()))),
+                   dtype=np.float64)
+    return pts[:, 0], pts[:, 1]
+
+def _haversine(lng0, lat0, lng1, lat1):
+    """
+    great circle distances (m) between arrays of lng/lat points
+    """
+    lng0, lat0, lng1, lat1 = [np.radians(v) for v in (lng0, lat0, lng1, lat1)]
+    a = np.sin((lat1 - lat0) / 2.0)**2 + \
+        np.cos(lat0) * np.cos(lat1) * np.sin((lng1 - lng0) / 2.0)**2
+    return 2.0 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def _linearUnits(wkt):
+    """
+    returns the meters per unit of a projected coordinate system, None
+    when wkt is geographic (lng/lat) or missing
+    """
+    srs = osr.SpatialReference()
+    if not wkt or srs.ImportFromWkt(wkt) != 0 or srs.IsGeographic():
+        return None
+    return srs.GetLinearUnits()
+
+def _densify(lngs, lats, spacing, units=None):
+    """
+    returns the lngs, lats and distances (m) along the path of points
+    spaced at most spacing meters apart. The vertices of the path are kept
+    and points are added linearly between them in map coordinates.
+    Repeated vertices are dropped.
+
+    lngs, lats are geographic unless the meters per unit of their
+    projected coordinate system are given with units, in which case the
+    distances are planar.
+    """
+    if units is None:
+        seglen = _haversine(lngs[:-1], lats[:-1], lngs[1:], lats[1:])
+    else:
+        seglen = np.hypot(np.diff(lngs), np.diff(lats)) * units
+    cumlen = np.concatenate(([0.0], np.cumsum(seglen)))
+
+    # points added along each segment, counting its first vertex
+    n = np.ceil(seglen / float(spacing)).astype(np.int64)
+    n[seglen > 0] = np.maximum(n[seglen > 0], 1)
+    n[seglen == 0] = 0
+
+    seg = np.repeat(np.arange(len(seglen)), n)
+    starts = np.concatenate(([0], np.cumsum(n)[:-1]))
+    t = (np.arange(len(seg)) - starts[seg]) / n[seg].astype(np.float64)
+
+    lng = lngs[seg] + t * (lngs[1:] - lngs[:-1])[seg]
+    lat = lats[seg] + t * (lats[1:] - lats[:-1])[seg]
+    dist = cumlen[seg] + t * seglen[seg]
+
+    return np.append(lng, lngs[-1]), np.append(lat, lats[-1]), \
+           np.append(dist, cumlen[-1])
+
+def parseCoordinates(coordinates):
+    """
+    returns coordinates given in any of the formats accepted by
+    Server.getElevations as a list of [lng, lat(, z)] lists of floats
+    """
+    if isinstance(coordinates, basestring):
+        return [map(float, coord.split(',')) for coord in coordinates.split()]
+
+    if len(coordinates) > 0 and isinstance(coordinates[0], basestring):
+        return [map(float, coord.split(',')) for coord in coordinates]
+
+    return coordinates
+
+class TileIndex:
+    """
+    Regular grid of buckets over the extents of a list of GeoTiffs. Each
+    bucket lists the tiles overlapping it, so finding the tile holding a
+    point only tests the few tiles of its bucket instead of every tile.
+
+    The bucket size defaults to the median tile width/height so a bucket
+    overlaps at most a handful of tiles.
+    """
+    def __init__(self, dems, cellsize=None):
+        self.dems = dems
+        self.buckets = {}
+
+        if len(dems) == 0:
+            self.x0 = self.y0 = 0.0
+            self.cellsize = 1.0
+            return
+
+        if cellsize is None:
+            cellsize = max(np.median([dem.right - dem.left for dem in dems]),
+                           np.median([dem.upper - dem.lower for dem in dems]))
+
+        self.x0 = min(dem.left for dem in dems)
+        self.y0 = min(dem.lower for dem in dems)
+        self.cellsize = float(cellsize)
+
+        for k, dem in enumerate(dems):
+            i0, j0 = self._cell(dem.left, dem.lower)
+            i1, j1 = self._cell(dem.right, dem.upper)
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    self.buckets.setdefault((i, j), []).append(k)
+
+        # last occupied bucket column and row
+        self.imax = max(i for i, j in self.buckets)
+        self.jmax = max(j for i, j in self.buckets)
+
+    def _cell(self, lng, lat):
+        return int(floor((lng - self.x0) / self.cellsize)), \
+               int(floor((lat - self.y0) / self.cellsize))
+
+    def find(self, lng, lat):
+        """
+        returns the GeoTiff containing (lng, lat) or None
+        """
+        for k in self.buckets.get(self._cell(lng, lat), ()):
+            if (lng, lat) in self.dems[k]:
+                return self.dems[k]
+
+        return None
+
+    def findAll(self, lngs, lats):
+        """
+        returns an array with the index in self.dems of the tile holding
+        each point, -1 for points outside every tile
+        """
+        lngs = np.asarray(lngs, dtype=np.float64)
+        lats = np.asarray(lats, dtype=np.float64)
+        indx = np.empty(len(lngs), dtype=np.int64)
+        indx.fill(-1)
+
+        if len(self.dems) == 0 or len(lngs) == 0:
+            return indx
+
+        cols = np.floor((lngs - self.x0) / self.cellsize).astype(np.int64)
+        rows = np.floor((lats - self.y0) / self.cellsize).astype(np.int64)
+
+        # visit each occupied bucket once and test its tiles on all of its
+        # points at once
+        nrows = rows.max() - rows.min() + 1
+        keys = (cols - cols.min()) * nrows + (rows - rows.min())
+
+        for key, pts in _groups(keys):
+            cell = (int(cols[pts[0]]), int(rows[pts[0]]))
+            for k in self.buckets.get(cell, ()):
+                dem = self.dems[k]
+                inside = (dem.left < lngs[pts]) & (lngs[pts] < dem.right) & \
+                         (dem.lower < lats[pts]) & (lats[pts] < dem.upper)
+                inside &= indx[pts] == -1
+                indx[pts[inside]] = k
+
+        return indx
+
+    def findBox(self, left, lower, right, upper):
+        """
+        returns the sorted indices in self.dems of the tiles overlapping the
+        box
+        """
+        if len(self.dems) == 0:
+            return []
+
+        i0, j0 = self._cell(left, lower)
+        i1, j1 = self._cell(right, upper)
+
+        found = set()
+        for i in range(max(0, i0), min(i1, self.imax) + 1):
+            for j in range(max(0, j0), min(j1, self.jmax) + 1):
+                found.update(self.buckets.get((i, j), ()))
+
+        dems = self.dems
+        return sorted(k for k in found
+                      if dems[k].left < right and left < dems[k].right and
+                         dems[k].lower < upper and lower < dems[k].upper)
+
+    def groupByTile(self, lngs, lats):
+        """
+        returns {index in self.dems: array of point indices} for the points
+        that fall in a tile and the array of indices of those that don't
+        """
+        groups = {}
+        missing = np.array([], dtype=np.int64)
+        for k, pts in _groups(self.findAll(lngs, lats)):
+            if k == -1:
+                missing = pts
+            else:
+                groups[int(k)] = pts
+
+        return groups, missing
     
 class Server(Singleton):
     """
@@ -235,8 +940,22 @@ class Server(Singleton):
 
     elevs = s.getElevations(coords)
 
+    Decoded blocks are kept in a cache of cache_mb megabytes shared by the
+    tiles. With memmap_dir the tiles are instead copied once to raw files in
+    memmap_dir and memory mapped, so worker processes serving requests share
+    one copy of the DEM through the OS page cache:
+
+    s = Server.getInstance(memmap_dir='/var/cache/ned10m')
+
+    Tiles are opened when they are first read and at most max_handles
+    datasets are kept open. The extents of the tiles are cached in
+    index_file (neddir/ned10m_tiles.json by default) so only new or
+    modified tiles are opened when the Server starts.
+
     """
-    def __init__(self, neddir = None, dem_filename='w001001.adf'):
+    def __init__(self, neddir = None, dem_filename='w001001.adf',
+                 cache_mb=256, memmap_dir=None, max_handles=64,
+                 index_file=None):
         if neddir is None:
             self.neddir = os.getenv('NED10M_ID_PATH', '') # default to local path 
         else:
@@ -245,40 +964,253 @@ class Server(Singleton):
         # register all of the drivers
         gdal.AllRegister()
 
-        # find dem files and create handles for them
+        # decoded blocks are shared by every tile, cache_mb=0 disables it.
+        # Memory mapped tiles don't need it.
+        bCache = cache_mb > 0 and memmap_dir is None
+        self.cache = (None, BlockCache(cache_mb * 1024 * 1024))[bCache]
+
+        # open datasets are shared by every tile
+        self.pool = HandlePool(max_handles)
+
+        if index_file is None:
+            index_file = os.path.join(self.neddir, TILE_INDEX_FILENAME)
+        self.index_file = index_file
+
+        # find dem files and register their extents. Only tiles that aren't
+        # in the index file or changed since they were indexed are opened.
+        infos = _loadTileInfo(index_file)
+        found = {}
         dems = []
-        for root, dirnames, filenames in os.walk(neddir):
+        for root, dirnames, filenames in os.walk(self.neddir):
             for filename in fnmatch.filter(filenames, dem_filename):
-                dems.append(GeoTiff(os.path.join(root, filename)))
+                fname = os.path.join(root, filename)
+                st = os.stat(fname)
+                stamp = [st.st_size, st.st_mtime]
+
+                info = infos.get(fname)
+                if info is None or info.get('stamp') != stamp:
+                    dem = GeoTiff(fname, self.cache, self.pool)
+                    info = dict(dem.info, stamp=stamp)
+                else:
+                    dem = GeoTiff(fname, self.cache, self.pool, info)
+
+                found[fname] = info
+                dems.append(dem)
+
+        if found != infos:
+            _saveTileInfo(index_file, found)
+
+        if memmap_dir is not None:
+            for dem in dems:
+                dem.useMemmap(memmap_dir)
 
         self.dems = dems
+        self.index = TileIndex(dems)
+
+        # the tiles are assumed to share the coordinate system of the first
+        self.wkt = ('', dems[0].wkt)[len(dems) > 0]
+
+        # meters per unit of projected DEMs, profiles of geographic DEMs
+        # (None) measure great circle distances
+        self.units = _linearUnits(self.wkt)
 
     def _getDem(self, lng, lat):
-            for dem in self.dems:
-                if (lng,lat) in dem:
-                    return dem
+        return self.index.find(lng, lat)
 
+    def getCacheStats(self):
+        """
+        returns the hits, misses, evictions, hit rate and size of the block
+        cache, or None when caching is disabled
+        """
+        if self.cache is None:
             return None
+        return self.cache.stats()
 
-    def getElevations(self, coordinates, method='bilinear'):
+    def getHandleStats(self):
+        """
+        returns the number of open dataset handles, the number of datasets
+        opened so far and the number of handles evicted from the pool
+        """
+        return self.pool.stats()
+
+    def _coordinates(self, coordinates, epsg):
+        """
+        returns arrays of the lngs and lats of coordinates in the
+        coordinate system of the DEMs
+        """
+        coordinates = parseCoordinates(coordinates)
+
+        lngs = np.array([coord[0] for coord in coordinates], dtype=np.float64)
+        lats = np.array([coord[1] for coord in coordinates], dtype=np.float64)
+
+        if epsg is not None:
+            lngs, lats = transformCoordinates(lngs, lats, epsg, self.wkt)
+
+        return lngs, lats
+
+    def getElevations(self, coordinates, method='bilinear', epsg=None):
         """
         Elevation interpolation between raster points can be specified as 'nearest',
         'bilinear' or 'cubic' with the method kwarg
+
+        Coordinates are in the coordinate system of the DEMs unless the
+        EPSG code of their coordinate system is given with epsg (e.g. 26911
+        for UTM 11N). Transformations are cached and every coordinate is
+        transformed in one batch.
+        """
+        lngs, lats = self._coordinates(coordinates, epsg)
+
+        ret, missing = self._sample(lngs, lats, method)
+        assert len(missing) == 0
+
+        return ret.tolist()
+
+    def _sample(self, lngs, lats, method):
         """
-        if isinstance(coordinates, basestring):
-            coordinates = [map(float, coord.split(',')) for coord in  coordinates.split()]
+        returns the array of elevations of the points and the indices of
+        the points outside every DEM, which are nan
+        """
+        # points are located with one pass over the index and answered
+        # tile by tile
+        groups, missing = self.index.groupByTile(lngs, lats)
 
-        elif isinstance(coordinates[0], basestring):
-            coordinates =   [map(float, coord.split(',')) for coord in coordinates]
+        ret = np.empty(len(lngs))
+        ret[missing] = np.nan
+        for k, pts in groups.items():
+            ret[pts] = self.dems[k].getElevations(lngs[pts], lats[pts],
+                                                  method=method)
 
-        ret = []
-        for coord in coordinates:
-            lng, lat = coord[:2]
-            dem = self._getDem(lng, lat)
-            assert dem is not None
-            ret.append(dem.getElevation(lng, lat, method=method))
+        return ret, missing
 
-        return ret
+    def getProfile(self, coordinates, spacing=10.0, method='bilinear',
+                   epsg=None):
+        """
+        Elevation profile along the path through coordinates (in any of
+        the formats accepted by getElevations, e.g. the coordinates of a KML
+        LineString). The path is densified to points at most spacing meters
+        apart and every point is sampled in one batch.
+
+        Returns a dict of lists with an entry per point:
+          lng, lat  - location of the point
+          distance  - distance along the path (m), great circle distances
+                      for geographic DEMs and planar distances for
+                      projected DEMs
+          elevation - nan outside the DEMs
+          slope     - rise over run at the point (central differences)
+          gain      - cumulative elevation gained along the path (m)
+          loss      - cumulative elevation lost along the path (m)
+
+        With epsg the vertices of the path are transformed to the
+        coordinate system of the DEMs (see getElevations) before the path is
+        densified, and lng, lat are in the coordinate system of the DEMs.
+        """
+        assert spacing > 0
+        lngs, lats = self._coordinates(coordinates, epsg)
+        if len(lngs) == 0:
+            return dict((key, []) for key in ('lng', 'lat', 'distance',
+                        'elevation', 'slope', 'gain', 'loss'))
+
+        lng, lat, dist = _densify(lngs, lats, spacing, self.units)
+        z, missing = self._sample(lng, lat, method)
+
+        if len(z) > 1:
+            slope = np.gradient(z, dist)
+        else:
+            slope = np.zeros(1)
+
+        dz = np.diff(z)
+        dz[np.isnan(dz)] = 0.0
+        gain = np.concatenate(([0.0], np.cumsum(np.maximum(dz, 0.0))))
+        loss = np.concatenate(([0.0], np.cumsum(np.maximum(-dz, 0.0))))
+
+        return {'lng': lng.tolist(),
+                'lat': lat.tolist(),
+                'distance': dist.tolist(),
+                'elevation': z.tolist(),
+                'slope': slope.tolist(),
+                'gain': gain.tolist(),
+                'loss': loss.tolist()}
+
+    def getZonalStats(self, polygons, percentiles=(5, 25, 50, 75, 95),
+                      threads=None, all_touched=False, epsg=None):
+        """
+        Elevation statistics of the pixels inside each polygon. Polygons
+        are rings of coordinates or lists of rings (see
+        GeoTiff.getMaskFromPolyCoords) such as the rings returned by
+        readKmlPolygons. Each polygon is rasterized only over its bounding
+        window of each tile it overlaps, and polygons are processed by a
+        pool of threads (one per cpu by default).
+
+        Returns a list with a dict per polygon:
+          count - number of pixels with elevations inside the polygon
+          min, max, mean, std - nan when count is 0
+          percentiles - {percentile: elevation}
+
+        Pixels are inside when their centers are, or when the polygon
+        touches them with all_touched. Nodata pixels are skipped. With epsg
+        the polygons are transformed to the coordinate system of the DEMs
+        (see getElevations).
+        """
+        pool = ThreadPool(threads or cpu_count())
+        try:
+            return pool.map(lambda poly: self._zonalStats(poly, percentiles,
+                                                          all_touched, epsg),
+                            polygons)
+        finally:
+            pool.close()
+            pool.join()
+
+    def _zonalStats(self, poly_coords, percentiles, all_touched, epsg):
+        rings = _rings(poly_coords)
+        if epsg is not None:
+            rings = [list(zip(*transformCoordinates([c[0] for c in ring],
+                                                    [c[1] for c in ring],
+                                                    epsg, self.wkt)))
+                     for ring in rings]
+        outer = np.array(rings[0])
+        left, lower = outer.min(axis=0)
+        right, upper = outer.max(axis=0)
+
+        tiles = self.index.findBox(left, lower, right, upper)
+
+        values = []
+        for k in tiles:
+            dem = self.dems[k]
+            window = dem.getPolyWindow(rings)
+            if window is None:
+                continue
+
+            mask = dem.getMaskFromPolyCoords(rings, window, all_touched)
+            rows, cols = np.nonzero(mask)
+
+            # pixels where tiles overlap are counted once, for the first
+            # tile holding their centers
+            xoff, yoff = window[:2]
+            if len(tiles) > 1:
+                lngs, lats = dem.getLngLat(cols + xoff + 0.5, rows + yoff + 0.5)
+                own = self.index.findAll(lngs, lats) == k
+                rows, cols = rows[own], cols[own]
+
+            z = dem._readWindow(*window)[rows, cols].astype(np.float64)
+            if dem.nodata is not None:
+                z = z[z != dem.nodata]
+            values.append(z[~np.isnan(z)])
+
+        z = np.concatenate(values) if len(values) > 0 else np.zeros(0)
+
+        if len(z) == 0:
+            nan = float('nan')
+            return {'count': 0, 'min': nan, 'max': nan, 'mean': nan,
+                    'std': nan,
+                    'percentiles': dict((p, nan) for p in percentiles)}
+
+        return {'count': len(z),
+                'min': float(z.min()),
+                'max': float(z.max()),
+                'mean': float(z.mean()),
+                'std': float(z.std()),
+                'percentiles': dict(zip(percentiles,
+                                        np.percentile(z, percentiles)))}
 
 if __name__ == '__main__':
     
@@ -2,31 +2,117 @@ from __future__ import print_function
 
 # Copyright (c) 2014, Roger Lew [see LICENSE.txt]
 #
-# The project described was supported by NSF award number IIA-1301792 
+# The project described was supported by NSF award number IIA-1301792
 # from the NSF Idaho EPSCoR Program and by the National Science Foundation.
 
-import argparse    
+import argparse
 import re
 import os
 import time
 
 from elevationService import Server
 
+# the kml is read CHUNK_SIZE bytes at a time. Locations ending in the last
+# CHUNK_TAIL bytes read are left for the next chunk so locations split
+# between chunks are never replaced.
+CHUNK_SIZE = 1 << 22
+CHUNK_TAIL = 4096
+
+# elevations of at most MAX_CACHED unique locations are remembered
+MAX_CACHED = 1 << 20
+
+def fillAltitudes(kml, newkml, server, zero='', zoffset=0.0,
+                  chunk_size=CHUNK_SIZE):
+    """
+    Writes kml to newkml with the altitude of every lng,lat location set
+    to its elevation plus zoffset. With zero only locations with that
+    altitude (lng,lat,zero) are filled, otherwise the altitude is appended
+    to lng,lat locations.
+
+    The kml is filled in a single pass. The locations of each chunk that
+    aren't cached are fetched with one server.getElevations call and the
+    chunk is written as it is filled, so memory is bounded by the chunk
+    size and the cache instead of the size of the kml.
+
+    returns the number of locations filled and the number of elevations
+    fetched
+    """
+    pattern = r'(\-?\d+(\.\d+)?),\s*(\-?\d+(\.\d+)?)' + \
+              (r',\s*' + re.escape(zero), '')[zero=='']
+    pattern = re.compile(pattern.encode('ascii'))
+
+    cache = {}
+    n = nfetched = 0
+
+    with open(kml, 'rb') as fin, open(newkml, 'wb') as fout:
+        buf = b''
+        eof = False
+        while not eof:
+            data = fin.read(chunk_size)
+            eof = len(data) == 0
+            buf += data
+
+            # the locations complete in buf and where the filled part ends
+            limit = len(buf) - CHUNK_TAIL
+            matches = []
+            cut = len(buf)
+            for m in pattern.finditer(buf):
+                if not eof and m.end() > limit:
+                    cut = m.start()
+                    break
+                matches.append(m)
+            else:
+                if not eof:
+                    cut = max(0, limit)
+                    if len(matches) > 0:
+                        cut = max(cut, matches[-1].end())
+
+            # fetch the elevations of the new locations in one batch
+            if len(cache) > MAX_CACHED:
+                cache.clear()
+            new = list(set(m.group(0) for m in matches) - set(cache))
+            if len(new) > 0:
+                coords = []
+                for old in new:
+                    lng, lat = old.split(b',')[:2]
+                    coords.append([float(lng), float(lat)])
+                for old, z in zip(new, server.getElevations(coords)):
+                    cache[old] = z
+                nfetched += len(new)
+
+            # write the chunk with its locations filled
+            pos = 0
+            for m in matches:
+                old, z = m.group(0), cache[m.group(0)]
+                if zero == '':
+                    fout.write(buf[pos:m.end()])
+                    fout.write(b',' + ('%f' % (z + zoffset)).encode('ascii'))
+                else:
+                    fout.write(buf[pos:m.end() - len(zero)])
+                    fout.write(str(z + zoffset).encode('ascii'))
+                pos = m.end()
+            fout.write(buf[pos:cut])
+
+            n += len(matches)
+            buf = buf[cut:]
+
+    return n, nfetched
+
 if __name__ == "__main__":
     t0 = time.time()
 
     server = Server.getInstance()
 
     parser = argparse.ArgumentParser()
-    parser.add_argument('kml', type=str,   
+    parser.add_argument('kml', type=str,
                         help='kml to fill               ("")')
-    parser.add_argument('-z', '--zval',     type=str, 
+    parser.add_argument('-z', '--zval',     type=str,
                         help='value to replace          (0)')
-    parser.add_argument('-f', '--offset',   type=float, 
+    parser.add_argument('-f', '--offset',   type=float,
                         help='z offset                  (0)')
-    parser.add_argument('-o', '--outfile',   type=str,   
+    parser.add_argument('-o', '--outfile',   type=str,
                         help='Output file               (<ORIGINAL_NAME>.alt.kml)')
-    
+
     args = parser.parse_args()
 
     kml = args.kml
@@ -38,48 +124,12 @@ if __name__ == "__main__":
     #zero = ''
     #zoffset = 1
     #newkml = 'testdata/subcatchments1.kml'
-   
-    pattern = '(\-?\d+(\.\d+)?),\s*(\-?\d+(\.\d+)?)' + (',\s*' + zero, '')[zero=='']
-
-    print('Finding locations in %s...'%kml)
-    with open(kml) as f:
-        string = f.read()
-        
-    result_iter = re.finditer(pattern, string)
-
-    print('Determining unique locations...' )
-    replacement_set = set()
-    for m in result_iter:
-        replacement_set.add(m.group(0))
-    replacement_set = list(replacement_set)
-    n = len(replacement_set)
-    
-    print('Fetching %i elevations...'%n)
-    t0_f = time.time()
-    coord_list = []
-    for p in replacement_set:
-        lng,lat = p.split(',')[:2]
-        coord_list.append('%s,%s'%(lng, lat))
-
-    elevations = server.getElevations(coord_list)
-    tend_f = time.time() - t0_f
-    print('  Fetching %i locations took %0.2f seconds (%0.2f locations/second)'%\
-          (n, tend_f, n/tend_f))
-
-    print('\nWriting new kml...')
-    
-    if zero == '':
-        for old, z in zip(replacement_set, elevations):
-            new = '%s,%f'%(old, z + zoffset)
-            string = string.replace(old, new)
-    else:
-        for old, z in zip(replacement_set, elevations):
-            new = old[:-len(zero)] + str(z + zoffset)
-            string = string.replace(old, new)
-
-    with open(newkml, 'wb') as f:
-        f.write(string)
-        
+
+    print('Filling locations of %s...'%kml)
+    n, nfetched = fillAltitudes(kml, newkml, server, zero, zoffset)
+
+    tend = time.time() - t0
     print('Done.\n\n'\
-          'Conversion took %0.2f seconds and replaced %i unique locations'\
-          %(time.time()-t0, n))
+          'Conversion took %0.2f seconds and filled %i locations '\
+          '(%i elevations fetched, %0.2f locations/second)'\
+          %(tend, n, nfetched, n/tend))
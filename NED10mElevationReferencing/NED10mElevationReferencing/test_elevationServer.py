@@ -0,0 +1,148 @@
+from __future__ import print_function
+
+# Copyright (c) 2014, Roger Lew [see LICENSE.txt]
+#
+# The project described was supported by NSF award number IIA-1301792
+# from the NSF Idaho EPSCoR Program and by the National Science Foundation.
+
+import json
+import threading
+import unittest
+
+try:
+    from urllib2 import urlopen, Request, HTTPError
+except ImportError:
+    from urllib.request import urlopen, Request
+    from urllib.error import HTTPError
+
+from elevationServer import Coalescer, ElevationHandler, ElevationHTTPServer
+
+class StubServer:
+    """
+    stands in for elevationService.Server. Elevations are lng + lat, points
+    east of the prime meridian are outside the DEMs and a lng of -1 fails
+    like an unreadable DEM.
+    """
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def getElevations(self, coordinates, method='bilinear', epsg=None):
+        with self.lock:
+            self.calls.append(len(coordinates))
+        if epsg is not None and epsg != 4269:
+            raise ValueError('unknown EPSG code %s' % epsg)
+        if any(lng == -1.0 for lng, lat in coordinates):
+            raise IOError('unable to read the DEM')
+        assert all(lng < 0.0 for lng, lat in coordinates)
+        return [lng + lat for lng, lat in coordinates]
+
+    def getProfile(self, coordinates, spacing=10.0, method='bilinear',
+                   epsg=None):
+        if any(lng == -1.0 for lng, lat in coordinates):
+            raise IOError('unable to read the DEM')
+        n = len(coordinates)
+        return {'lng': [c[0] for c in coordinates],
+                'lat': [c[1] for c in coordinates],
+                'distance': [i * spacing for i in range(n)],
+                'elevation': [c[0] + c[1] for c in coordinates],
+                'slope': [0.0] * n,
+                'gain': [0.0] * n,
+                'loss': [0.0] * n}
+
+class Test_ElevationHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer()
+        ElevationHandler.coalescer = Coalescer(self.server, wait=0.25)
+
+        self.httpd = ElevationHTTPServer(('127.0.0.1', 0), ElevationHandler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%i' % self.httpd.server_address[1]
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _request(self, path, body=None):
+        """
+        returns the status code and the decoded JSON response
+        """
+        if body is not None:
+            body = body.encode('utf-8')
+        try:
+            response = urlopen(Request(self.url + path, body))
+        except HTTPError as e:
+            response = e
+        return response.code, json.loads(response.read().decode('utf-8'))
+
+    def test_get(self):
+        code, response = self._request(
+            '/elevations?locations=-116.5,47.5%20-116.25,47.75')
+        self.assertEqual(code, 200)
+        self.assertEqual(response['status'], 'OK')
+        self.assertEqual([r['elevation'] for r in response['results']],
+                         [-69.0, -68.5])
+        self.assertEqual(response['results'][1]['location'],
+                         {'lat': 47.75, 'lng': -116.25})
+
+    def test_post(self):
+        code, response = self._request(
+            '/elevations', json.dumps({'locations': [[-116.5, 47.5]],
+                                       'method': 'cubic'}))
+        self.assertEqual(code, 200)
+        self.assertEqual(response['results'][0]['elevation'], -69.0)
+
+        code, response = self._request('/elevations', '-116.5,47.5')
+        self.assertEqual(code, 200)
+        self.assertEqual(response['results'][0]['elevation'], -69.0)
+
+    def test_profile(self):
+        code, response = self._request(
+            '/profile?path=-116.5,47.5%20-116.25,47.75&spacing=20')
+        self.assertEqual(code, 200)
+        self.assertEqual([r['distance'] for r in response['results']],
+                         [0.0, 20.0])
+
+    def test_invalid_request(self):
+        for path in ('/elevations?locations=abc',
+                     '/elevations?locations=116.5,47.5',
+                     '/elevations?locations=-116.5,47.5&epsg=9999',
+                     '/profile?path=-116.5,47.5&spacing=-1'):
+            code, response = self._request(path)
+            self.assertEqual(code, 400, path)
+            self.assertEqual(response['status'], 'INVALID_REQUEST')
+
+    def test_server_error(self):
+        for path in ('/elevations?locations=-1,47.5',
+                     '/profile?path=-1,47.5'):
+            code, response = self._request(path)
+            self.assertEqual(code, 500, path)
+            self.assertEqual(response['status'], 'UNKNOWN_ERROR')
+            self.assertEqual(response['error_message'],
+                             'unable to read the DEM')
+
+    def test_coalesced(self):
+        results = {}
+        def request(i):
+            results[i] = self._request(
+                '/elevations?locations=-116.5,%i' % i)
+
+        threads = [threading.Thread(target=request, args=(i,))
+                   for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # every request arrived within the coalescing window
+        self.assertEqual(self.server.calls, [8])
+        for i in range(8):
+            code, response = results[i]
+            self.assertEqual(code, 200)
+            self.assertEqual(response['results'][0]['elevation'], i - 116.5)
+
+if __name__ == '__main__':
+    unittest.main()
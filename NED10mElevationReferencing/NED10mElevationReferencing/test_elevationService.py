@@ -0,0 +1,855 @@
+from __future__ import print_function
+
+# Copyright (c) 2014, Roger Lew [see LICENSE.txt]
+#
+# The project described was supported by NSF award number IIA-1301792
+# from the NSF Idaho EPSCoR Program and by the National Science Foundation.
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+from scipy import ndimage
+
+from osgeo import gdal
+from osgeo import osr
+
+import elevationService
+from elevationService import BlockCache, GeoTiff, HandlePool, Server, \
+                             TileIndex, EARTH_RADIUS, _densify, \
+                             _getTransform, _haversine, _interpolate, \
+                             _loadTileInfo, _rings, _saveTileInfo, \
+                             _weights, readKmlPolygons, transformCoordinates
+from singletonmixin import forgetAllSingletons
+import kml_altitudefiller
+
+class Test_interpolate(unittest.TestCase):
+
+    def setUp(self):
+        rand = np.random.RandomState(0)
+        self.data = rand.uniform(0.0, 100.0, (12, 15))
+
+        # points inside the raster, on its edges and beyond them
+        self.u = rand.uniform(-2.0, 16.0, 500)
+        self.v = rand.uniform(-2.0, 13.0, 500)
+
+    def test_bilinear(self):
+        expected = ndimage.map_coordinates(self.data, [self.v, self.u],
+                                           order=1, mode='nearest')
+        np.testing.assert_allclose(
+            _interpolate(self.data, self.u, self.v, 'bilinear'), expected)
+
+    def test_nodes(self):
+        rows, cols = np.mgrid[0:12, 0:15]
+        u, v = cols.ravel().astype(np.float64), rows.ravel().astype(np.float64)
+        for method in ('nearest', 'bilinear', 'cubic'):
+            np.testing.assert_allclose(_interpolate(self.data, u, v, method),
+                                       self.data.ravel())
+
+    def test_cubic_reproduces_quadratics(self):
+        rows, cols = np.mgrid[0:12, 0:15].astype(np.float64)
+        quadratic = lambda x, y: 2.0 + 0.5 * x - 3.0 * y + 0.25 * x * x + \
+                                 0.1 * x * y - 0.75 * y * y
+        data = quadratic(cols, rows)
+
+        # the kernel needs a pixel of margin on every side
+        u = np.random.RandomState(1).uniform(1.0, 13.0, 500)
+        v = np.random.RandomState(2).uniform(1.0, 10.0, 500)
+        np.testing.assert_allclose(_interpolate(data, u, v, 'cubic'),
+                                   quadratic(u, v))
+
+    def test_weights_sum_to_one(self):
+        t = np.linspace(0.0, 1.0, 11)
+        for method in ('bilinear', 'cubic'):
+            np.testing.assert_allclose(_weights(t, method).sum(axis=1), 1.0)
+
+def _info(left, upper, xsize, ysize, cellsize=0.001):
+    """
+    the GeoTiff.getInfo dict of a lat/long tile, so tiles can be made
+    without files
+    """
+    return {'transform': [left, cellsize, 0.0, upper, 0.0, -cellsize],
+            'size': [xsize, ysize], 'block': [xsize, 1], 'dtype': '<f4',
+            'nodata': None, 'wkt': ''}
+
+def _writeTile(fname, data, left, upper, cellsize=0.001, nodata=None,
+               wkt=None):
+    """
+    writes data to a Float32 GeoTIFF with its upper left corner at
+    (left, upper)
+    """
+    h, w = data.shape
+    ds = gdal.GetDriverByName('GTiff').Create(fname, w, h, 1,
+                                              gdal.GDT_Float32)
+    ds.SetGeoTransform((left, cellsize, 0.0, upper, 0.0, -cellsize))
+    if wkt is not None:
+        ds.SetProjection(wkt)
+    band = ds.GetRasterBand(1)
+    if nodata is not None:
+        band.SetNoDataValue(nodata)
+    band.WriteArray(data)
+    ds = None
+
+class Test_TileIndex(unittest.TestCase):
+
+    def setUp(self):
+        # a row of three tiles, a tile of another size below them, a tile
+        # overlapping two others and a detached tile
+        extents = [(-117.0, 48.0, 400, 300), (-116.6, 48.0, 400, 300),
+                   (-116.2, 48.0, 400, 300), (-117.0, 47.7, 250, 500),
+                   (-116.7, 47.8, 300, 300), (-114.0, 46.0, 100, 100)]
+        self.dems = [GeoTiff('tile%i' % k, info=_info(*extent))
+                     for k, extent in enumerate(extents)]
+        self.index = TileIndex(self.dems)
+
+        rand = np.random.RandomState(4)
+        lngs = list(rand.uniform(-117.5, -113.5, 2000))
+        lats = list(rand.uniform(45.5, 48.5, 2000))
+
+        # points on the edges and corners of every tile
+        for dem in self.dems:
+            for lng in (dem.left, (dem.left + dem.right) / 2.0, dem.right):
+                for lat in (dem.lower, (dem.lower + dem.upper) / 2.0,
+                            dem.upper):
+                    lngs.append(lng)
+                    lats.append(lat)
+
+        self.lngs, self.lats = np.array(lngs), np.array(lats)
+
+    def _scan(self, lng, lat):
+        for k, dem in enumerate(self.dems):
+            if (lng, lat) in dem:
+                return k
+        return -1
+
+    def test_find(self):
+        expected = [self._scan(lng, lat)
+                    for lng, lat in zip(self.lngs, self.lats)]
+        self.assertIn(-1, expected)
+
+        found = [self.index.find(lng, lat)
+                 for lng, lat in zip(self.lngs, self.lats)]
+        self.assertEqual([-1 if dem is None else self.dems.index(dem)
+                          for dem in found], expected)
+
+        self.assertEqual(self.index.findAll(self.lngs, self.lats).tolist(),
+                         expected)
+
+    def test_groupByTile(self):
+        groups, missing = self.index.groupByTile(self.lngs, self.lats)
+
+        expected = np.array([self._scan(lng, lat)
+                             for lng, lat in zip(self.lngs, self.lats)])
+        self.assertEqual(missing.tolist(),
+                         np.nonzero(expected == -1)[0].tolist())
+        for k, pts in groups.items():
+            self.assertEqual(sorted(pts.tolist()),
+                             np.nonzero(expected == k)[0].tolist())
+
+    def test_findBox(self):
+        for left, lower, right, upper in [(-116.9, 47.5, -116.5, 47.9),
+                                          (-118.0, 45.0, -113.0, 49.0),
+                                          (-115.0, 45.0, -114.5, 45.5)]:
+            expected = [k for k, dem in enumerate(self.dems)
+                        if dem.left < right and left < dem.right and
+                           dem.lower < upper and lower < dem.upper]
+            self.assertEqual(self.index.findBox(left, lower, right, upper),
+                             expected)
+
+class Test_BlockCache(unittest.TestCase):
+
+    def setUp(self):
+        # room for three 1 kB blocks
+        self.cache = BlockCache(3 * 1024)
+        self.reads = []
+
+    def _get(self, key):
+        def read():
+            self.reads.append(key)
+            return np.zeros(128, dtype=np.float64) + key
+        return self.cache.get(key, read)
+
+    def test_lru(self):
+        for key in (0, 1, 2, 0, 3):
+            self.assertEqual(self._get(key)[0], key)
+
+        # 1 was the least recently used when 3 was added
+        self.assertEqual(list(self.cache.blocks.keys()), [2, 0, 3])
+        self.assertEqual(self.reads, [0, 1, 2, 3])
+
+        self._get(1)
+        self.assertEqual(list(self.cache.blocks.keys()), [0, 3, 1])
+        self.assertEqual(self.reads, [0, 1, 2, 3, 1])
+
+        stats = self.cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 5)
+        self.assertEqual(stats['evictions'], 2)
+        self.assertEqual(stats['blocks'], 3)
+        self.assertEqual(stats['nbytes'], 3 * 1024)
+        self.assertAlmostEqual(stats['hitrate'], 1.0 / 6.0)
+
+    def test_hits(self):
+        for i in range(10):
+            self._get(0)
+            self._get(1)
+        self.assertEqual(self.reads, [0, 1])
+
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']),
+                         (18, 2, 0))
+
+    def test_oversized_block(self):
+        # a block larger than the cache is kept until the next one arrives
+        cache = BlockCache(100)
+        cache.get('a', lambda: np.zeros(1000))
+        self.assertEqual(list(cache.blocks.keys()), ['a'])
+        cache.get('b', lambda: np.zeros(1000))
+        self.assertEqual(list(cache.blocks.keys()), ['b'])
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+class Test_HandlePool(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.fnames = [os.path.join(self.tmpdir, 'tile%i.tif' % k)
+                       for k in range(3)]
+        for k, fname in enumerate(self.fnames):
+            _writeTile(fname, np.zeros((10, 10), dtype=np.float32) + k,
+                       -117.0 + k * 0.01, 48.0)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_reused(self):
+        pool = HandlePool(8)
+        first = [pool.get(fname) for fname in self.fnames]
+        again = [pool.get(fname) for fname in self.fnames]
+        for a, b in zip(first, again):
+            self.assertIs(a[0], b[0])
+            self.assertIs(a[1], b[1])
+
+        self.assertEqual(first[1][1].ReadAsArray()[0, 0], 1.0)
+        self.assertEqual(pool.stats()['opens'], 3)
+        self.assertEqual(pool.stats()['open'], 3)
+
+    def test_threads(self):
+        pool = HandlePool(8)
+        main = pool.get(self.fnames[0])
+
+        # the threads stay alive until all of them have their handles, the
+        # ident of a finished thread can be reused
+        handles = {}
+        ready = [threading.Event() for i in range(4)]
+        done = threading.Event()
+        def get(i):
+            handles[i] = [pool.get(self.fnames[0]), pool.get(self.fnames[0])]
+            ready[i].set()
+            done.wait()
+
+        threads = [threading.Thread(target=get, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for event in ready:
+            event.wait()
+        done.set()
+        for thread in threads:
+            thread.join()
+
+        # one handle per thread, reused within the thread
+        datasets = [main[0]]
+        for a, b in handles.values():
+            self.assertIs(a[0], b[0])
+            datasets.append(a[0])
+        self.assertEqual(len(set(id(ds) for ds in datasets)), 5)
+        self.assertEqual(pool.stats()['opens'], 5)
+
+    def test_evictions(self):
+        pool = HandlePool(2)
+        first = pool.get(self.fnames[0])
+        pool.get(self.fnames[1])
+        pool.get(self.fnames[0])
+        pool.get(self.fnames[2])
+
+        # tile1 was the least recently used
+        self.assertIs(pool.get(self.fnames[0])[0], first[0])
+        self.assertEqual(pool.stats()['evictions'], 1)
+        pool.get(self.fnames[1])
+
+        stats = pool.stats()
+        self.assertEqual((stats['open'], stats['opens'], stats['evictions']),
+                         (2, 4, 2))
+
+class Test_useMemmap(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.fname = os.path.join(self.tmpdir, 'ned_01', 'w001001.adf')
+        os.makedirs(os.path.dirname(self.fname))
+        self.data = np.random.RandomState(5).uniform(
+            0.0, 1000.0, (30, 40)).astype(np.float32)
+        _writeTile(self.fname, self.data, -117.0, 48.0)
+        self.memmap_dir = os.path.join(self.tmpdir, 'memmap')
+
+        # records the renames, the copy must be complete before it's
+        # renamed to its final name
+        self.replaced = []
+        self.replace = elevationService._replace
+        def replace(src, dst):
+            self.assertEqual(os.path.getsize(src), self.data.nbytes)
+            self.replaced.append((src, dst))
+            self.replace(src, dst)
+        elevationService._replace = replace
+
+    def tearDown(self):
+        elevationService._replace = self.replace
+        shutil.rmtree(self.tmpdir)
+
+    def test_memmap(self):
+        dem = GeoTiff(self.fname)
+        dem.useMemmap(self.memmap_dir)
+
+        self.assertEqual(len(self.replaced), 1)
+        tmp, path = self.replaced[0]
+        self.assertEqual(path, dem.memmap_path)
+        self.assertEqual(os.path.dirname(tmp), self.memmap_dir)
+        self.assertEqual(os.listdir(self.memmap_dir), [os.path.basename(path)])
+        self.assertTrue(os.path.basename(path).startswith('ned_01-'))
+
+        np.testing.assert_array_equal(dem._readWindow(0, 0, 40, 30),
+                                      self.data)
+        np.testing.assert_array_equal(dem._readWindow(5, 7, 10, 3),
+                                      self.data[7:10, 5:15])
+
+    def test_reused(self):
+        GeoTiff(self.fname).useMemmap(self.memmap_dir)
+        GeoTiff(self.fname).useMemmap(self.memmap_dir)
+        self.assertEqual(len(self.replaced), 1)
+
+        # the copy is rewritten once the DEM is newer than it
+        path = self.replaced[0][1]
+        st = os.stat(path)
+        os.utime(path, (st.st_atime, st.st_mtime - 10.0))
+
+        dem = GeoTiff(self.fname)
+        dem.useMemmap(self.memmap_dir)
+        self.assertEqual(len(self.replaced), 2)
+        self.assertEqual(os.listdir(self.memmap_dir), [os.path.basename(path)])
+        np.testing.assert_array_equal(dem._readWindow(0, 0, 40, 30),
+                                      self.data)
+
+class Test_tileIndexFile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.index_file = os.path.join(self.tmpdir,
+                                       elevationService.TILE_INDEX_FILENAME)
+        for k in range(3):
+            _writeTile(os.path.join(self.tmpdir, 'tile%i.tif' % k),
+                       np.zeros((10, 10), dtype=np.float32),
+                       -117.0 + k * 0.01, 48.0)
+
+    def tearDown(self):
+        forgetAllSingletons()
+        shutil.rmtree(self.tmpdir)
+
+    def _server(self):
+        forgetAllSingletons()
+        return Server.getInstance(neddir=self.tmpdir, dem_filename='*.tif')
+
+    def _write(self, index):
+        with open(self.index_file, 'w') as f:
+            f.write(index)
+
+    def test_roundtrip(self):
+        infos = {'tile0.tif': {'size': [10, 10]}}
+        _saveTileInfo(self.index_file, infos)
+        self.assertEqual(_loadTileInfo(self.index_file), infos)
+        self.assertEqual([f for f in os.listdir(self.tmpdir)
+                          if f.endswith('.tmp')], [])
+
+    def test_invalid(self):
+        self.assertEqual(_loadTileInfo(self.index_file), {})
+
+        self._write('{"version": ')
+        self.assertEqual(_loadTileInfo(self.index_file), {})
+
+        self._write('[1, 2]')
+        self.assertEqual(_loadTileInfo(self.index_file), {})
+
+        # entries of other versions (or without one) are ignored
+        tiles = {'tile0.tif': {'size': [10, 10]}}
+        for version in (None, elevationService.TILE_INDEX_VERSION + 1):
+            self._write(json.dumps({'version': version, 'tiles': tiles}))
+            self.assertEqual(_loadTileInfo(self.index_file), {})
+        self._write(json.dumps({'tiles': tiles}))
+        self.assertEqual(_loadTileInfo(self.index_file), {})
+
+    def test_server(self):
+        # the first Server opens every tile and writes the index
+        server = self._server()
+        self.assertEqual(server.getHandleStats()['opens'], 3)
+        infos = _loadTileInfo(self.index_file)
+        self.assertEqual(sorted(infos), sorted(dem.fname for dem in server.dems))
+
+        # the next one opens none
+        server = self._server()
+        self.assertEqual(server.getHandleStats()['opens'], 0)
+        self.assertEqual(sorted(dem.left for dem in server.dems),
+                         [-117.0, -116.99, -116.98])
+
+    def test_server_rebuilds(self):
+        self._server()
+        with open(self.index_file) as f:
+            index = json.load(f)
+
+        # an index of another version is rebuilt
+        index['version'] = elevationService.TILE_INDEX_VERSION + 1
+        self._write(json.dumps(index))
+        server = self._server()
+        self.assertEqual(server.getHandleStats()['opens'], 3)
+        with open(self.index_file) as f:
+            self.assertEqual(json.load(f)['version'],
+                             elevationService.TILE_INDEX_VERSION)
+
+        # as are stale entries: the tile changed after it was indexed
+        fname = os.path.join(self.tmpdir, 'tile1.tif')
+        _writeTile(fname, np.zeros((20, 10), dtype=np.float32), -116.5, 47.0)
+        st = os.stat(fname)
+        os.utime(fname, (st.st_atime, st.st_mtime + 10.0))
+
+        server = self._server()
+        self.assertEqual(server.getHandleStats()['opens'], 1)
+        dem = [dem for dem in server.dems if dem.fname == fname][0]
+        self.assertEqual((dem.left, dem.ysize), (-116.5, 20))
+        self.assertEqual(_loadTileInfo(self.index_file)[fname]['size'],
+                         [10, 20])
+
+        # unparsable indexes too
+        self._write('not json')
+        self.assertEqual(self._server().getHandleStats()['opens'], 3)
+        self.assertEqual(len(_loadTileInfo(self.index_file)), 3)
+
+def _epsgWkt(epsg):
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(epsg)
+    return srs.ExportToWkt()
+
+class Test_transformCoordinates(unittest.TestCase):
+
+    def setUp(self):
+        self.wkt = _epsgWkt(4269)
+
+        # (-116.5, 47.5) in Web Mercator
+        self.x, self.y = -12968720.677416371, 6024072.119373783
+
+    def test_known_point(self):
+        lngs, lats = transformCoordinates([self.x], [self.y], 3857, self.wkt)
+        self.assertAlmostEqual(lngs[0], -116.5, 6)
+        self.assertAlmostEqual(lats[0], 47.5, 6)
+
+    def test_roundtrip(self):
+        lngs = np.linspace(-117.0, -111.0, 25)
+        lats = np.linspace(42.0, 49.0, 25)
+        xs, ys = transformCoordinates(lngs, lats, 4269, _epsgWkt(3857))
+
+        lngs2, lats2 = transformCoordinates(xs, ys, 3857, self.wkt)
+        np.testing.assert_allclose(lngs2, lngs, atol=1e-7)
+        np.testing.assert_allclose(lats2, lats, atol=1e-7)
+
+    def test_cached_per_thread(self):
+        ct = _getTransform(3857, self.wkt)
+        self.assertIs(_getTransform(3857, self.wkt), ct)
+        self.assertIsNot(_getTransform(4269, self.wkt), ct)
+
+        cts = []
+        thread = threading.Thread(
+            target=lambda: cts.append(_getTransform(3857, self.wkt)))
+        thread.start()
+        thread.join()
+        self.assertIsNot(cts[0], ct)
+
+    def test_unknown_epsg(self):
+        self.assertRaises(ValueError, transformCoordinates,
+                          [self.x], [self.y], 999999, self.wkt)
+
+    def test_empty(self):
+        xs, ys = transformCoordinates([], [], 3857, self.wkt)
+        self.assertEqual((len(xs), len(ys)), (0, 0))
+
+class Test_getElevationsEpsg(unittest.TestCase):
+
+    def setUp(self):
+        # elevations vary linearly with lng and lat so bilinear
+        # interpolation is exact between pixel centers
+        self.tmpdir = tempfile.mkdtemp()
+        rows, cols = np.mgrid[0:200, 0:200] + 0.5
+        lngs, lats = -117.0 + 0.001 * cols, 47.6 - 0.001 * rows
+        self.plane = lambda lng, lat: 1000.0 * (lng + 117.0) + \
+                                      2000.0 * (lat - 47.4)
+        _writeTile(os.path.join(self.tmpdir, 'tile.tif'),
+                   self.plane(lngs, lats).astype(np.float32), -117.0, 47.6,
+                   wkt=_epsgWkt(4269))
+
+        forgetAllSingletons()
+        self.server = Server.getInstance(neddir=self.tmpdir,
+                                         dem_filename='*.tif')
+
+    def tearDown(self):
+        forgetAllSingletons()
+        shutil.rmtree(self.tmpdir)
+
+    def test_epsg(self):
+        lngs = [-116.95, -116.9123, -116.85]
+        lats = [47.45, 47.5, 47.5789]
+        expected = self.server.getElevations(list(zip(lngs, lats)))
+        np.testing.assert_allclose(expected,
+                                   [self.plane(lng, lat)
+                                    for lng, lat in zip(lngs, lats)],
+                                   atol=1e-2)
+
+        xs, ys = transformCoordinates(lngs, lats, 4269, _epsgWkt(3857))
+        elevs = self.server.getElevations(list(zip(xs, ys)), epsg=3857)
+        np.testing.assert_allclose(elevs, expected, atol=1e-3)
+
+class Test_densify(unittest.TestCase):
+
+    def test_haversine(self):
+        # a degree of latitude along a meridian
+        self.assertAlmostEqual(_haversine(-116.0, 47.0, -116.0, 48.0),
+                               EARTH_RADIUS * np.pi / 180.0, 6)
+
+        lngs = np.array([-116.0, -116.0, -116.0, -115.99])
+        lats = np.array([47.0, 47.01, 47.01, 47.01])
+        lng, lat, dist = _densify(lngs, lats, 100.0)
+
+        # the vertices are kept once and points are at most 100 m apart
+        seglen = _haversine(lngs[:-1], lats[:-1], lngs[1:], lats[1:])
+        n = int(np.ceil(seglen[0] / 100.0)) + int(np.ceil(seglen[2] / 100.0))
+        self.assertEqual(len(lng), n + 1)
+        for vlng, vlat in ((-116.0, 47.0), (-116.0, 47.01), (-115.99, 47.01)):
+            self.assertEqual(np.sum((lng == vlng) & (lat == vlat)), 1)
+
+        steps = np.diff(dist)
+        self.assertTrue(np.all(steps > 0.0))
+        self.assertTrue(np.all(steps <= 100.0 + 1e-9))
+        self.assertAlmostEqual(dist[-1], seglen.sum(), 6)
+
+        # distances along each segment are the great circle distances
+        # between the points
+        np.testing.assert_allclose(
+            steps, _haversine(lng[:-1], lat[:-1], lng[1:], lat[1:]),
+            rtol=1e-4)
+
+    def test_planar(self):
+        # 500 ft along a 3-4-5 triangle with 10 m spacing
+        lng, lat, dist = _densify(np.array([0.0, 300.0]),
+                                  np.array([0.0, 400.0]), 10.0, units=0.3048)
+        self.assertEqual(len(dist), 17)
+        np.testing.assert_allclose(dist, np.arange(17) * 152.4 / 16)
+        np.testing.assert_allclose(lng, np.arange(17) * 300.0 / 16)
+        np.testing.assert_allclose(lat, np.arange(17) * 400.0 / 16)
+
+    def test_single_point(self):
+        lng, lat, dist = _densify(np.array([-116.0]), np.array([47.0]), 10.0)
+        self.assertEqual((lng.tolist(), lat.tolist(), dist.tolist()),
+                         ([-116.0], [47.0], [0.0]))
+
+class Test_getProfile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        forgetAllSingletons()
+        shutil.rmtree(self.tmpdir)
+
+    def _server(self, left, upper, cellsize, wkt, plane):
+        # a plane sampled at pixel centers, bilinear interpolation of it is
+        # exact
+        rows, cols = np.mgrid[0:200, 0:200] + 0.5
+        data = plane(left + cellsize * cols, upper - cellsize * rows)
+        _writeTile(os.path.join(self.tmpdir, 'tile.tif'),
+                   data.astype(np.float64), left, upper, cellsize, wkt=wkt)
+
+        forgetAllSingletons()
+        return Server.getInstance(neddir=self.tmpdir, dem_filename='*.tif')
+
+    def test_geographic(self):
+        plane = lambda lng, lat: 1000.0 + 20000.0 * (lat - 47.4)
+        server = self._server(-117.0, 47.6, 0.001, _epsgWkt(4269), plane)
+        self.assertEqual(server.units, None)
+
+        # north 0.05 degrees then back south 0.02 degrees
+        coords = [(-116.9, 47.45), (-116.9, 47.5), (-116.9, 47.48)]
+        profile = server.getProfile(coords, spacing=50.0)
+
+        dist = np.array(profile['distance'])
+        self.assertTrue(np.all(np.diff(dist) <= 50.0 + 1e-9))
+        self.assertAlmostEqual(dist[-1], EARTH_RADIUS * np.radians(0.07), 3)
+
+        np.testing.assert_allclose(
+            profile['elevation'],
+            [plane(lng, lat) for lng, lat in zip(profile['lng'],
+                                                 profile['lat'])],
+            atol=1e-3)
+        self.assertAlmostEqual(profile['gain'][-1], 1000.0, 3)
+        self.assertAlmostEqual(profile['loss'][-1], 400.0, 3)
+
+        # 1000 m per 0.05 degrees of latitude
+        slope = 1000.0 / (EARTH_RADIUS * np.radians(0.05))
+        self.assertAlmostEqual(profile['slope'][1], slope, 6)
+        self.assertAlmostEqual(profile['slope'][-2], -slope, 6)
+
+    def test_projected(self):
+        plane = lambda x, y: 100.0 + 0.5 * x - 0.25 * y
+        server = self._server(0.0, 2000.0, 10.0, _epsgWkt(3857), plane)
+        units = server.units
+        self.assertTrue(units > 0.0)
+
+        # 500 units along a 3-4-5 triangle
+        profile = server.getProfile([(100.0, 100.0), (400.0, 500.0)],
+                                    spacing=25.0 * units)
+        self.assertEqual(len(profile['distance']), 21)
+        np.testing.assert_allclose(profile['distance'],
+                                   np.arange(21) * 25.0 * units)
+        np.testing.assert_allclose(profile['lng'], np.linspace(100.0, 400.0, 21))
+        np.testing.assert_allclose(
+            profile['elevation'],
+            [plane(x, y) for x, y in zip(profile['lng'], profile['lat'])],
+            atol=1e-6)
+
+        # 50 units of rise per 500 units
+        np.testing.assert_allclose(profile['slope'], 0.1 / units)
+        self.assertAlmostEqual(profile['gain'][-1], 50.0, 6)
+        self.assertEqual(profile['loss'][-1], 0.0)
+
+def _box(col0, row0, col1, row1, left=-117.0, upper=48.0, cellsize=0.01):
+    """
+    the ring of the box between pixel corners (col0, row0) and (col1, row1)
+    """
+    x0, x1 = left + col0 * cellsize, left + col1 * cellsize
+    y0, y1 = upper - row0 * cellsize, upper - row1 * cellsize
+    return [(x0, y0), (x1, y0), (x1, y1), (x0, y1)]
+
+class Test_rings(unittest.TestCase):
+
+    def test_formats(self):
+        closed = [(-116.0, 47.0), (-115.0, 47.0), (-115.0, 48.0),
+                  (-116.0, 47.0)]
+        for ring in ['-116,47 -115,47 -115,48',
+                     '-116,47,0 -115,47,0 -115,48,0 -116,47,0',
+                     ['-116,47', '-115,47', '-115,48'],
+                     [(-116, 47), (-115, 47), (-115, 48)],
+                     [[-116.0, 47.0, 0.0], [-115.0, 47.0, 0.0],
+                      [-115.0, 48.0, 0.0], [-116.0, 47.0, 0.0]]]:
+            self.assertEqual(_rings(ring), [closed], ring)
+
+    def test_holes(self):
+        outer = '-116,47 -115,47 -115,48 -116,48'
+        hole = [(-115.75, 47.25), (-115.25, 47.25), (-115.5, 47.75)]
+        for poly in ([outer, '-115.75,47.25 -115.25,47.25 -115.5,47.75'],
+                     [_rings(outer)[0], hole]):
+            rings = _rings(poly)
+            self.assertEqual(len(rings), 2)
+            self.assertEqual(rings[0][0], (-116.0, 47.0))
+            self.assertEqual(rings[0][-1], (-116.0, 47.0))
+            self.assertEqual(rings[1], hole + [hole[0]])
+
+class Test_readKmlPolygons(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.kml = os.path.join(self.tmpdir, 'polygons.kml')
+
+        def polygon(outer, *holes):
+            coords = lambda ring: ' '.join('%r,%r,0' % c for c in ring)
+            return ''.join(['<Polygon><outerBoundaryIs><LinearRing>',
+                            '<coordinates>%s</coordinates>' % coords(outer),
+                            '</LinearRing></outerBoundaryIs>'] +
+                           ['<innerBoundaryIs><LinearRing><coordinates>'
+                            '%s</coordinates></LinearRing></innerBoundaryIs>'
+                            % coords(hole) for hole in holes] +
+                           ['</Polygon>'])
+
+        self.square = _box(2, 3, 6, 8)
+        self.outer = _box(15, 0, 25, 4)
+        self.hole = _box(18, 1, 22, 3)
+        with open(self.kml, 'w') as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                    '<kml xmlns="http://www.opengis.net/kml/2.2"><Document>'
+                    '<Placemark><ExtendedData><SchemaData>'
+                    '<SimpleData name="DN">7</SimpleData>'
+                    '</SchemaData></ExtendedData>%s</Placemark>'
+                    '<Placemark><name>multi</name><MultiGeometry>%s%s'
+                    '</MultiGeometry></Placemark>'
+                    '</Document></kml>' %
+                    (polygon(self.square),
+                     polygon(self.outer, self.hole),
+                     polygon(_box(50, 50, 52, 52))))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_polygons(self):
+        polygons = readKmlPolygons(self.kml)
+        self.assertEqual([name for name, rings in polygons],
+                         ['7', 'multi', 'multi'])
+
+        name, rings = polygons[0]
+        self.assertEqual(len(rings), 1)
+        self.assertEqual(_rings(rings), _rings(self.square))
+
+        # the hole follows the outer ring
+        name, rings = polygons[1]
+        self.assertEqual(_rings(rings), _rings([self.outer, self.hole]))
+
+        self.assertEqual(_rings(polygons[2][1]),
+                         _rings(_box(50, 50, 52, 52)))
+
+class Test_getZonalStats(unittest.TestCase):
+
+    def setUp(self):
+        # two 20 x 20 tiles side by side. Pixel (row, col) of the pair
+        # holds 100 * row + col.
+        self.tmpdir = tempfile.mkdtemp()
+        rows, cols = np.mgrid[0:20, 0:40]
+        self.data = (100.0 * rows + cols).astype(np.float32)
+        self.data[4, 4] = -9999.0
+        for k in range(2):
+            _writeTile(os.path.join(self.tmpdir, 'tile%i.tif' % k),
+                       self.data[:, 20 * k:20 * (k + 1)],
+                       -117.0 + 0.2 * k, 48.0, 0.01, nodata=-9999.0,
+                       wkt=_epsgWkt(4269))
+
+        # a tile overlapping the right half of both, its pixels must not
+        # be counted twice
+        _writeTile(os.path.join(self.tmpdir, 'tile2.tif'),
+                   self.data[:, 10:30], -116.9, 48.0, 0.01, nodata=-9999.0,
+                   wkt=_epsgWkt(4269))
+
+        forgetAllSingletons()
+        self.server = Server.getInstance(neddir=self.tmpdir,
+                                         dem_filename='*.tif')
+
+    def tearDown(self):
+        forgetAllSingletons()
+        shutil.rmtree(self.tmpdir)
+
+    def _check(self, stats, values):
+        values = np.array(values, dtype=np.float64)
+        self.assertEqual(stats['count'], len(values))
+        self.assertEqual(stats['min'], values.min())
+        self.assertEqual(stats['max'], values.max())
+        self.assertAlmostEqual(stats['mean'], values.mean(), 6)
+        self.assertAlmostEqual(stats['std'], values.std(), 6)
+        for p, z in stats['percentiles'].items():
+            self.assertAlmostEqual(z, np.percentile(values, p), 6)
+
+    def test_zonal_stats(self):
+        square = _box(2, 3, 6, 8)
+        outer, hole = _box(15, 0, 25, 4), _box(18, 1, 22, 3)
+        stats = self.server.getZonalStats([square, [outer, hole],
+                                           _box(50, 50, 52, 52)], threads=2)
+
+        # pixel centers inside the square, less the nodata pixel
+        self._check(stats[0], [self.data[row, col]
+                               for row in range(3, 8) for col in range(2, 6)
+                               if (row, col) != (4, 4)])
+
+        # the polygon spans all three tiles
+        self._check(stats[1], [self.data[row, col]
+                               for row in range(0, 4) for col in range(15, 25)
+                               if not (1 <= row < 3 and 18 <= col < 22)])
+
+        self.assertEqual(stats[2]['count'], 0)
+        self.assertTrue(np.isnan(stats[2]['mean']))
+
+    def test_kml(self):
+        kml = os.path.join(self.tmpdir, 'square.kml')
+        with open(kml, 'w') as f:
+            f.write('<kml><Placemark><name>square</name><Polygon>'
+                    '<outerBoundaryIs><LinearRing><coordinates>%s'
+                    '</coordinates></LinearRing></outerBoundaryIs>'
+                    '</Polygon></Placemark></kml>' %
+                    ' '.join('%r,%r,0' % c for c in _box(30, 10, 33, 12)))
+
+        polygons = [rings for name, rings in readKmlPolygons(kml)]
+        stats = self.server.getZonalStats(polygons, percentiles=(50,))
+        self.assertEqual(list(stats[0]['percentiles']), [50])
+        self._check(stats[0], [self.data[row, col]
+                               for row in range(10, 12)
+                               for col in range(30, 33)])
+
+class FakeServer:
+    """
+    answers getElevations with lng + lat and remembers the calls
+    """
+    def __init__(self):
+        self.calls = []
+
+    def getElevations(self, coords):
+        self.calls.append(len(coords))
+        return [lng + lat for lng, lat in coords]
+
+class Test_fillAltitudes(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.kml = os.path.join(self.tmpdir, 'path.kml')
+
+        # repeated locations are fetched once
+        rand = np.random.RandomState(3)
+        self.coords = [(-116.0 - rand.randint(0, 50) / 100.0,
+                        47.0 + rand.randint(0, 50) / 100.0)
+                       for i in range(400)]
+        lines = ['<kml><Placemark><LineString><coordinates>']
+        lines.extend('%.2f,%.2f,0' % c for c in self.coords)
+        lines.append('</coordinates></LineString></Placemark></kml>')
+        with open(self.kml, 'w') as f:
+            f.write('\n'.join(lines))
+
+        self.tail = kml_altitudefiller.CHUNK_TAIL
+        kml_altitudefiller.CHUNK_TAIL = 32
+
+    def tearDown(self):
+        kml_altitudefiller.CHUNK_TAIL = self.tail
+        shutil.rmtree(self.tmpdir)
+
+    def _fill(self, chunk_size, zero='0'):
+        newkml = os.path.join(self.tmpdir, 'path.%i.kml' % chunk_size)
+        server = FakeServer()
+        n, nfetched = kml_altitudefiller.fillAltitudes(
+            self.kml, newkml, server, zero, zoffset=1.0, chunk_size=chunk_size)
+        with open(newkml) as f:
+            return f.read(), n, nfetched, server
+
+    def test_chunks(self):
+        expected, n, nfetched, server = self._fill(1 << 20)
+        self.assertEqual(n, len(self.coords))
+        self.assertEqual(nfetched, len(set(self.coords)))
+        self.assertEqual(len(server.calls), 1)
+
+        for lng, lat in self.coords:
+            self.assertIn('%.2f,%.2f,%s' % (lng, lat, lng + lat + 1.0),
+                          expected)
+
+        for chunk_size in (1, 7, 64, 1000):
+            filled, n, nfetched, server = self._fill(chunk_size)
+            self.assertEqual(filled, expected)
+            self.assertEqual(n, len(self.coords))
+            self.assertEqual(nfetched, len(set(self.coords)))
+
+    def test_append(self):
+        filled, n, nfetched, server = self._fill(64, zero='')
+        self.assertEqual(n, len(self.coords))
+
+        lng, lat = self.coords[0]
+        self.assertIn('%.2f,%.2f,%f,0' % (lng, lat, lng + lat + 1.0), filled)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+from __future__ import print_function
+
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+try:
+    from osgeo import gdal
+except ImportError:
+    import gdal
+
+from ydalinfo import configureGdal, ydalinfo, ydalinfo_async, asyncio
+
+class _RangeHandler(BaseHTTPRequestHandler):
+    """
+    serves the files of root with byte range support, standing in for a
+    remote archive read through /vsicurl/
+    """
+    root = None
+
+    def do_HEAD(self):
+        self._send(False)
+
+    def do_GET(self):
+        self._send(True)
+
+    def _send(self, bBody):
+        path = os.path.join(self.root, os.path.basename(self.path))
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        m = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range') or '')
+        if m:
+            start = int(m.group(1))
+            end = min(len(data) - 1, int(m.group(2) or len(data) - 1))
+            body = data[start:end + 1]
+            self.send_response(206)
+            self.send_header('Content-Range',
+                             'bytes %i-%i/%i' % (start, end, len(data)))
+        else:
+            body = data
+            self.send_response(200)
+
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if bBody:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@unittest.skipIf(asyncio is None, 'ydalinfo_async requires python 3')
+class Test_ydalinfo_async(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.root = tempfile.mkdtemp()
+        cls.names = []
+        for i in range(3):
+            name = 'dem%i.tif' % i
+            hDataset = gdal.GetDriverByName('GTiff').Create(
+                os.path.join(cls.root, name), 64, 48, 1, gdal.GDT_Float32)
+            hDataset.SetGeoTransform((500000.0 + i * 640, 10.0, 0.0,
+                                      5200000.0, 0.0, -10.0))
+            values = np.arange(64 * 48, dtype=np.float32).reshape(48, 64)
+            hDataset.GetRasterBand(1).WriteArray(values * (i + 1))
+            hDataset = None
+            cls.names.append(name)
+
+        _RangeHandler.root = cls.root
+        cls.httpd = HTTPServer(('127.0.0.1', 0), _RangeHandler)
+        thread = threading.Thread(target=cls.httpd.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        # the stand-in has no directory listings
+        gdal.SetConfigOption('GDAL_DISABLE_READDIR_ON_OPEN', 'EMPTY_DIR')
+
+    @classmethod
+    def tearDownClass(cls):
+        gdal.SetConfigOption('GDAL_DISABLE_READDIR_ON_OPEN', None)
+        cls.httpd.shutdown()
+        cls.httpd.server_close()
+        shutil.rmtree(cls.root)
+
+    def test_matches_local(self):
+        url = 'http://127.0.0.1:%i/' % self.httpd.server_address[1]
+
+        loop = asyncio.new_event_loop()
+        try:
+            futures = [ydalinfo_async('/vsicurl/' + url + name, loop=loop,
+                                      bComputeMinMax=True)
+                       for name in self.names]
+            gdicts = loop.run_until_complete(asyncio.gather(*futures))
+        finally:
+            loop.close()
+
+        for name, gdict in zip(self.names, gdicts):
+            local = ydalinfo(os.path.join(self.root, name),
+                             bComputeMinMax=True, nThreads=1)
+            self.assertEqual(gdict['Size'], local['Size'])
+            self.assertEqual(list(gdict['Geotransform']),
+                             list(local['Geotransform']))
+            self.assertEqual(gdict['Bands'][0]['ComputedMinMax'],
+                             local['Bands'][0]['ComputedMinMax'])
+
+    def test_running_loop(self):
+        nCacheMax = gdal.GetCacheMax()
+        pszChunkSize = gdal.GetConfigOption('CPL_VSIL_CURL_CHUNK_SIZE')
+
+        # without a loop the probes run on the running loop. They are
+        # started from a callback of the loop, as from an async def.
+        loop = asyncio.new_event_loop()
+        started = loop.create_future()
+        def probe():
+            started.set_result(asyncio.gather(*[
+                ydalinfo_async(os.path.join(self.root, name),
+                               nCacheMB=64, nReadAheadKB=256)
+                for name in self.names]))
+
+        try:
+            loop.call_soon(probe)
+            gdicts = loop.run_until_complete(
+                loop.run_until_complete(started))
+            self.assertEqual(gdal.GetCacheMax(), 64 * 1024 * 1024)
+            self.assertEqual(gdal.GetConfigOption('CPL_VSIL_CURL_CHUNK_SIZE'),
+                             str(256 * 1024))
+        finally:
+            loop.close()
+            gdal.SetCacheMax(nCacheMax)
+            gdal.SetConfigOption('CPL_VSIL_CURL_CHUNK_SIZE', pszChunkSize)
+
+        self.assertEqual([gdict['Size'] for gdict in gdicts], [[64, 48]] * 3)
+
+    def test_configure(self):
+        nCacheMax = gdal.GetCacheMax()
+        try:
+            configureGdal(nCacheMB=32)
+            self.assertEqual(gdal.GetCacheMax(), 32 * 1024 * 1024)
+
+            # values that are None are left alone
+            configureGdal()
+            self.assertEqual(gdal.GetCacheMax(), 32 * 1024 * 1024)
+        finally:
+            gdal.SetCacheMax(nCacheMax)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,328 @@
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from numpy.testing import assert_almost_equal
+
+try:
+    from osgeo import gdal
+except ImportError:
+    import gdal
+
+from ydalinfo import ydalinfo, _BandStats, _blockWindows, _checksumWindow, \
+                     _quicklookScan, _sampleErrors, _sampleWindows, \
+                     _validPixels
+
+class Test_BandStats(unittest.TestCase):
+
+    def test_merge(self):
+        values = np.random.RandomState(0).normal(800.0, 170.0, 100003)
+
+        oStats = _BandStats()
+        for part in np.array_split(values, 17):
+            oStats.merge(_BandStats.fromArray(part))
+
+        self.assertEqual(oStats.n, values.size)
+        self.assertEqual(oStats.min, values.min())
+        self.assertEqual(oStats.max, values.max())
+        assert_almost_equal(oStats.mean, values.mean(), 9)
+        assert_almost_equal(oStats.stddev, values.std(), 9)
+
+    def test_merge_order(self):
+        values = np.random.RandomState(1).uniform(-5.0, 5.0, 10000)
+        parts = np.array_split(values, 9)
+
+        a, b = _BandStats(), _BandStats()
+        for part in parts:
+            a.merge(_BandStats.fromArray(part))
+        for part in parts[::-1]:
+            b.merge(_BandStats.fromArray(part))
+
+        self.assertEqual(a.histogram(), b.histogram())
+
+    def test_histogram_byte(self):
+        values = np.arange(256, dtype=np.uint8).repeat(3)
+        oStats = _BandStats.fromArray(values)
+        dfMin, dfMax, nBuckets, panHistogram = oStats.histogram(bByte=True)
+
+        self.assertEqual((dfMin, dfMax, nBuckets), (-0.5, 255.5, 256))
+        self.assertEqual(panHistogram, [3] * 256)
+
+    def test_histogram_exact(self):
+        values = np.random.RandomState(4).randint(-40, 900, 50000)
+        oStats = _BandStats.fromArray(values)
+        dfMin, dfMax, nBuckets, panHistogram = oStats.histogram()
+
+        self.assertTrue(oStats.isHistogramExact())
+        self.assertEqual(panHistogram,
+                         np.histogram(values, nBuckets, (dfMin, dfMax))[0]
+                         .tolist())
+        self.assertTrue(_BandStats.fromArray(
+            np.arange(256, dtype=np.uint8)).isHistogramExact(bByte=True))
+
+    def test_histogram_float_approximate(self):
+        values = np.random.RandomState(5).normal(800.0, 170.0, 100000)
+        oStats = _BandStats.fromArray(values)
+        dfMin, dfMax, nBuckets, panHistogram = oStats.histogram()
+
+        self.assertFalse(oStats.isHistogramExact())
+        self.assertEqual(sum(panHistogram), values.size)
+
+    def test_nodata(self):
+        data = np.array([[1.0, -9999.0], [np.nan, 3.0]], dtype=np.float32)
+        oStats = _BandStats.fromArray(_validPixels(data, -9999.0))
+
+        self.assertEqual(oStats.n, 2)
+        self.assertEqual((oStats.min, oStats.max, oStats.mean), (1.0, 3.0, 2.0))
+
+class Test_checksumWindow(unittest.TestCase):
+
+    def _gdalChecksum(self, data):
+        # straight port of the loop in GDALChecksumImage
+        anPrimes = [7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43]
+        nChecksum, iPrime = 0, 0
+        for v in data.ravel():
+            if data.dtype.kind == 'f':
+                v = float(v) + 0.5
+                nVal = int(np.floor(min(max(v, -2147483647.0), 2147483647.0)))
+            else:
+                nVal = int(v)
+            nChecksum += int(np.fmod(nVal, anPrimes[iPrime]))
+            iPrime = (iPrime + 1) % 11
+            nChecksum &= 0xffff
+        return nChecksum
+
+    def _windowedChecksum(self, data):
+        nChecksum = 0
+        for yoff in range(0, data.shape[0], 8):
+            for xoff in range(0, data.shape[1], 5):
+                nChecksum += _checksumWindow(data[yoff:yoff+8, xoff:xoff+5],
+                                             xoff, yoff, data.shape[1])
+        return nChecksum & 0xffff
+
+    def test_int(self):
+        data = np.random.RandomState(2).randint(-500, 500, (37, 23))
+        self.assertEqual(self._windowedChecksum(data), self._gdalChecksum(data))
+
+    def test_float(self):
+        data = np.random.RandomState(3).normal(0.0, 1e3, (37, 23))
+        self.assertEqual(self._windowedChecksum(data), self._gdalChecksum(data))
+
+class _FakeBand(object):
+    """
+    stands in for a gdal.Band backed by an array, logging the windows read
+    """
+    def __init__(self, data, block=None, overviews=(), nodata=None):
+        self.data = data
+        self.YSize, self.XSize = data.shape
+        self.block = block or (self.XSize, 1)
+        self.overviews = list(overviews)
+        self.nodata = nodata
+        self.reads = []
+
+    def GetBlockSize(self):
+        return list(self.block)
+
+    def GetNoDataValue(self):
+        return self.nodata
+
+    def GetOverviewCount(self):
+        return len(self.overviews)
+
+    def GetOverview(self, i):
+        return self.overviews[i]
+
+    def ReadAsArray(self, xoff=0, yoff=0, win_xsize=None, win_ysize=None,
+                    buf_xsize=None, buf_ysize=None):
+        if win_xsize is None:
+            win_xsize, win_ysize = self.XSize, self.YSize
+        self.reads.append((xoff, yoff, win_xsize, win_ysize,
+                           buf_xsize, buf_ysize))
+        data = self.data[yoff:yoff + win_ysize, xoff:xoff + win_xsize]
+        if buf_xsize is not None:
+            # nearest neighbour decimation
+            rows = np.arange(buf_ysize) * win_ysize // buf_ysize
+            cols = np.arange(buf_xsize) * win_xsize // buf_xsize
+            data = data[rows][:, cols]
+        return data.copy()
+
+class Test_sample(unittest.TestCase):
+
+    def test_all_windows(self):
+        # strips of 16 rows, 63 windows are all read
+        hBand = _FakeBand(np.zeros((1000, 1000), dtype=np.uint8))
+        windows, nWindows, dfScale = _sampleWindows(hBand)
+
+        self.assertEqual(nWindows, 63)
+        self.assertEqual(windows, list(_blockWindows(hBand, 1 << 14)))
+        self.assertEqual(windows[1], (0, 16, 1000, 16))
+        self.assertEqual(windows[-1], (0, 992, 1000, 8))
+        self.assertEqual(dfScale, 1.0)
+
+    def test_subset(self):
+        # 16 x 12 tiles of 256 x 256, the last row and column are partial
+        hBand = _FakeBand(np.zeros((3000, 4000), dtype=np.uint8),
+                          block=(256, 256))
+        windows, nWindows, dfScale = _sampleWindows(hBand)
+
+        self.assertEqual(nWindows, 192)
+        self.assertEqual(len(windows), 64)
+        allWindows = list(_blockWindows(hBand, 1 << 14))
+        self.assertEqual(sorted(allWindows.index(w) for w in windows),
+                         [allWindows.index(w) for w in windows])
+        self.assertEqual(len(set(windows)), 64)
+
+        nSampled = sum(w[2] * w[3] for w in windows)
+        self.assertEqual(dfScale, 4000 * 3000 / float(nSampled))
+
+        # repeated runs sample the same windows
+        self.assertEqual(_sampleWindows(hBand)[0], windows)
+
+    def _jackknife(self, parts, nWindows):
+        """
+        standard errors of the mean, standard deviation and byte histogram
+        computed from the values left out of each window
+        """
+        k = len(parts)
+        values = np.concatenate(parts)
+        dfFpc = 1.0 - float(k) / nWindows
+
+        means, stds, props = [], [], []
+        for i in range(k):
+            rest = np.concatenate(parts[:i] + parts[i + 1:]).astype(np.float64)
+            means.append(rest.mean())
+            stds.append(rest.std())
+            props.append(np.bincount(rest.astype(np.int64), minlength=256) /
+                         float(len(rest)))
+
+        def se(theta):
+            theta = np.array(theta)
+            return np.sqrt(dfFpc * (k - 1.0) / k *
+                           np.square(theta - theta.mean(axis=0)).sum(axis=0))
+
+        return se(means), se(stds), se(props) * len(values)
+
+    def test_errors(self):
+        rand = np.random.RandomState(7)
+        parts = [rand.randint(0, 256, n).astype(np.uint8)
+                 for n in (500, 750, 500, 1000, 250, 600)]
+
+        partials = [_BandStats.fromArray(part) for part in parts]
+        oStats = _BandStats()
+        for part in parts:
+            oStats.merge(_BandStats.fromArray(part))
+
+        # the band holds twice the sampled pixels
+        errors = _sampleErrors(oStats, partials, 24, 2.0, True)
+        dfMean, dfStd, adfHist = self._jackknife(parts, 24)
+
+        self.assertEqual(errors['SampledFraction'], 0.25)
+        self.assertEqual(errors['SampledPixels'], 3600)
+        assert_almost_equal(errors['Mean'], dfMean, 9)
+        assert_almost_equal(errors['StdDev'], dfStd, 9)
+        assert_almost_equal(errors['Histogram'], 2.0 * adfHist, 6)
+
+    def test_census(self):
+        # every window was read, nothing left to estimate
+        parts = [np.arange(100, dtype=np.uint8) + i for i in range(4)]
+        oStats = _BandStats()
+        for part in parts:
+            oStats.merge(_BandStats.fromArray(part))
+
+        errors = _sampleErrors(oStats, [_BandStats.fromArray(part)
+                                        for part in parts], 4, 1.0, True)
+        self.assertEqual(errors['SampledFraction'], 1.0)
+        self.assertEqual((errors['Mean'], errors['StdDev']), (0.0, 0.0))
+        self.assertEqual(errors['Histogram'], [0.0] * 256)
+
+    def test_one_window(self):
+        oStats = _BandStats.fromArray(np.arange(10, dtype=np.uint8))
+        self.assertEqual(_sampleErrors(oStats, [oStats], 5, 5.0, True), None)
+
+class Test_quicklookScan(unittest.TestCase):
+
+    def setUp(self):
+        self.data = np.random.RandomState(8).randint(
+            0, 256, (1000, 2000)).astype(np.uint8)
+
+    def _check(self, oStats, values):
+        hist = oStats.histogram(bByte=True)
+        self.assertEqual(oStats.n, values.size)
+        self.assertEqual(hist[3], np.bincount(values.ravel(),
+                                              minlength=256).tolist())
+
+    def test_decimated(self):
+        hBand = _FakeBand(self.data)
+        oStats, size, dfScale = _quicklookScan(hBand, 20000)
+
+        # one read of the whole band decimated 10 times each way
+        self.assertEqual(hBand.reads, [(0, 0, 2000, 1000, 200, 100)])
+        self.assertEqual(size, (200, 100))
+        self.assertEqual(dfScale, 100.0)
+        self._check(oStats, self.data[::10, ::10])
+
+    def test_overview(self):
+        overviews = [_FakeBand(self.data[::n, ::n]) for n in (2, 4, 8)]
+        hBand = _FakeBand(self.data, overviews=overviews)
+        oStats, size, dfScale = _quicklookScan(hBand, 100000)
+
+        # the 500 x 250 overview is the coarsest with 100000 pixels
+        self.assertEqual(hBand.reads, [])
+        self.assertEqual([len(o.reads) for o in overviews], [0, 1, 0])
+        self.assertEqual(overviews[1].reads, [(0, 0, 500, 250, 447, 223)])
+        self.assertEqual(size, (447, 223))
+        self.assertEqual(dfScale, 2000 * 1000 / (447 * 223.0))
+
+        rows = np.arange(223) * 250 // 223
+        cols = np.arange(447) * 500 // 447
+        self._check(oStats, self.data[::4, ::4][rows][:, cols])
+
+    def test_small(self):
+        # bands with fewer pixels than asked for are read whole
+        overviews = [_FakeBand(self.data[::2, ::2])]
+        hBand = _FakeBand(self.data, overviews=overviews, nodata=0)
+        oStats, size, dfScale = _quicklookScan(hBand, 1 << 22)
+
+        self.assertEqual(hBand.reads,
+                         [(0, 0, 2000, 1000, None, None)])
+        self.assertEqual(overviews[0].reads, [])
+        self.assertEqual((size, dfScale), ((2000, 1000), 1.0))
+        self._check(oStats, self.data[self.data != 0])
+
+class Test_bandReport(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.data = np.random.RandomState(6).normal(800.0, 170.0, (64, 48))\
+                      .astype(np.float32)
+
+        self.pszFilename = os.path.join(self.tmpdir, 'dem.tif')
+        hDataset = gdal.GetDriverByName('GTiff').Create(
+            self.pszFilename, 48, 64, 1, gdal.GDT_Float32)
+        hDataset.GetRasterBand(1).WriteArray(self.data)
+        hDataset = None
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_scan_statistics_stored(self):
+        # the min/max scan computes exact statistics in the same pass and
+        # stores them instead of running GDAL's approximate statistics
+        bandDict = ydalinfo(self.pszFilename, bStats=True,
+                            bComputeMinMax=True)['Bands'][0]
+
+        values = self.data.astype(np.float64)
+        expected = [values.min(), values.max(), values.mean(), values.std()]
+        assert_almost_equal(bandDict['Statistics'], expected, 4)
+
+        hDataset = gdal.Open(self.pszFilename)
+        assert_almost_equal(hDataset.GetRasterBand(1).GetStatistics(False,
+                                                                     False),
+                            expected, 4)
+
+if __name__ == '__main__':
+    unittest.main()
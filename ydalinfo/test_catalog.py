@@ -0,0 +1,83 @@
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from ydalcatalog import Catalog
+
+def _report(pszFilename, west, south, east, north):
+    return {'DatasetName': pszFilename,
+            'Driver': {'ShortName': 'GTiff'},
+            'Size': [10, 10],
+            'Bands': [{'BandNum': 1}],
+            'CornerCoordinates': {'upperLeft': [west, north],
+                                  'lowerRight': [east, south]},
+            'CornerCoordinatesLatLong': {'upperLeft': [west, north],
+                                         'lowerRight': [east, south]}}
+
+class Test_Catalog(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cat = Catalog(os.path.join(self.tmpdir, 'catalog.sqlite'))
+
+        self.paths = []
+        for name in ('a.tif', 'b.tif', 'c.tif'):
+            pszFilename = os.path.join(self.tmpdir, name)
+            with open(pszFilename, 'wb') as f:
+                f.write(b'\0' * 16)
+            self.paths.append(pszFilename)
+
+    def tearDown(self):
+        self.cat.close()
+        shutil.rmtree(self.tmpdir)
+
+    def _storeAll(self):
+        a, b, c = self.paths
+        stale = self.cat.stale(self.paths)
+        self.cat._store(a, stale[a], _report(a, -117.0, 46.0, -116.0, 47.0))
+        self.cat._store(b, stale[b], _report(b, -110.0, 40.0, -109.0, 41.0))
+        self.cat._store(c, stale[c], {'DatasetName': c, 'Error': 'bad'})
+
+    def test_stale(self):
+        a, b, c = self.paths
+        self.assertEqual(sorted(self.cat.stale(self.paths)), self.paths)
+
+        self._storeAll()
+        self.assertEqual(len(self.cat), 3)
+        self.assertEqual(sorted(self.cat.stale(self.paths)), [c])
+
+        with open(a, 'ab') as f:
+            f.write(b'\0')
+        self.assertEqual(sorted(self.cat.stale(self.paths)), [a, c])
+
+    def test_query(self):
+        a, b, c = self.paths
+        self._storeAll()
+
+        names = [d['DatasetName']
+                 for d in self.cat.query(-116.5, 46.5, -100.0, 48.0)]
+        self.assertEqual(names, [a])
+
+        names = [d['DatasetName']
+                 for d in self.cat.query(-120.0, 30.0, -100.0, 50.0,
+                                         bLatLong=False)]
+        self.assertEqual(names, [a, b])
+
+        self.assertEqual(self.cat.get(c)['Error'], 'bad')
+        self.assertIsNone(self.cat.get('missing.tif'))
+
+    def test_prune(self):
+        a, b, c = self.paths
+        self._storeAll()
+
+        os.remove(b)
+        self.assertEqual(self.cat.prune(), 1)
+        self.assertNotIn(b, self.cat)
+        self.assertEqual([d['DatasetName']
+                          for d in self.cat.query(-180, -90, 180, 90)], [a])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+try:
+    from osgeo import gdal
+except ImportError:
+    import gdal
+
+from ydalcompare import ydalcompare, compareInfo, _diffData, _parsePair
+
+class Test_compareInfo(unittest.TestCase):
+
+    def test_tuples_match_lists(self):
+        a = {'Size': [2, 3], 'Geotransform': (0.0, 1.0, 0.0, 3.0, 0.0, -1.0),
+             'Bands': [{'BandNum': 1, 'Type': 'Float32', 'NoDataValue': None}]}
+        b = {'Size': [2, 3], 'Geotransform': [0.0, 1.0, 0.0, 3.0, 0.0, -1.0],
+             'Bands': [{'BandNum': 1, 'Type': 'Float32', 'NoDataValue': None}]}
+        self.assertEqual(compareInfo(a, b), [])
+
+    def test_band_differences(self):
+        a = {'Size': [2, 3],
+             'Bands': [{'BandNum': 1, 'Type': 'Float32', 'NoDataValue': None}]}
+        b = {'Size': [2, 3],
+             'Bands': [{'BandNum': 1, 'Type': 'Int16', 'NoDataValue': -1},
+                       {'BandNum': 2, 'Type': 'Int16', 'NoDataValue': -1}]}
+        self.assertEqual(compareInfo(a, b),
+                         [['Bands', 1, 2],
+                          ['Bands.1.Type', 'Float32', 'Int16'],
+                          ['Bands.1.NoDataValue', None, -1]])
+
+class Test_diffData(unittest.TestCase):
+
+    def test_diff(self):
+        a = np.arange(12, dtype=np.float32).reshape(3, 4)
+        b = a.copy()
+        b[0, 1] += 2.0
+        b[1, 1] -= 0.25
+        b[2, 3] = -9999.0
+        b[2, 2] = np.nan
+
+        oStats, nDiffering, nMaskMismatch = \
+            _diffData(a, b, None, -9999.0, 0.5, True)
+
+        self.assertEqual(oStats.n, 10)
+        self.assertEqual(oStats.max, 2.0)
+        self.assertEqual(oStats.min, -0.25)
+        self.assertEqual(nMaskMismatch, 2)
+        self.assertEqual(nDiffering, 3)
+
+class Test_parsePair(unittest.TestCase):
+
+    def test_separators(self):
+        self.assertEqual(_parsePair('a.tif b.tif\n'), ['a.tif', 'b.tif'])
+        self.assertEqual(_parsePair('my dems/a.tif  b.tif\n'),
+                         ['my dems/a.tif', 'b.tif'])
+        self.assertEqual(_parsePair('my dems/a.tif\tnew dems/a.tif\n'),
+                         ['my dems/a.tif', 'new dems/a.tif'])
+
+class Test_ydalcompare(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _raster(self, name, data):
+        pszFilename = os.path.join(self.tmpdir, name)
+        hDataset = gdal.GetDriverByName('GTiff').Create(
+            pszFilename, data.shape[1], data.shape[0], 1, gdal.GDT_Float32)
+        hDataset.SetGeoTransform((-116.0, 0.01, 0.0, 47.0, 0.0, -0.01))
+        hDataset.GetRasterBand(1).WriteArray(data)
+        hDataset = None
+        return pszFilename
+
+    def test_equal(self):
+        data = np.arange(60, dtype=np.float32).reshape(6, 10)
+        compareDict = ydalcompare(self._raster('a.tif', data),
+                                  self._raster('b.tif', data), nThreads=1)
+
+        self.assertTrue(compareDict['Equal'])
+        self.assertEqual(compareDict['Metadata'], [])
+        bandDict = compareDict['Bands'][0]
+        self.assertEqual(bandDict['Compared'], 60)
+        self.assertEqual(bandDict['Differing'], 0)
+        self.assertIsNone(bandDict['FirstDifference'])
+
+    def test_differing(self):
+        data = np.arange(60, dtype=np.float32).reshape(6, 10)
+        test = data.copy()
+        test[2, 3] += 2.0
+        test[4, 8] -= 0.5
+        compareDict = ydalcompare(self._raster('a.tif', data),
+                                  self._raster('b.tif', test), nThreads=2)
+
+        self.assertFalse(compareDict['Equal'])
+        bandDict = compareDict['Bands'][0]
+        self.assertEqual(bandDict['Compared'], 60)
+        self.assertEqual(bandDict['Differing'], 2)
+        self.assertEqual(bandDict['MaxAbsDiff'], 2.0)
+        self.assertAlmostEqual(bandDict['MeanDiff'], 1.5 / 60)
+        self.assertIsNotNone(bandDict['FirstDifference'])
+
+        compareDict = ydalcompare(self._raster('c.tif', data),
+                                  self._raster('d.tif', test), bEqualOnly=True)
+        self.assertFalse(compareDict['Equal'])
+        self.assertNotIn('Differing', compareDict['Bands'][0])
+
+if __name__ == '__main__':
+    unittest.main()
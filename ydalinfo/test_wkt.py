@@ -0,0 +1,76 @@
+from __future__ import print_function
+
+import unittest
+
+from ydalinfo import _parseProjectionWkt
+
+class Test_parseProjectionWkt(unittest.TestCase):
+
+    def test_pretty(self):
+        wkt = ('GEOGCS["NAD83",\n'
+               '    DATUM["North_American_Datum_1983",\n'
+               '        SPHEROID["GRS 1980",6378137,298.2572221010002,\n'
+               '            AUTHORITY["EPSG","7019"]],\n'
+               '        TOWGS84[0,0,0,0,0,0,0],\n'
+               '        AUTHORITY["EPSG","6269"]],\n'
+               '    PRIMEM["Greenwich",0],\n'
+               '    UNIT["degree",0.0174532925199433],\n'
+               '    AUTHORITY["EPSG","4269"]]')
+
+        self.assertEqual(_parseProjectionWkt(wkt),
+            {'GEOGCS': ['NAD83',
+                        {'AUTHORITY': ['EPSG', '4269'],
+                         'DATUM': ['North_American_Datum_1983',
+                                   {'AUTHORITY': ['EPSG', '6269'],
+                                    'SPHEROID': ['GRS 1980', 6378137,
+                                                 298.2572221010002,
+                                                 {'AUTHORITY': ['EPSG',
+                                                                '7019']}],
+                                    'TOWGS84': [0, 0, 0, 0, 0, 0, 0]}],
+                         'PRIMEM': ['Greenwich', 0],
+                         'UNIT': ['degree', 0.0174532925199433]}]})
+
+    def test_compact_repeated(self):
+        wkt = ('PROJCS["NAD83 / UTM zone 11N",GEOGCS["NAD83",'
+               'DATUM["North_American_Datum_1983",'
+               'SPHEROID["GRS 1980",6378137,298.257222101]],'
+               'PRIMEM["Greenwich",0],UNIT["degree",0.0174532925199433]],'
+               'PROJECTION["Transverse_Mercator"],'
+               'PARAMETER["latitude_of_origin",0],'
+               'PARAMETER["central_meridian",-117],'
+               'UNIT["metre",1],AXIS["Easting",EAST],AXIS["Northing",NORTH]]')
+
+        projcs = _parseProjectionWkt(wkt)['PROJCS']
+        self.assertEqual(projcs[0], 'NAD83 / UTM zone 11N')
+        self.assertEqual(projcs[1]['PARAMETER'],
+                         [['latitude_of_origin', 0], ['central_meridian', -117]])
+        self.assertEqual(projcs[1]['AXIS'],
+                         [['Easting', 'EAST'], ['Northing', 'NORTH']])
+
+    def test_quotes(self):
+        self.assertEqual(_parseProjectionWkt('LOCAL_CS["a ""b"", c[d]"]'),
+                         {'LOCAL_CS': ['a "b", c[d]']})
+
+    def test_single_repeatable(self):
+        wkt = ('PROJCS["x",PROJECTION["Mercator_1SP"],'
+               'PARAMETER["central_meridian",0],UNIT["metre",1]]')
+        self.assertEqual(_parseProjectionWkt(wkt)['PROJCS'][1]['PARAMETER'],
+                         [['central_meridian', 0]])
+
+    def test_cache(self):
+        wkt = 'LOCAL_CS["cached",UNIT["metre",1]]'
+        result = _parseProjectionWkt(wkt)
+        result['LOCAL_CS'][1]['UNIT'].append('changed')
+
+        self.assertEqual(_parseProjectionWkt(wkt),
+                         {'LOCAL_CS': ['cached', {'UNIT': ['metre', 1]}]})
+
+    def test_empty(self):
+        self.assertIsNone(_parseProjectionWkt(''))
+        self.assertIsNone(_parseProjectionWkt(None))
+
+    def test_malformed(self):
+        self.assertRaises(ValueError, _parseProjectionWkt, 'GEOGCS["NAD83",')
+
+if __name__ == '__main__':
+    unittest.main()
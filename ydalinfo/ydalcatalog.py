@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+################################################################################
+#
+# Project:  GDAL Utilities
+# Purpose:  Persistent SQLite catalog of ydalinfo reports
+#
+################################################################################
+#
+# Copyright (c) 2014, Roger Lew <rogerlew@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+################################################################################
+
+from __future__ import print_function
+
+import json
+import os
+import sqlite3
+import sys
+
+from ydalinfo import ydalinfo_batch, _expandPaths
+
+__doc__ = """\
+Usage:
+    ydalcatalog database -refresh [-processes n] datasetname*
+    ydalcatalog database -prune
+    ydalcatalog database -bbox west south east north
+    ydalcatalog database -nbbox xmin ymin xmax ymax
+
+ -refresh
+    Runs ydalinfo on the datasets (names or glob patterns) that are new,
+    whose size or modification time changed since they were cataloged or
+    that failed to scan
+ -processes n
+    Number of worker processes used to refresh (defaults to the number of cpus)
+ -prune
+    Removes datasets that no longer exist from the catalog
+ -bbox west south east north
+    Lists the datasets whose lat/long extent intersects the box
+ -nbbox xmin ymin xmax ymax
+    Lists the datasets whose extent in their own coordinate system intersects
+    the box
+"""
+
+_SCHEMA = """\
+CREATE TABLE IF NOT EXISTS datasets (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER,
+    mtime REAL,
+    driver TEXT,
+    xsize INTEGER,
+    ysize INTEGER,
+    nbands INTEGER,
+    minx REAL, miny REAL, maxx REAL, maxy REAL,
+    west REAL, south REAL, east REAL, north REAL,
+    error TEXT,
+    info TEXT
+);
+CREATE INDEX IF NOT EXISTS datasets_native ON datasets (minx, maxx, miny, maxy);
+CREATE INDEX IF NOT EXISTS datasets_latlong ON datasets (west, east, south, north);
+"""
+
+# reports are committed in batches so an interrupted refresh keeps most of
+# its work
+_COMMIT_EVERY = 500
+
+def _extent(corners):
+    """
+    (xmin, ymin, xmax, ymax) of a CornerCoordinates dict
+    """
+    if not corners:
+        return (None, None, None, None)
+    xs = [c[0] for c in corners.values()]
+    ys = [c[1] for c in corners.values()]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+def _stat(pszFilename):
+    """
+    (size, mtime) of a local file, (None, None) for paths os can't stat
+    (e.g. /vsicurl/ urls) so they are refreshed every time
+    """
+    try:
+        st = os.stat(pszFilename)
+    except OSError:
+        return None, None
+    return st.st_size, st.st_mtime
+
+class Catalog(object):
+    """
+    Persistent catalog of ydalinfo reports stored in a SQLite database
+
+    Reports are keyed by path and refreshed only when the size or the
+    modification time of the file changed or when ydalinfo failed on it.
+    The extent of each dataset is kept in its own coordinate system and in
+    lat/long. Lat/long extents are indexed with SQLite's R*Tree module when
+    it is available.
+
+    Usage
+    -----
+
+    from ydalcatalog import Catalog
+    cat = Catalog('rasters.sqlite', bShowMetadata=False)
+    cat.refresh(['dems/*.tif', 'isnobal/out/*.tif'])
+    for gdict in cat.query(-116.8, 47.6, -116.5, 47.8):
+        print(gdict['DatasetName'])
+
+    kwargs are the ydalinfo options used when datasets are (re)scanned
+    """
+    def __init__(self, pszDatabase, **kwargs):
+        self.pszDatabase = pszDatabase
+        self.kwargs = kwargs
+
+        self.conn = sqlite3.connect(pszDatabase)
+        self.conn.executescript(_SCHEMA)
+
+        try:
+            self.conn.execute('CREATE VIRTUAL TABLE IF NOT EXISTS extents '
+                              'USING rtree(id, west, east, south, north)')
+            self.bRTree = True
+        except sqlite3.OperationalError:
+            self.bRTree = False
+
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM datasets').fetchone()[0]
+
+    def __contains__(self, pszFilename):
+        return self.conn.execute('SELECT 1 FROM datasets WHERE path = ?',
+                                 (pszFilename,)).fetchone() is not None
+
+    def stale(self, papszPatterns):
+        """
+        returns {path: (size, mtime)} of the datasets matching papszPatterns
+        that are not cataloged, changed since they were or failed to scan
+        """
+        stale = {}
+        for pszFilename in _expandPaths(papszPatterns):
+            key = _stat(pszFilename)
+            row = self.conn.execute('SELECT size, mtime, error '
+                                    'FROM datasets WHERE path = ?',
+                                    (pszFilename,)).fetchone()
+            if row is None or key[0] is None or row[2] is not None or \
+               tuple(row[:2]) != key:
+                stale[pszFilename] = key
+        return stale
+
+    def refresh(self, papszPatterns, nProcesses=None):
+        """
+        runs ydalinfo (in a pool of nProcesses worker processes) on the
+        datasets matching papszPatterns that are new or changed and stores
+        the reports. Returns the number of datasets that were scanned.
+        """
+        stale = self.stale(papszPatterns)
+        if len(stale) == 0:
+            return 0
+
+        n = 0
+        for jsonDict in ydalinfo_batch(sorted(stale), nProcesses,
+                                       **self.kwargs):
+            pszFilename = jsonDict['DatasetName']
+            self._store(pszFilename, stale[pszFilename], jsonDict)
+
+            n += 1
+            if n % _COMMIT_EVERY == 0:
+                self.conn.commit()
+
+        self.conn.commit()
+        return n
+
+    def _store(self, pszFilename, key, jsonDict):
+        size = jsonDict.get('Size') or (None, None)
+        native = _extent(jsonDict.get('CornerCoordinates'))
+        latlong = _extent(jsonDict.get('CornerCoordinatesLatLong'))
+        driver = jsonDict.get('Driver') or {}
+
+        values = (key[0], key[1], driver.get('ShortName'),
+                  size[0], size[1], len(jsonDict.get('Bands') or []),
+                  native[0], native[1], native[2], native[3],
+                  latlong[0], latlong[1], latlong[2], latlong[3],
+                  jsonDict.get('Error'), json.dumps(jsonDict))
+
+        row = self.conn.execute('SELECT id FROM datasets WHERE path = ?',
+                                (pszFilename,)).fetchone()
+        if row is None:
+            cur = self.conn.execute(
+                'INSERT INTO datasets (size, mtime, driver, xsize, ysize, '
+                'nbands, minx, miny, maxx, maxy, west, south, east, north, '
+                'error, info, path) VALUES '
+                '(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                values + (pszFilename,))
+            nId = cur.lastrowid
+        else:
+            nId = row[0]
+            self.conn.execute(
+                'UPDATE datasets SET size = ?, mtime = ?, driver = ?, '
+                'xsize = ?, ysize = ?, nbands = ?, minx = ?, miny = ?, '
+                'maxx = ?, maxy = ?, west = ?, south = ?, east = ?, '
+                'north = ?, error = ?, info = ? WHERE id = ?',
+                values + (nId,))
+
+        if self.bRTree:
+            if latlong[0] is None:
+                self.conn.execute('DELETE FROM extents WHERE id = ?', (nId,))
+            else:
+                self.conn.execute('INSERT OR REPLACE INTO extents '
+                                  'VALUES (?, ?, ?, ?, ?)',
+                                  (nId, latlong[0], latlong[2],
+                                   latlong[1], latlong[3]))
+
+    def prune(self):
+        """
+        removes the datasets that no longer exist on disk. Paths os can't
+        stat (e.g. /vsicurl/ urls) are kept. Returns the number removed.
+        """
+        gone = [(nId,) for nId, pszFilename in
+                self.conn.execute('SELECT id, path FROM datasets')
+                if not os.path.exists(pszFilename) and
+                   not pszFilename.startswith('/vsi')]
+
+        self.conn.executemany('DELETE FROM datasets WHERE id = ?', gone)
+        if self.bRTree:
+            self.conn.executemany('DELETE FROM extents WHERE id = ?', gone)
+        self.conn.commit()
+        return len(gone)
+
+    def get(self, pszFilename):
+        """
+        returns the stored ydalinfo dict of pszFilename or None
+        """
+        row = self.conn.execute('SELECT info FROM datasets WHERE path = ?',
+                                (pszFilename,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def query(self, xmin, ymin, xmax, ymax, bLatLong=True):
+        """
+        returns the stored ydalinfo dicts of the datasets whose extent
+        intersects the box. With bLatLong the box is in lat/long (west,
+        south, east, north), otherwise it is compared to the extent of each
+        dataset in its own coordinate system.
+        """
+        if bLatLong and self.bRTree:
+            sql = ('SELECT d.info FROM extents e JOIN datasets d '
+                   'ON d.id = e.id WHERE e.west <= ? AND e.east >= ? '
+                   'AND e.south <= ? AND e.north >= ? ORDER BY d.path')
+        elif bLatLong:
+            sql = ('SELECT info FROM datasets WHERE west <= ? AND east >= ? '
+                   'AND south <= ? AND north >= ? ORDER BY path')
+        else:
+            sql = ('SELECT info FROM datasets WHERE minx <= ? AND maxx >= ? '
+                   'AND miny <= ? AND maxy >= ? ORDER BY path')
+
+        return [json.loads(row[0]) for row in
+                self.conn.execute(sql, (xmax, xmin, ymax, ymin))]
+
+if __name__ == '__main__':
+    argv = sys.argv
+
+    if len(argv) < 3:
+        print(__doc__)
+        sys.exit()
+
+    cat = Catalog(argv[1])
+    lwr_arg = argv[2].lower()
+
+    if lwr_arg == '-refresh':
+        nProcesses = None
+        papszPatterns = argv[3:]
+        if len(papszPatterns) > 1 and papszPatterns[0] == '-processes':
+            nProcesses = int(papszPatterns[1])
+            papszPatterns = papszPatterns[2:]
+        n = cat.refresh(papszPatterns, nProcesses)
+        print('Scanned %i datasets, %i cataloged' % (n, len(cat)))
+
+    elif lwr_arg == '-prune':
+        print('Removed %i datasets' % cat.prune())
+
+    elif lwr_arg in ('-bbox', '-nbbox') and len(argv) == 7:
+        box = [float(v) for v in argv[3:7]]
+        for gdict in cat.query(*box, bLatLong=lwr_arg == '-bbox'):
+            print(gdict['DatasetName'])
+
+    else:
+        print(__doc__)
+
+    cat.close()
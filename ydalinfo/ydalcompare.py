@@ -0,0 +1,392 @@
+#!/usr/bin/env python
+################################################################################
+#
+# Project:  GDAL Utilities
+# Purpose:  Compares the metadata and pixels of two rasters
+#
+################################################################################
+#
+# Copyright (c) 2014, Roger Lew <rogerlew@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+################################################################################
+
+from __future__ import print_function
+
+import json
+import math
+from multiprocessing import cpu_count, Pool
+from multiprocessing.pool import ThreadPool
+import sys
+
+import numpy as np
+
+from ydalinfo import ydalinfo, _BandStats, _blockWindows, _threadBand, \
+                     _jsonDefault, _batchInit, gdal
+
+__doc__ = """\
+Usage:
+    ydalcompare [-equal] [-tolerance t] [-threads n] [-json] reference test
+    ydalcompare [-equal] [-tolerance t] [-processes n] -pairs filename
+
+ -equal
+    Only decide whether the rasters are equal. The pixel comparison stops at
+    the first window that differs and no difference statistics are reported.
+ -tolerance t
+    Pixels whose absolute difference is at most t are counted as equal
+ -threads n
+    Number of threads reading blocks of the two rasters (defaults to the
+    number of cpus, or to 1 per process with -pairs)
+ -json
+    Prints the comparison as JSON
+ -processes n
+    Number of worker processes used with -pairs (defaults to the number of
+    cpus)
+ -pairs filename
+    Compares every "reference test" pair of datasetnames listed in filename,
+    one pair per line, and prints one JSON object per pair (JSON Lines) in
+    the order they complete. The names are separated by a tab, or when a
+    line has no tab by its last run of whitespace, so names with spaces
+    need a tab after the reference
+
+The exit status is 0 when the rasters are equal and 1 when they differ.
+"""
+
+# keys of the ydalinfo reports that have to match
+_COMPARE_FIELDS = ('Size', 'Geotransform', 'CoordinateSystem')
+_COMPARE_BAND_FIELDS = ('Type', 'NoDataValue')
+
+def _plain(value):
+    # tuples and numpy values compare equal to the lists JSON gives back
+    return json.loads(json.dumps(value, default=_jsonDefault))
+
+def compareInfo(jsonDictA, jsonDictB, papszFields=_COMPARE_FIELDS,
+                papszBandFields=_COMPARE_BAND_FIELDS):
+    """
+    returns a list of [key, valueA, valueB] for the keys of papszFields and,
+    for every band, papszBandFields (e.g. 'Bands.1.NoDataValue') that differ
+    between two ydalinfo reports. An empty list means they match.
+    """
+    diffs = []
+    for key in papszFields:
+        a, b = _plain(jsonDictA.get(key)), _plain(jsonDictB.get(key))
+        if a != b:
+            diffs.append([key, a, b])
+
+    bandsA = jsonDictA.get('Bands') or []
+    bandsB = jsonDictB.get('Bands') or []
+    if len(bandsA) != len(bandsB):
+        diffs.append(['Bands', len(bandsA), len(bandsB)])
+
+    for bandA, bandB in zip(bandsA, bandsB):
+        for key in papszBandFields:
+            a, b = _plain(bandA.get(key)), _plain(bandB.get(key))
+            if a != b:
+                diffs.append(['Bands.%i.%s' % (bandA['BandNum'], key), a, b])
+
+    return diffs
+
+def _validMask(data, dfNoData):
+    """
+    returns the mask of the pixels of data that are neither nodata nor nan
+    """
+    if data.dtype.kind in 'fc':
+        mask = np.isfinite(data)
+        if dfNoData is not None and dfNoData == dfNoData:
+            mask &= data != dfNoData
+        return mask
+    if dfNoData is not None:
+        return data != dfNoData
+    return np.ones(data.shape, dtype=bool)
+
+def _diffData(a, b, dfNoDataA, dfNoDataB, dfTolerance, bStats):
+    """
+    compares one window of the two rasters. Returns (oStats, nDiffering,
+    nMaskMismatch) where oStats holds the statistics and histogram of test
+    minus reference over the pixels valid in both.
+    """
+    maskA = _validMask(a, dfNoDataA)
+    maskB = _validMask(b, dfNoDataB)
+    nMaskMismatch = int(np.count_nonzero(maskA != maskB))
+
+    mask = maskA & maskB
+    diff = b[mask].astype(np.float64) - a[mask].astype(np.float64)
+    nDiffering = int(np.count_nonzero(np.abs(diff) > dfTolerance)) + \
+                 nMaskMismatch
+
+    if bStats:
+        oStats = _BandStats.fromArray(diff)
+    else:
+        oStats = None
+    return oStats, nDiffering, nMaskMismatch
+
+def _diffWindow(args):
+    pszFilenameA, pszFilenameB, iBand, window = args[:4]
+    a = _threadBand(pszFilenameA, iBand).ReadAsArray(*window)
+    b = _threadBand(pszFilenameB, iBand).ReadAsArray(*window)
+    return (window,) + _diffData(a, b, *args[4:])
+
+def _diffBand(pszFilenameA, pszFilenameB, iBand, dfTolerance=0.0,
+              bEqualOnly=False, nThreads=None):
+    """
+    compares band iBand of two rasters of the same size window by window,
+    reading windows aligned to the blocks of the reference concurrently.
+
+    returns (oStats, nDiffering, nMaskMismatch, window) where window is the
+    first window found to differ. With bEqualOnly the comparison stops at
+    that window and oStats is None.
+    """
+    hDatasetA = gdal.Open(pszFilenameA, gdal.GA_ReadOnly)
+    hDatasetB = gdal.Open(pszFilenameB, gdal.GA_ReadOnly)
+    hBandA = hDatasetA.GetRasterBand(iBand)
+    hBandB = hDatasetB.GetRasterBand(iBand)
+
+    products = (hBandA.GetNoDataValue(), hBandB.GetNoDataValue(),
+                dfTolerance, not bEqualOnly)
+    windows = list(_blockWindows(hBandA))
+
+    if nThreads is None:
+        nThreads = cpu_count()
+    nThreads = min(nThreads, len(windows))
+
+    oStats = None if bEqualOnly else _BandStats()
+    nDiffering = nMaskMismatch = 0
+    firstWindow = None
+
+    if nThreads <= 1:
+        results = (((window,) +
+                    _diffData(hBandA.ReadAsArray(*window),
+                              hBandB.ReadAsArray(*window), *products))
+                   for window in windows)
+        pool = None
+    else:
+        pool = ThreadPool(nThreads)
+        tasks = [(pszFilenameA, pszFilenameB, iBand, window) + products
+                 for window in windows]
+        results = pool.imap_unordered(_diffWindow, tasks)
+
+    try:
+        for window, oPartial, n, nMask in results:
+            nDiffering += n
+            nMaskMismatch += nMask
+            if oStats is not None:
+                oStats.merge(oPartial)
+            if n > 0 and firstWindow is None:
+                firstWindow = window
+                if bEqualOnly:
+                    break
+    finally:
+        # the windows still queued aren't needed after an early exit
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    return oStats, nDiffering, nMaskMismatch, firstWindow
+
+def ydalcompare(pszFilenameA, pszFilenameB, dfTolerance=0.0, bEqualOnly=False,
+                nThreads=None, bJson=False, verbose=False):
+    """
+    Compares the reference raster pszFilenameA with pszFilenameB. The
+    ydalinfo reports of the two are compared first (see compareInfo) and,
+    when their sizes and band counts match, their pixels band by band.
+
+    returns a dict with the metadata differences ('Metadata'), 'Equal' and,
+    for each band, the number of compared, differing and nodata mismatched
+    pixels together with the max abs, mean and RMS difference and the
+    histogram of test minus reference. With bEqualOnly the comparison stops
+    at the first differing window and only 'FirstDifference' is reported
+    for the band.
+    """
+    papszFields = ['Size', 'Geotransform', 'CoordinateSystem', 'Bands.Type',
+                   'Bands.NoDataValue']
+    infoA = ydalinfo(pszFilenameA, bStats=False, bShowMetadata=False,
+                     bShowRAT=False, papszFields=papszFields)
+    infoB = ydalinfo(pszFilenameB, bStats=False, bShowMetadata=False,
+                     bShowRAT=False, papszFields=papszFields)
+
+    diffs = compareInfo(infoA, infoB)
+    compareDict = {'Reference': pszFilenameA,
+                   'Test': pszFilenameB,
+                   'Metadata': diffs,
+                   'Equal': len(diffs) == 0,
+                   'Bands': []}
+
+    if verbose:
+        for key, a, b in diffs:
+            print("%s differs: %s != %s" % (key, json.dumps(a), json.dumps(b)))
+
+    # pixels can only be compared when the rasters line up
+    bComparable = not any(key in ('Size', 'Bands') for key, _, _ in diffs)
+    if not bComparable:
+        if verbose:
+            print("Pixels not compared")
+    elif bEqualOnly and diffs:
+        pass
+    else:
+        for iBand in range(1, len(infoA['Bands']) + 1):
+            oStats, nDiffering, nMaskMismatch, window = \
+                _diffBand(pszFilenameA, pszFilenameB, iBand, dfTolerance,
+                          bEqualOnly, nThreads)
+
+            bandDict = {'BandNum': iBand, 'FirstDifference': window}
+            if oStats is not None:
+                dfMaxAbs = max(abs(oStats.min), abs(oStats.max)) \
+                           if oStats.n > 0 else None
+                dfRMSE = math.sqrt(oStats.m2 / oStats.n + oStats.mean ** 2) \
+                         if oStats.n > 0 else None
+                bandDict.update({'Compared': oStats.n,
+                                 'Differing': nDiffering,
+                                 'MaskMismatch': nMaskMismatch,
+                                 'MaxAbsDiff': dfMaxAbs,
+                                 'MeanDiff': oStats.mean
+                                             if oStats.n > 0 else None,
+                                 'RMSE': dfRMSE,
+                                 'Histogram': oStats.histogram()})
+            compareDict['Bands'].append(bandDict)
+
+            if window is not None:
+                compareDict['Equal'] = False
+
+            if verbose and oStats is not None:
+                print("Band %d: %d of %d pixels differ "
+                      "(%d nodata mismatches)" % ( \
+                       iBand, nDiffering, oStats.n, nMaskMismatch ))
+                if oStats.n > 0:
+                    print("  Max abs diff=%g, Mean diff=%g, RMSE=%g" % ( \
+                           dfMaxAbs, oStats.mean, dfRMSE ))
+            elif verbose and window is not None:
+                print("Band %d differs in window %s" % (iBand, window))
+
+            if bEqualOnly and window is not None:
+                break
+
+    if verbose:
+        print(("Rasters differ", "Rasters are equal")[compareDict['Equal']])
+
+    if bJson:
+        print(json.dumps(compareDict, default=_jsonDefault))
+    return compareDict
+
+def _compareWorker(args):
+    pszFilenameA, pszFilenameB, kwargs = args
+    try:
+        compareDict = ydalcompare(pszFilenameA, pszFilenameB, **kwargs)
+    except Exception as e:
+        compareDict = {'Reference': pszFilenameA, 'Test': pszFilenameB,
+                       'Equal': False, 'Error': str(e)}
+    return json.dumps(compareDict, default=_jsonDefault)
+
+def _parsePair(L):
+    """
+    returns the [reference, test] datasetnames of a -pairs line
+    """
+    L = L.strip()
+    if '\t' in L:
+        return [s.strip() for s in L.split('\t', 1)]
+    return L.rsplit(None, 1)
+
+def ydalcompare_batch(pairs, nProcesses=None, **kwargs):
+    """
+    Runs ydalcompare over every (reference, test) pair in a pool of
+    nProcesses worker processes and yields the returned dicts in the order
+    they complete. Pairs that can't be compared yield a dict with 'Error'.
+
+    kwargs are passed to ydalcompare
+    """
+    kwargs['verbose'] = False
+    kwargs['bJson'] = False
+    if kwargs.get('nThreads') is None:
+        kwargs['nThreads'] = 1
+
+    tasks = ((pszFilenameA, pszFilenameB, kwargs)
+             for pszFilenameA, pszFilenameB in pairs)
+
+    pool = Pool(nProcesses, _batchInit)
+    bDone = False
+    try:
+        for line in pool.imap_unordered(_compareWorker, tasks):
+            yield json.loads(line)
+        bDone = True
+    finally:
+        if bDone:
+            pool.close()
+        else:
+            pool.terminate()
+        pool.join()
+
+if __name__ == '__main__':
+    argv = gdal.GeneralCmdLineProcessor(sys.argv)
+
+    dfTolerance = 0.0
+    bEqualOnly = False
+    nThreads = None
+    nProcesses = None
+    bJson = False
+    pszPairs = None
+    papszFilenames = []
+
+    i, nArgc = 1, len(argv)
+    while i < nArgc:
+        lwr_arg = argv[i].lower()
+        if lwr_arg == "-equal":
+            bEqualOnly = True
+        elif lwr_arg == "-tolerance" and i < nArgc-1:
+            i += 1
+            dfTolerance = float(argv[i])
+        elif lwr_arg == "-threads" and i < nArgc-1:
+            i += 1
+            nThreads = int(argv[i])
+        elif lwr_arg == "-processes" and i < nArgc-1:
+            i += 1
+            nProcesses = int(argv[i])
+        elif lwr_arg == "-json":
+            bJson = True
+        elif lwr_arg == "-pairs" and i < nArgc-1:
+            i += 1
+            pszPairs = argv[i]
+        elif argv[i][0] == '-':
+            print("Do not understand '%s' flag" % argv[i])
+            sys.exit(2)
+        else:
+            papszFilenames.append(argv[i])
+        i += 1
+
+    if pszPairs is not None:
+        with open(pszPairs) as f:
+            pairs = [_parsePair(L) for L in f if L.strip()]
+
+        bEqual = True
+        for compareDict in ydalcompare_batch(pairs, nProcesses,
+                                             dfTolerance=dfTolerance,
+                                             bEqualOnly=bEqualOnly,
+                                             nThreads=nThreads):
+            bEqual = bEqual and compareDict['Equal']
+            sys.stdout.write(json.dumps(compareDict) + '\n')
+            sys.stdout.flush()
+        sys.exit((1, 0)[bEqual])
+
+    if len(papszFilenames) != 2:
+        print(__doc__)
+        sys.exit(2)
+
+    compareDict = ydalcompare(papszFilenames[0], papszFilenames[1],
+                              dfTolerance=dfTolerance, bEqualOnly=bEqualOnly,
+                              nThreads=nThreads, bJson=bJson,
+                              verbose=not bJson)
+    sys.exit((1, 0)[compareDict['Equal']])
@@ -41,13 +41,30 @@
 
 from __future__ import print_function
 
-from ast import literal_eval
-from collections import OrderedDict, Counter
+from collections import OrderedDict
+import copy
+import functools
+from glob import glob
 import json
+import math
+from multiprocessing import cpu_count, Pool
+from multiprocessing.pool import ThreadPool
+import re
 import sys
+import threading
+from timeit import default_timer
 import warnings
 #import xml.dom.minidom
 
+import numpy as np
+
+# ydalinfo_async needs python 3
+try:
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    asyncio = None
+
 try:
     from osgeo import gdal
     from osgeo import osr
@@ -55,17 +72,45 @@ except:
     import gdal
     import osr
 
+# python 3
+try:
+    xrange
+except NameError:
+    xrange = range
+
 __doc__ = """\
 Usage:
-    ydalinfo [--help-general] [-mm] [-nostats] [-stemleaf] [-nogcp] [-nomd]
-             [-norat] [-noct] [-nofl] [-checksum] [-mdd domain]* datasetname
+    ydalinfo [--help-general] [-mm] [-stats | -nostats | -approx_stats] [-sample]
+             [-stemleaf] [-quicklook] [-profile] [-nogcp] [-nomd] [-norat] [-noct] [-nofl] [-checksum]
+             [-threads n] [-jsonl] [-processes n] [-probes n] [-cache MB]
+             [-readahead KB] [-filelist filename] [-fields field[,field]*] [-mdd domain]* datasetname [datasetname]*
 
  -mm
     Force computation of the actual min/max values for each band in the dataset
+ -stats
+    Computes exact statistics from every pixel when none are stored. By
+    default GDAL's approximate statistics (from overviews or a subsample of
+    the blocks) are computed and stored.
  -nostats
     Suppresses the computation if no statistics are stored in an image
+ -approx_stats
+    Compute approximate statistics from a sample of the blocks (see -sample)
+ -sample
+    Min/max, statistics and histograms are estimated from a random sample of
+    the blocks of each band and reported with their standard errors
  -stemleaf
-    Produces a stem and leaf histogram for each band
+    Produces a stem and leaf histogram for each band. Histograms of float
+    bands are approximate and are only stored with the dataset when exact.
+ -quicklook
+    Like -stemleaf but the histogram is computed from about a million pixels
+    of the coarsest overview that has at least as many (or decimated from
+    the full resolution band when there is none). Counts are scaled to the
+    full resolution and the histogram isn't stored with the dataset.
+ -profile
+    Reports the seconds spent in each phase of the run and of each band, the
+    GDAL block cache usage and the bytes downloaded by /vsicurl/ (GDAL >= 3.2)
+    under Profile. The cache and network counters are shared by the whole
+    process, so -profile is ignored with -probes
  -nogcp
     Suppress ground control points list printing. It may be useful for datasets
     with huge amount of GCPs, such as L1B AVHRR or HDF4 MODIS which contain
@@ -86,34 +131,99 @@ Usage:
  -mdd domain
     Report metadata for the specified domain. Starting with GDAL 1.11, "all" 
     can be used to report metadata in all domains
+ -threads n
+    Number of threads used to scan band blocks when statistics, min/max or
+    histograms have to be computed (defaults to the number of cpus, or to 1
+    per process in batch mode)
+ -jsonl
+    Batch mode. Every dataset is reported as one JSON object per line (JSON
+    Lines) in the order they complete. Implied when more than one dataset
+    is given. Datasetnames may be glob patterns.
+ -processes n
+    Number of worker processes used in batch mode (defaults to the number of
+    cpus)
+ -probes n
+    Batch mode probes n datasets at a time from threads of a single process
+    instead of using worker processes. Meant for remote datasets (/vsicurl/,
+    network shares) where each GDAL call waits on a round trip.
+ -cache MB
+    Size of GDAL's block cache
+ -readahead KB
+    Amount of data fetched by each /vsicurl/ request (GDAL's default is 16)
+ -filelist filename
+    Read datasetnames or glob patterns from filename, one per line
+ -fields field[,field]*
+    Only fetch and report the listed keys of the JSON output, e.g.
+    -fields Size,SRS,Geotransform,Bands.Statistics. Band keys are prefixed
+    with "Bands.". SRS gives the EPSG code and PROJJSON of the coordinate
+    system without parsing its WKT (CoordinateSystem).
 """
 
+# Number of pixels each worker reads per window when scanning a band. Windows
+# are aligned to the band's natural blocks and grouped up to roughly this size
+_SCAN_WINDOW_PIXELS = 1 << 20
+
+# The sampling mode (-sample, -approx_stats) reads at most _SAMPLE_WINDOWS
+# randomly chosen windows of roughly _SAMPLE_WINDOW_PIXELS pixels per band
+_SAMPLE_WINDOWS = 64
+_SAMPLE_WINDOW_PIXELS = 1 << 14
+
+# Upper limit on the number of internal histogram bins kept by _BandStats
+_HIST_MAX_BINS = 1 << 16
+
+# Quick look histograms (-quicklook) are computed from roughly this many
+# pixels taken from the coarsest overview that has at least as many
+_QUICKLOOK_PIXELS = 1 << 20
+
+# Cycle of moduli used by GDALChecksumImage
+_CHECKSUM_PRIMES = np.array([7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43],
+                            dtype=np.int64)
+
+class _Timer(object):
+    """
+    Splits elapsed wall time into named phases. lap(name) charges the time
+    since the previous lap (or since the timer was made) to name. A disabled
+    timer records nothing.
+    """
+    def __init__(self, bEnabled=True):
+        self.times = (None, OrderedDict())[bEnabled]
+        self.t = default_timer()
+
+    def lap(self, name):
+        if self.times is None:
+            return
+        t = default_timer()
+        self.times[name] = self.times.get(name, 0.0) + t - self.t
+        self.t = t
+
 def _stemleafReport(counts, multiplier=None):
+    counts = np.asarray(counts, dtype=np.float64)
     n = len(counts)
-        
+
+    # one row of 10 leaves per stem, the last row padded with empty bins
+    nStems = (n + 9) // 10
+    rows = np.zeros(nStems * 10)
+    rows[:n] = counts
+    rows = rows.reshape(nStems, 10)
+    sums = rows.sum(axis=1)
+
     if multiplier is None:
-        _counts10x = []
-        for i0 in xrange(0, n, 10):
-            _counts10x.append(sum(counts[i0:i0+10]))
-        multiplier = max(_counts10x)/100.0
-        del _counts10x
-        
-    
-    bin_edges = range(n)
-    d = OrderedDict((((str(v)[:-1],' ')[v<10], Counter()) for v in bin_edges))
-    
-    for v, cnt in zip(bin_edges, (int(c/multiplier) for c in counts)):
-        k = (str(v),' '+str(v))[v<10]
-        d[k[:-1]][k[-1]] = cnt
-        
-    m=max(len(s) for s in d)
+        multiplier = sums.max() / 100.0
+    if multiplier <= 0:
+        multiplier = 1.0
+
+    leaves = (rows / multiplier).astype(np.int64)
+    dots = (sums / multiplier).astype(np.int64)
+
+    stems = [' '] + [str(i) for i in xrange(1, nStems)]
+    m = max(len(s) for s in stems)
     lines = ['Stem leaf histogram:']
-    for i, k in enumerate(d):
-        elems = ''.join(sorted(d[k].elements()))
-        if elems == '':
-            i0 = i * 10
-            elems = '.'*int(sum(counts[i0:i0+10])/multiplier)
-        
+    for k, nLeaves, nDots in zip(stems, leaves, dots):
+        if nLeaves.any():
+            elems = ''.join(d * c for d, c in zip('0123456789', nLeaves))
+        else:
+            elems = '.' * nDots
+
         lines.append('  %s%s | %s' % (' ' * (m - len(k)), k, elems))
 
     lines.append('  Stem multiplier = %i'%multiplier)
@@ -121,32 +231,597 @@ def _stemleafReport(counts, multiplier=None):
 
     print('\n'.join(lines))
 
-def _parseProjectionWkt(pszPrettyWkt):
+class _BandStats(object):
     """
-    Parses the pretty print Wkt to a dictionary
+    Single pass, mergeable accumulator of band statistics
+
+    Partial results computed from independent blocks are combined with
+    merge(). The mean and variance are merged with Chan's parallel update and
+    the histogram is kept as counts of bins that are 2**histShift wide and
+    anchored at zero so that partial histograms can always be aligned exactly.
+    """
+    def __init__(self):
+        self.n = 0
+        self.min = float('inf')
+        self.max = float('-inf')
+        self.mean = 0.0
+        self.m2 = 0.0
+
+        self.histShift = None
+        self.histOrigin = 0
+        self.histCounts = None
+
+        # True while every value seen is an integer
+        self.bIntegral = True
+
+        self.checksum = 0
+
+        # set by _scanBand when only a sample of the band was read
+        self.sample = None
+
+    @classmethod
+    def fromArray(cls, values, bHistogram=True):
+        """
+        builds the statistics of a 1D array of valid pixel values
+        """
+        self = cls()
+        if values.size == 0:
+            return self
+
+        self.bIntegral = values.dtype.kind in 'iub'
+        values = values.astype(np.float64)
+        self.n = values.size
+        self.min = float(values.min())
+        self.max = float(values.max())
+        self.mean = float(values.mean())
+        self.m2 = float(np.square(values - self.mean).sum())
+
+        if bHistogram:
+            self.histShift = _histShift(self.min, self.max)
+            idx = np.floor(np.ldexp(values, -self.histShift)).astype(np.int64)
+            self.histOrigin = int(idx.min())
+            self.histCounts = np.bincount(idx - self.histOrigin)
+
+        return self
+
+    @property
+    def stddev(self):
+        if self.n == 0:
+            return -1.0
+        return math.sqrt(self.m2 / self.n)
+
+    def merge(self, other):
+        """
+        folds the partial result other into self and returns self
+        """
+        self.checksum += other.checksum
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            checksum = self.checksum
+            self.__dict__.update(other.__dict__)
+            self.checksum = checksum
+            return self
+
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.mean += delta * other.n / n
+        self.n = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.bIntegral = self.bIntegral and other.bIntegral
+
+        if self.histCounts is not None and other.histCounts is not None:
+            shift = max(self.histShift, other.histShift)
+            o0, c0 = _coarsenHist(self.histOrigin, self.histCounts,
+                                  shift - self.histShift)
+            o1, c1 = _coarsenHist(other.histOrigin, other.histCounts,
+                                  shift - other.histShift)
+            origin = min(o0, o1)
+            counts = np.zeros(max(o0 + len(c0), o1 + len(c1)) - origin,
+                              dtype=np.int64)
+            counts[o0 - origin:o0 - origin + len(c0)] += c0
+            counts[o1 - origin:o1 - origin + len(c1)] += c1
+
+            while len(counts) > _HIST_MAX_BINS:
+                origin, counts = _coarsenHist(origin, counts, 1)
+                shift += 1
+
+            self.histShift, self.histOrigin, self.histCounts = \
+                shift, origin, counts
+        else:
+            self.histCounts = None
+
+        return self
+
+    def _histRange(self, nBuckets, bByte, adfRange):
+        if adfRange is not None:
+            return adfRange
+        elif bByte:
+            return -0.5, 255.5
+
+        dfHalfBucket = (self.max - self.min) / (2.0 * (nBuckets - 1))
+        return self.min - dfHalfBucket, self.max + dfHalfBucket
+
+    def _buckets(self, values, dfMin, dfMax, nBuckets):
+        """
+        bucket of each value in nBuckets buckets spanning [dfMin, dfMax)
+        """
+        if dfMax > dfMin:
+            ibucket = ((values - dfMin) * nBuckets / (dfMax - dfMin))
+            return np.clip(ibucket.astype(np.int64), 0, nBuckets - 1)
+        return np.zeros(len(values), dtype=np.int64)
+
+    def _binsOfIntegers(self):
+        # bins at most one wide hold a single integer value each
+        return self.bIntegral and self.histShift <= 0
+
+    def histogram(self, nBuckets=256, bByte=False, adfRange=None,
+                  dfScale=1.0):
+        """
+        returns (dfMin, dfMax, nBuckets, panHistogram) laid out like
+        GDALBand.GetDefaultHistogram. adfRange overrides the (dfMin, dfMax)
+        of the buckets and the counts are multiplied by dfScale.
+
+        Each internal bin is counted in the bucket holding its center (or
+        its integer value when the bins of integer data are at most one
+        wide), so the histogram is approximate when bins straddle bucket
+        edges (see isHistogramExact).
+        """
+        if self.n == 0 or self.histCounts is None:
+            return None
+
+        dfMin, dfMax = self._histRange(nBuckets, bByte, adfRange)
+
+        idx = np.arange(self.histOrigin, self.histOrigin + len(self.histCounts))
+        if self._binsOfIntegers():
+            centers = np.ceil(np.ldexp(idx, self.histShift))
+        else:
+            centers = np.ldexp(idx + 0.5, self.histShift)
+        centers = np.clip(centers, self.min, self.max)
+        ibucket = self._buckets(centers, dfMin, dfMax, nBuckets)
+
+        panHistogram = np.bincount(ibucket, weights=self.histCounts,
+                                   minlength=nBuckets) * dfScale
+        return dfMin, dfMax, nBuckets, [int(round(c)) for c in panHistogram]
+
+    def isHistogramExact(self, nBuckets=256, bByte=False, adfRange=None):
+        """
+        True when every pixel of every internal bin falls in the same bucket
+        of histogram(), i.e. the histogram counts each pixel in its own
+        bucket. Integer bands with ranges up to _HIST_MAX_BINS are exact,
+        float bands usually aren't.
+        """
+        if self.n == 0 or self.histCounts is None:
+            return False
+        if self._binsOfIntegers():
+            return True
+
+        dfMin, dfMax = self._histRange(nBuckets, bByte, adfRange)
+
+        idx = np.arange(self.histOrigin, self.histOrigin + len(self.histCounts))
+        lo = np.clip(np.ldexp(idx, self.histShift), self.min, self.max)
+        hi = np.clip(np.nextafter(np.ldexp(idx + 1, self.histShift), -np.inf),
+                     self.min, self.max)
+
+        bSame = self._buckets(lo, dfMin, dfMax, nBuckets) == \
+                self._buckets(hi, dfMin, dfMax, nBuckets)
+        return bool(np.all(bSame[self.histCounts > 0]))
+
+def _histShift(dfMin, dfMax):
     """
-    if pszPrettyWkt is None:
+    smallest power of two bin width that spans [dfMin, dfMax] with at most
+    _HIST_MAX_BINS bins while keeping bin indices well inside int64
+    """
+    dfSpan = dfMax - dfMin
+    if dfSpan > 0.0:
+        shift = math.frexp(dfSpan / _HIST_MAX_BINS)[1]
+    else:
+        shift = -1074
+
+    dfMag = max(abs(dfMin), abs(dfMax))
+    if dfMag > 0.0:
+        shift = max(shift, math.frexp(dfMag)[1] - 52)
+    return shift
+
+def _coarsenHist(origin, counts, steps):
+    """
+    merges histogram bins 2**steps at a time
+    """
+    if steps <= 0:
+        return origin, counts
+    idx = np.right_shift(np.arange(origin, origin + len(counts),
+                                   dtype=np.int64), min(steps, 63))
+    return int(idx[0]), np.bincount(idx - idx[0], weights=counts)\
+                           .astype(np.int64)
+
+def _blockWindows(hBand, nWindowPixels=_SCAN_WINDOW_PIXELS):
+    """
+    yields (xoff, yoff, xsize, ysize) windows aligned to the natural blocks
+    of hBand and grouped to roughly nWindowPixels pixels
+    """
+    nXSize, nYSize = hBand.XSize, hBand.YSize
+    nBlockXSize, nBlockYSize = hBand.GetBlockSize()
+
+    nCols = nBlockXSize * max(1, nWindowPixels // (nBlockXSize * nBlockYSize))
+    nCols = min(nCols, nXSize)
+    nRows = nBlockYSize * max(1, nWindowPixels // (nCols * nBlockYSize))
+    nRows = min(nRows, nYSize)
+
+    for yoff in xrange(0, nYSize, nRows):
+        for xoff in xrange(0, nXSize, nCols):
+            yield (xoff, yoff,
+                   min(nCols, nXSize - xoff), min(nRows, nYSize - yoff))
+
+def _sampleWindows(hBand):
+    """
+    returns (windows, nWindows, dfScale): a random subset of at most
+    _SAMPLE_WINDOWS of the nWindows block aligned windows of hBand, and the
+    ratio of band pixels to sampled pixels
+    """
+    windows = list(_blockWindows(hBand, _SAMPLE_WINDOW_PIXELS))
+    nWindows = len(windows)
+
+    if nWindows > _SAMPLE_WINDOWS:
+        # seeded so repeated runs report the same estimates
+        indx = np.random.RandomState(0).choice(nWindows, _SAMPLE_WINDOWS,
+                                               replace=False)
+        windows = [windows[i] for i in sorted(indx)]
+
+    nSampled = sum(w[2] * w[3] for w in windows)
+    return windows, nWindows, float(hBand.XSize * hBand.YSize) / nSampled
+
+def _sampleErrors(oStats, partials, nWindows, dfScale, bByte):
+    """
+    estimates standard errors of the statistics of a sampled band by
+    jackknifing over the sampled windows (leave one window out), with a
+    finite population correction for the windows that were not sampled
+
+    returns a dict or None when fewer than two windows were sampled
+    """
+    k = len(partials)
+    if k < 2 or oStats.n == 0:
         return None
-    
-    lastindent = -1
-    newlines = []
-
-    for L in pszPrettyWkt.split('\n'):
-        n0 = len(L)
-        L = L.lstrip()
-        indent = n0 - len(L)
-
-        if indent > lastindent:
-            newlines.append('{"' + L.replace('[', '":[')
-                                    .replace(']],',']}],')
-                                    .replace(']]',']}]}'))
+
+    n = np.array([p.n for p in partials], dtype=np.float64)
+    means = np.array([p.mean for p in partials])
+    m2s = np.array([p.m2 for p in partials])
+
+    N = float(oStats.n)
+    nOut = N - n
+    bKeep = nOut > 0
+    nOut = np.where(bKeep, nOut, 1.0)
+
+    # Chan's parallel update run backwards to remove one window at a time
+    meanOut = (N * oStats.mean - n * means) / nOut
+    m2Out = oStats.m2 - m2s - n * nOut / N * np.square(means - meanOut)
+    stdOut = np.sqrt(np.maximum(m2Out, 0.0) / nOut)
+
+    dfFpc = max(0.0, 1.0 - float(k) / nWindows)
+
+    def se(theta):
+        theta = theta[bKeep]
+        if len(theta) < 2:
+            return 0.0
+        return math.sqrt(dfFpc * (k - 1.0) / k *
+                         np.square(theta - theta.mean()).sum())
+
+    errors = {'SampledFraction': float(k) / nWindows,
+              'SampledPixels': int(oStats.n),
+              'Mean': se(meanOut),
+              'StdDev': se(stdOut),
+              'Histogram': None}
+
+    hist = oStats.histogram(bByte=bByte)
+    if hist is not None:
+        adfRange = hist[:2]
+        H = np.zeros((k, hist[2]))
+        for i, p in enumerate(partials):
+            h = p.histogram(hist[2], adfRange=adfRange)
+            if h is not None:
+                H[i] = h[3]
+
+        propOut = (H.sum(axis=0) - H) / nOut[:, None]
+        propOut = propOut[bKeep]
+        if len(propOut) >= 2:
+            dfEstN = N * dfScale
+            errors['Histogram'] = \
+                [float(e) for e in dfEstN * np.sqrt(
+                 dfFpc * (k - 1.0) / k *
+                 np.square(propOut - propOut.mean(axis=0)).sum(axis=0))]
+
+    return errors
+
+def _validPixels(data, dfNoData):
+    """
+    returns the pixels of data that are neither nodata nor nan as a 1D array
+    """
+    data = data.ravel()
+    if data.dtype.kind in 'fc':
+        mask = np.isfinite(data)
+        if dfNoData is not None and dfNoData == dfNoData:
+            mask &= data != dfNoData
+        return data[mask]
+    if dfNoData is not None:
+        return data[data != dfNoData]
+    return data
+
+_threadLocal = threading.local()
+
+def _threadCache(name):
+    """
+    returns the dict called name that is private to the calling thread
+    """
+    cache = getattr(_threadLocal, name, None)
+    if cache is None:
+        cache = {}
+        setattr(_threadLocal, name, cache)
+    return cache
+
+def _threadBand(pszFilename, iBand):
+    """
+    returns band iBand of a dataset handle owned by the calling thread. GDAL
+    dataset handles must not be shared between threads.
+    """
+    datasets = _threadCache('datasets')
+    hDataset = datasets.get(pszFilename)
+    if hDataset is None:
+        hDataset = datasets[pszFilename] = \
+            gdal.Open(pszFilename, gdal.GA_ReadOnly)
+
+    return hDataset.GetRasterBand(iBand)
+
+def _checksumWindow(data, xoff, yoff, nXSize):
+    """
+    partial GDALChecksumImage sum of the window of data at (xoff, yoff) of a
+    band nXSize pixels wide. The band checksum is the sum of the partials of
+    all its windows & 0xffff.
+    """
+    nComp = 1
+    if data.dtype.kind == 'c':
+        data = data.view(data.real.dtype)
+        nComp = 2
+
+    if data.dtype.kind == 'f':
+        values = data.astype(np.float64)
+        bFinite = np.isfinite(values)
+        values = np.where(bFinite, values + 0.5, 0.0)
+        values = np.floor(np.clip(values, -2147483647.0, 2147483647.0))
+        ints = np.where(bFinite, values.astype(np.int64), -2147483648)
+    else:
+        ints = np.clip(data.astype(np.int64), -2147483648, 2147483647)
+
+    nRows, nCols = ints.shape
+    pos = np.arange(yoff, yoff + nRows, dtype=np.int64)[:, None] * \
+          (nXSize * nComp) + \
+          np.arange(xoff * nComp, xoff * nComp + nCols, dtype=np.int64)
+    primes = _CHECKSUM_PRIMES[pos % len(_CHECKSUM_PRIMES)]
+
+    # np.fmod truncates like C's % so negative pixels match GDAL
+    return int(np.fmod(ints, primes).sum())
+
+def _scanData(data, window, nXSize, dfNoData, bStats, bHistogram, bChecksum):
+    """
+    computes every requested per-pixel product of one window of data
+    """
+    if bStats:
+        oStats = _BandStats.fromArray(_validPixels(data, dfNoData), bHistogram)
+    else:
+        oStats = _BandStats()
+
+    if bChecksum:
+        oStats.checksum = _checksumWindow(data, window[0], window[1], nXSize)
+
+    return oStats
+
+def _scanWindow(args):
+    pszFilename, iBand, window = args[:3]
+    data = _threadBand(pszFilename, iBand).ReadAsArray(*window)
+    return _scanData(data, window, *args[3:])
+
+def _scanBand(hDataset, iBand, bStats=True, bHistogram=False, bChecksum=False,
+              bSample=False, nThreads=None):
+    """
+    computes a _BandStats for band iBand reading every pixel exactly once.
+    The statistics, histogram and checksum are fused into the same scan.
+    Block aligned windows are read concurrently with one dataset handle per
+    worker thread.
+
+    With bSample only a random subset of the windows is read and the
+    returned _BandStats.sample holds the standard errors of the estimates
+    (see _sampleErrors). Checksums can't be sampled.
+    """
+    hBand = hDataset.GetRasterBand(iBand)
+    bSample = bSample and not bChecksum
+    products = (hBand.XSize, hBand.GetNoDataValue(),
+                bStats, bHistogram, bChecksum)
+    if bSample:
+        windows, nWindows, dfScale = _sampleWindows(hBand)
+    else:
+        windows = list(_blockWindows(hBand))
+
+    if nThreads is None:
+        nThreads = cpu_count()
+    nThreads = min(nThreads, len(windows))
+
+    # datasets that can't be reopened by name (e.g. MEM) are read serially
+    # through the handle we were given
+    pszFilename = hDataset.GetDescription()
+    if nThreads > 1:
+        gdal.PushErrorHandler('CPLQuietErrorHandler')
+        hProbe = gdal.Open(pszFilename, gdal.GA_ReadOnly)
+        gdal.PopErrorHandler()
+        if hProbe is None:
+            nThreads = 1
+        hProbe = None
+
+    # partial results are only kept for the error estimates of samples
+    oStats = _BandStats()
+    partials = []
+    if nThreads <= 1:
+        for window in windows:
+            data = hBand.ReadAsArray(*window)
+            oPartial = _scanData(data, window, *products)
+            oStats.merge(oPartial)
+            if bSample:
+                partials.append(oPartial)
+    else:
+        pool = ThreadPool(nThreads)
+        try:
+            tasks = [(pszFilename, iBand, window) + products
+                     for window in windows]
+            for oPartial in pool.imap_unordered(_scanWindow, tasks):
+                oStats.merge(oPartial)
+                if bSample:
+                    partials.append(oPartial)
+        finally:
+            pool.close()
+            pool.join()
+
+    if bSample:
+        oStats.sample = _sampleErrors(oStats, partials, nWindows, dfScale,
+                                      hBand.DataType == gdal.GDT_Byte)
+        if oStats.sample is not None:
+            oStats.sample['Scale'] = dfScale
+
+    return oStats
+
+def _quicklookScan(hBand, nPixels=_QUICKLOOK_PIXELS):
+    """
+    computes a _BandStats with histogram from about nPixels pixels of the
+    band. The coarsest overview with at least nPixels pixels is read and
+    decimated to nPixels on the fly. Without such an overview GDAL decimates
+    the full resolution band (nearest neighbour, like a temporary NEAREST
+    overview) which only touches the blocks holding the selected pixels.
+
+    returns (oStats, (nXSize, nYSize) of the pixels read, dfScale) where
+    dfScale scales counts to the full resolution band
+    """
+    hSource = hBand
+    for iOverview in xrange(hBand.GetOverviewCount()):
+        hOverview = hBand.GetOverview(iOverview)
+        if hOverview is None:
+            continue
+        nOverviewPixels = hOverview.XSize * hOverview.YSize
+        if nPixels <= nOverviewPixels < hSource.XSize * hSource.YSize:
+            hSource = hOverview
+
+    nXSize, nYSize = hSource.XSize, hSource.YSize
+    dfDecimate = math.sqrt(nXSize * nYSize / float(nPixels))
+    if dfDecimate > 1.0:
+        data = hSource.ReadAsArray(0, 0, nXSize, nYSize,
+                                   buf_xsize=max(1, int(nXSize / dfDecimate)),
+                                   buf_ysize=max(1, int(nYSize / dfDecimate)))
+    else:
+        data = hSource.ReadAsArray()
+
+    oStats = _BandStats.fromArray(_validPixels(data, hBand.GetNoDataValue()))
+    dfScale = float(hBand.XSize) * hBand.YSize / data.size
+    return oStats, (data.shape[1], data.shape[0]), dfScale
+
+# Parsed coordinate systems keyed by their WKT. Batches of rasters usually
+# share a handful of projections.
+_WKT_CACHE_SIZE = 256
+_wktCache = {}
+
+# Children that may appear more than once in a node. Their values are always
+# collected into a list, even when there is only one.
+_WKT_REPEATABLE = frozenset(['PARAMETER', 'PARAMETERFILE', 'AXIS',
+                             'EXTENSION', 'ID', 'USAGE'])
+
+_WKT_TOKEN = re.compile(r'''\s*(?:"((?:[^"]|"")*)"|([\[\]\(\),])|([^\s\[\]\(\),"]+))''')
+
+def _wktValue(token):
+    """
+    converts an unquoted WKT token to an int, a float or leaves it a string
+    (e.g. the EAST of AXIS["Easting",EAST])
+    """
+    try:
+        return int(token)
+    except ValueError:
+        pass
+    try:
+        return float(token)
+    except ValueError:
+        return token
+
+def _parseWktNode(tokens, i):
+    """
+    parses the node KEYWORD[value, ..., CHILD[...], ...] starting at
+    tokens[i] and returns (keyword, values, i) with i just past the node.
+    Scalar values are kept in order and the children are collected into a
+    dict appended as the last value. Repeatable children (_WKT_REPEATABLE)
+    are always a list of their values.
+    """
+    keyword = tokens[i][2]
+    if i + 1 >= len(tokens) or tokens[i + 1][1] not in ('[', '('):
+        raise ValueError('expected [ after %s' % keyword)
+    i += 2
+
+    values = []
+    children = OrderedDict()
+    repeated = set()
+    while i < len(tokens) and tokens[i][1] not in (']', ')'):
+        string, punct, word = tokens[i]
+
+        if punct == ',':
+            i += 1
+        elif punct:
+            raise ValueError('unexpected %s in %s' % (punct, keyword))
+        elif word and i + 1 < len(tokens) and tokens[i + 1][1] in ('[', '('):
+            child, childValues, i = _parseWktNode(tokens, i)
+
+            # repeated children (PARAMETER, AXIS, ...) become a list of
+            # their values
+            if child in _WKT_REPEATABLE:
+                children.setdefault(child, []).append(childValues)
+            elif child not in children:
+                children[child] = childValues
+            elif child in repeated:
+                children[child].append(childValues)
+            else:
+                children[child] = [children[child], childValues]
+                repeated.add(child)
+        elif word:
+            values.append(_wktValue(word))
+            i += 1
         else:
-            newlines.append('"' + L.replace('[', '":[')
-                                   .replace(']],',']}],')
-                                   .replace(']]',']}]}'))
-        lastindent = indent
+            values.append(string.replace('""', '"'))
+            i += 1
+
+        if i == len(tokens):
+            raise ValueError('unterminated %s' % keyword)
 
-    return literal_eval(''.join(newlines))
+    if len(children) > 0:
+        values.append(dict(children))
+    return keyword, values, i + 1
+
+def _parseProjectionWkt(pszWkt):
+    """
+    Parses Wkt (compact or pretty printed) to a dictionary
+
+    {KEYWORD: [value, ..., {CHILD: [...], ...}]}
+
+    Parses are cached by WKT string and every call returns its own copy.
+    """
+    if pszWkt is None or len(pszWkt.strip()) == 0:
+        return None
+
+    result = _wktCache.get(pszWkt)
+    if result is not None:
+        return copy.deepcopy(result)
+
+    tokens = _WKT_TOKEN.findall(pszWkt)
+    keyword, values, i = _parseWktNode(tokens, 0)
+    if i != len(tokens):
+        raise ValueError('trailing tokens after %s' % keyword)
+    result = {keyword: values}
+
+    if len(_wktCache) >= _WKT_CACHE_SIZE:
+        _wktCache.clear()
+    _wktCache[pszWkt] = result
+    return copy.deepcopy(result)
 
 def _metadataReport(hDataset, papszExtraMDDomains):
     papszMetadata = hDataset.GetMetadata_List()
@@ -173,43 +848,201 @@ def _metadataReport(hDataset, papszExtraMDDomains):
             for metadata in papszMetadata:
                 print("  %s" % metadata)
                 
-def _coordinateReport( hDataset, hTransform, name, x, y, verbose):
-    line = "%-11s " % name
+def _spatialReference(pszWkt):
+    """
+    returns the osr.SpatialReference of pszWkt or None when GDAL can't
+    import it. SpatialReferences are cached per thread by WKT and must not
+    be modified.
+    """
+    cache = _threadCache('srs')
+    if pszWkt in cache:
+        return cache[pszWkt]
 
-    # Transform the point into georeferenced coordinates.
-    gt = hDataset.GetGeoTransform(can_return_null = True)
-    if gt is not None:
-        dfGeoX = gt[0] + gt[1] * x + gt[2] * y
-        dfGeoY = gt[3] + gt[4] * x + gt[5] * y
+    hSRS = osr.SpatialReference()
+    if hSRS.ImportFromWkt(pszWkt) != gdal.CE_None:
+        hSRS = None
 
-    else:
-        line = line + ("(%7.1f,%7.1f)" % (x, y ))
-        if verbose: print(line)
-        return x, y
+    if len(cache) >= _WKT_CACHE_SIZE:
+        cache.clear()
+    cache[pszWkt] = hSRS
+    return hSRS
+
+def _latLongTransform(pszWkt):
+    """
+    returns an osr.CoordinateTransformation from pszWkt to its geographic
+    coordinate system in (long, lat) order, or None. Transformations are
+    cached per thread by WKT because building them dominates the corner
+    report of small datasets.
+    """
+    cache = _threadCache('latlong')
+    if pszWkt in cache:
+        return cache[pszWkt]
 
-    # Report the georeferenced coordinates
-    if abs(dfGeoX) < 181 and abs(dfGeoY) < 91:
-        line += ( "(%12.7f,%12.7f) " % (dfGeoX, dfGeoY ))
+    hTransform = None
+    hProj = osr.SpatialReference( pszWkt )
+    hLatLong = hProj.CloneGeogCS()
+
+    if hLatLong is not None:
+        # GDAL >= 3 would otherwise return (lat, long) pairs
+        if hasattr(hLatLong, 'SetAxisMappingStrategy'):
+            hLatLong.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+            hProj.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+        gdal.PushErrorHandler( 'CPLQuietErrorHandler' )
+        hTransform = osr.CoordinateTransformation( hProj, hLatLong )
+        gdal.PopErrorHandler()
+        if gdal.GetLastErrorMsg().find( 'Unable to load PROJ.4 library' ) != -1:
+            hTransform = None
+
+    if len(cache) >= _WKT_CACHE_SIZE:
+        cache.clear()
+    cache[pszWkt] = hTransform
+    return hTransform
+
+_CORNERS = (('UpperLeft', 'Upper Left', 0.0, 0.0),
+            ('LowerLeft', 'Lower Left', 0.0, 1.0),
+            ('UpperRight', 'Upper Right', 1.0, 0.0),
+            ('LowerRight', 'Lower Right', 1.0, 1.0),
+            ('Center', 'Center', 0.5, 0.5))
+
+def _cornerReport(hDataset, adfGeoTransform, hTransform, verbose):
+    """
+    returns ({corner: (x, y)}, {corner: (long, lat)} or None) for the four
+    corners of hDataset. The corners and the center are transformed to
+    lat/long with a single TransformPoints call.
+    """
+    nXSize, nYSize = hDataset.RasterXSize, hDataset.RasterYSize
+    pixels = [(fx * nXSize, fy * nYSize) for _, _, fx, fy in _CORNERS]
 
+    if verbose: print("Corner Coordinates:")
+
+    if adfGeoTransform is None:
+        geo = pixels
     else:
-        line += ( "(%12.3f,%12.3f) " % (dfGeoX, dfGeoY ))
+        gt = adfGeoTransform
+        geo = [(gt[0] + gt[1] * x + gt[2] * y, gt[3] + gt[4] * x + gt[5] * y)
+               for x, y in pixels]
+    corners = dict((k, geo[i]) for i, (k, _, _, _) in enumerate(_CORNERS[:4]))
+
+    if adfGeoTransform is None:
+        if verbose:
+            for (_, name, _, _), (x, y) in zip(_CORNERS, pixels):
+                print("%-11s (%7.1f,%7.1f)" % (name, x, y))
+        return corners, None
 
-    # Transform to latlong and report
+    latlong = None
     if hTransform is not None:
-        pnt = hTransform.TransformPoint(dfGeoX, dfGeoY, 0)
-        if pnt is not None:
-            line += ( "(%s," % gdal.DecToDMS( pnt[0], "Long", 2 ) )
-            line += ( "%s)" % gdal.DecToDMS( pnt[1], "Lat", 2 ) )
+        latlong = hTransform.TransformPoints([(x, y, 0.0) for x, y in geo])
 
-        if verbose: print(line)
-    
-    return dfGeoX, dfGeoY
+    if verbose:
+        for i, (_, name, _, _) in enumerate(_CORNERS):
+            dfGeoX, dfGeoY = geo[i]
+            line = "%-11s " % name
+
+            # Report the georeferenced coordinates
+            if abs(dfGeoX) < 181 and abs(dfGeoY) < 91:
+                line += ( "(%12.7f,%12.7f) " % (dfGeoX, dfGeoY ))
+            else:
+                line += ( "(%12.3f,%12.3f) " % (dfGeoX, dfGeoY ))
+
+            # Report the lat/long coordinates
+            if latlong is not None:
+                line += ( "(%s," % gdal.DecToDMS( latlong[i][0], "Long", 2 ) )
+                line += ( "%s)" % gdal.DecToDMS( latlong[i][1], "Lat", 2 ) )
+
+            print(line)
+
+    if latlong is not None:
+        latlong = dict((k, tuple(latlong[i][:2]))
+                       for i, (k, _, _, _) in enumerate(_CORNERS[:4]))
+    return corners, latlong
+
+def _colorTableReport(hTable):
+    """
+    returns the color table as {'PaletteInterpretation': ..., 'Count': n,
+    'Entries': (n, 4) int16 array of c1, c2, c3, c4}. The bindings have no
+    bulk accessor, so each entry is fetched exactly once, straight into the
+    array.
+    """
+    nCount = hTable.GetCount()
+    entries = np.zeros((nCount, 4), dtype=np.int16)
+    for i in xrange(nCount):
+        entries[i] = hTable.GetColorEntry(i)
+
+    return {'PaletteInterpretation':
+                gdal.GetPaletteInterpretationName(
+                    hTable.GetPaletteInterpretation()),
+            'Count': nCount,
+            'Entries': entries}
+
+# names of the raster attribute table field types and usages
+_RAT_TYPES = {}
+_RAT_USAGES = {}
+for _name in dir(gdal):
+    if _name.startswith('GFT_'):
+        _RAT_TYPES[getattr(gdal, _name)] = _name[4:]
+    elif _name.startswith('GFU_') and _name != 'GFU_MaxCount':
+        _RAT_USAGES[getattr(gdal, _name)] = _name[4:]
+del _name
+
+def _ratColumn(hRAT, iCol):
+    """
+    returns the values of column iCol of hRAT as a 1D array. Strings are
+    decoded so the array serializes to JSON.
+    """
+    try:
+        values = hRAT.ReadAsArray(iCol)
+    except AttributeError:
+        # bindings older than GDAL 1.11 read one value at a time
+        nType = hRAT.GetTypeOfCol(iCol)
+        nRows = hRAT.GetRowCount()
+        if nType == gdal.GFT_Integer:
+            get = hRAT.GetValueAsInt
+        elif nType == gdal.GFT_Real:
+            get = hRAT.GetValueAsDouble
+        else:
+            get = hRAT.GetValueAsString
+        values = np.array([get(i, iCol) for i in xrange(nRows)])
+
+    if values.dtype.kind == 'S':
+        values = np.char.decode(values, 'utf-8')
+    return values
+
+def _ratReport(hRAT):
+    """
+    returns the raster attribute table as a columnar dict {'RowCount': n,
+    'Columns': [{'Name', 'Type', 'Usage', 'Values'}, ...]}. Each column is
+    read with a single ReadAsArray call.
+    """
+    columns = []
+    for iCol in xrange(hRAT.GetColumnCount()):
+        columns.append({'Name': hRAT.GetNameOfCol(iCol),
+                        'Type': _RAT_TYPES.get(hRAT.GetTypeOfCol(iCol)),
+                        'Usage': _RAT_USAGES.get(hRAT.GetUsageOfCol(iCol)),
+                        'Values': _ratColumn(hRAT, iCol)})
+
+    return {'RowCount': hRAT.GetRowCount(), 'Columns': columns}
 
 def _bandReport(hDataset, iBand, verbose, bComputeMinMax, bApproxStats,
                 bStats, bReportStemleaf, bComputeChecksum,
-                bShowMetadata, bShowRAT):
-    
+                bShowMetadata, bShowRAT, nThreads=None, bSample=False,
+                papszBandFields=None, bQuicklook=False, bShowColorTable=True,
+                oTimer=None):
+
+    if oTimer is None:
+        oTimer = _Timer(False)
+
     hBand = hDataset.GetRasterBand(iBand )
+
+    # Without printing, only the products of the requested fields are fetched
+    if not verbose and papszBandFields is not None:
+        bStats = bStats and 'Statistics' in papszBandFields
+        bComputeMinMax = bComputeMinMax and 'ComputedMinMax' in papszBandFields
+        bReportStemleaf = bReportStemleaf and 'Histogram' in papszBandFields
+        bComputeChecksum = bComputeChecksum and 'CheckSum' in papszBandFields
+        bShowMetadata = bShowMetadata and 'Metadata' in papszBandFields
+        bShowRAT = bShowRAT and 'RAT' in papszBandFields
+        bShowColorTable = bShowColorTable and 'ColorTable' in papszBandFields
     
     (nBlockXSize, nBlockYSize) = hBand.GetBlockSize()
     d_type = gdal.GetDataTypeName(hBand.DataType)
@@ -222,6 +1055,45 @@ def _bandReport(hDataset, iBand, verbose, bComputeMinMax, bApproxStats,
     if desc is not None and len(desc) > 0 and verbose:
         print( "  Description = %s" % desc )
 
+    # Stored statistics are used when available. Approximate statistics
+    # come from GDAL's overview/subsampling path (or the sampled scan with
+    # bSample) unless the pixels are scanned anyway. Anything else that has
+    # to be computed (exact statistics, min/max, histogram) comes from a
+    # single scan whose statistics are stored with the dataset.
+    stats = hBand.GetStatistics( bApproxStats, False)
+    bValidStats = stats is not None and stats[3] >= 0.0
+
+    # quick look histograms come from an overview instead of the scan
+    bScanHistogram = bReportStemleaf and not bQuicklook
+    bScanPixels = bComputeMinMax or bScanHistogram
+
+    if bStats and not bValidStats and bApproxStats and not bSample and \
+       not bScanPixels:
+        stats = hBand.GetStatistics( True, True )
+        bValidStats = stats is not None and stats[3] >= 0.0
+    oTimer.lap('StoredStatistics')
+
+    bScanStats = bScanPixels or (bStats and not bValidStats)
+
+    oScan = None
+    if bScanStats or bComputeChecksum:
+        oScan = _scanBand(hDataset, iBand, bStats=bScanStats,
+                          bHistogram=bScanHistogram,
+                          bChecksum=bComputeChecksum, bSample=bSample,
+                          nThreads=nThreads)
+    oTimer.lap('Scan')
+
+    # sampled estimates are reported but never stored with the dataset
+    sample = None
+    if oScan is not None:
+        sample = oScan.sample
+
+    if oScan is not None and oScan.n > 0 and bStats:
+        if not bValidStats and sample is None:
+            hBand.SetStatistics(oScan.min, oScan.max, oScan.mean, oScan.stddev)
+        stats = [oScan.min, oScan.max, oScan.mean, oScan.stddev]
+        bValidStats = True
+
     dfMin = hBand.GetMinimum()
     dfMax = hBand.GetMaximum()
     if dfMin is not None or dfMax is not None or bComputeMinMax:
@@ -232,44 +1104,73 @@ def _bandReport(hDataset, iBand, verbose, bComputeMinMax, bApproxStats,
         if dfMax is not None:
             line +=  ("Max=%.3f " % dfMax)
 
-        if bComputeMinMax:
-            gdal.ErrorReset()
-            adfCMinMax = hBand.ComputeRasterMinMax(False)
-            if gdal.GetLastErrorType() == gdal.CE_None:
-              line +=  ( "  Computed Min/Max=%.3f,%.3f" % ( \
-                      adfCMinMax[0], adfCMinMax[1] ))
+        if bComputeMinMax and oScan.n > 0:
+            line +=  ( "  Computed Min/Max=%.3f,%.3f" % ( \
+                      oScan.min, oScan.max ))
+            if sample is not None:
+                line +=  " (sampled)"
 
         if verbose: print(line)
 
-    stats = hBand.GetStatistics( bApproxStats, bStats)
-    # Dirty hack to recognize if stats are valid. If invalid, the returned
-    # stddev is negative
-    if stats[3] >= 0.0 and verbose:
+    adfCMinMax = None
+    if bComputeMinMax and oScan.n > 0:
+        adfCMinMax = (oScan.min, oScan.max)
+
+    if bValidStats and verbose and sample is not None:
+        print( "  Approximate Minimum=%.3f, Maximum=%.3f, "
+               "Mean=%.3f +/- %.3f, StdDev=%.3f +/- %.3f" % ( \
+                stats[0], stats[1], stats[2], sample['Mean'],
+                stats[3], sample['StdDev'] ))
+        print( "  Sampled %.1f%% of blocks (%d pixels), "
+               "errors are standard errors" % ( \
+                100.0 * sample['SampledFraction'], sample['SampledPixels'] ))
+
+    elif bValidStats and verbose:
         print( "  Minimum=%.3f, Maximum=%.3f, Mean=%.3f, StdDev=%.3f" % ( \
                 stats[0], stats[1], stats[2], stats[3] ))
 
+    hist = None
+    histSize = None
     if bReportStemleaf:
 
-        hist = hBand.GetDefaultHistogram(force=True, callback=gdal.TermProgress)
+        bByte = hBand.DataType == gdal.GDT_Byte
+        if bQuicklook:
+            oQuicklook, histSize, dfScale = _quicklookScan(hBand)
+            hist = oQuicklook.histogram(bByte=bByte, dfScale=dfScale)
+            if verbose:
+                print( "  Quick look histogram from %dx%d pixels" % histSize )
+        elif sample is not None:
+            hist = oScan.histogram(bByte=bByte, dfScale=sample['Scale'])
+        else:
+            # binned histograms of float bands are approximate and aren't
+            # stored as the default histogram of the dataset
+            hist = oScan.histogram(bByte=bByte)
+            if hist is not None and oScan.isHistogramExact(bByte=bByte):
+                hBand.SetDefaultHistogram(hist[0], hist[1], hist[3])
+
         if hist is not None and verbose:
-            dfMin = hist[0]
-            dfMax = hist[1]
+            dfHistMin = hist[0]
+            dfHistMax = hist[1]
             nBucketCount = hist[2]
             panHistogram = hist[3]
 
             _stemleafReport(panHistogram)
 
 #            print( "  %d buckets from %g to %g:" % ( \
-#                    nBucketCount, dfMin, dfMax ))
+#                    nBucketCount, dfHistMin, dfHistMax ))
 #            line = '  '
 #            for bucket in panHistogram:
 #                line +=  ("%d " % bucket)
 #
 #            if verbose: print(line)
 
-    checksum = hBand.Checksum()
-    if bComputeChecksum and verbose:
-        print( "  Checksum=%d" % checksum)
+    oTimer.lap('Histogram')
+
+    checksum = None
+    if bComputeChecksum:
+        checksum = oScan.checksum & 0xffff
+        if verbose:
+            print( "  Checksum=%d" % checksum)
     
     dfNoData = hBand.GetNoDataValue()
     if dfNoData is not None and verbose:
@@ -296,7 +1197,7 @@ def _bandReport(hDataset, iBand, verbose, bComputeMinMax, bApproxStats,
 
                 if pszResampling is not None \
                    and len(pszResampling) >= 12 \
-                   and EQUAL(pszResampling[0:12],"AVERAGE_BIT2"):
+                   and pszResampling[0:12].upper() == "AVERAGE_BIT2":
                     line +=  "*"
 
             else:
@@ -321,6 +1222,7 @@ def _bandReport(hDataset, iBand, verbose, bComputeMinMax, bApproxStats,
 
     if hBand.HasArbitraryOverviews() and verbose:
         print( "  Overviews: arbitrary" )
+    oTimer.lap('Overviews')
 
     nMaskFlags = hBand.GetMaskFlags()
     if (nMaskFlags & (gdal.GMF_NODATA|gdal.GMF_ALL_VALID)) == 0:
@@ -349,15 +1251,19 @@ def _bandReport(hDataset, iBand, verbose, bComputeMinMax, bApproxStats,
 
                 hOverview = hMaskBand.GetOverview( iOverview );
                 if hOverview is not None:
-                    line +=  ( "%d" % hOverview.Checksum())
+                    line +=  ( "%dx%d" % (hOverview.XSize, hOverview.YSize))
                 else:
                     line +=  "(null)"
+            if verbose: print(line)
+    oTimer.lap('Mask')
     
     unitType = hBand.GetUnitType()
     if len(unitType) > 0 and verbose:
         print( "  Unit Type: %s" % unitType)
 
-    papszCategories = hBand.GetRasterCategoryNames()
+    papszCategories = None
+    if verbose or papszBandFields is None or 'Categories:' in papszBandFields:
+        papszCategories = hBand.GetRasterCategoryNames()
     if papszCategories is not None and verbose:
         print( "  Categories:" );
         i = 0
@@ -365,7 +1271,7 @@ def _bandReport(hDataset, iBand, verbose, bComputeMinMax, bApproxStats,
             print( "    %3d: %s" % (i, category) )
             i += 1
 
-    if hBand.GetScale() != 1.0 or hBand.GetOffset() != 0.0 and verbose:
+    if (hBand.GetScale() != 1.0 or hBand.GetOffset() != 0.0) and verbose:
         print( "  Offset: %.15g,   Scale:%.15g" % \
                     ( hBand.GetOffset(), hBand.GetScale()))
 
@@ -387,7 +1293,15 @@ def _bandReport(hDataset, iBand, verbose, bComputeMinMax, bApproxStats,
         for metadata in papszMetadata:
             print( "    %s" % metadata )
 
-    hTable = hBand.GetRasterColorTable()
+    oTimer.lap('Metadata')
+
+    colorTable = None
+    hTable = None
+    if verbose or bShowColorTable:
+        hTable = hBand.GetRasterColorTable()
+    if hTable is not None and bShowColorTable:
+        colorTable = _colorTableReport(hTable)
+
     if hBand.GetRasterColorInterpretation() == gdal.GCI_PaletteIndex  \
         and hTable is not None and verbose:
 
@@ -397,200 +1311,485 @@ def _bandReport(hDataset, iBand, verbose, bComputeMinMax, bApproxStats,
                 hTable.GetCount() ))
 
         if bShowColorTable:
+            print( '\n'.join("  %3d: %d,%d,%d,%d" % ((i,) + tuple(sEntry))
+                             for i, sEntry in
+                             enumerate(colorTable['Entries'].tolist())) )
+
+    oTimer.lap('ColorTable')
 
-            for i in range(hTable.GetCount()):
-                sEntry = hTable.GetColorEntry(i)
-                print( "  %3d: %d,%d,%d,%d" % ( \
-                        i, \
-                        sEntry[0],\
-                        sEntry[1],\
-                        sEntry[2],\
-                        sEntry[3] ))
-               
+    rat = None
     if bShowRAT:
         hRAT = hBand.GetDefaultRAT()
+        if hRAT is not None:
+            rat = _ratReport(hRAT)
+    oTimer.lap('RAT')
 
-                    
-    return { 'BandNum': iBand,
+    bandDict = { 'BandNum': iBand,
              'BlockSize': (nBlockXSize, nBlockYSize),
              'Type': d_type,
              'ColorInterp': c_interp,
              'Minimum': dfMin,
              'Maximum': dfMax,
+             'Statistics': (None, stats)[bValidStats],
+             'ComputedMinMax': adfCMinMax,
+             'Histogram': hist,
+             'HistogramSize': histSize,
+             'SampleErrors': sample,
              'Description': desc,
              'CheckSum': checksum,
              'NoDataValue': dfNoData,
              'MaskFlags': nMaskFlags,
              'UnitType': unitType,
              'Categories:': papszCategories,
-             'Metadata': hBand.GetMetadata_Dict(),
-             'ColorTable': hTable,
-             'RAT': hBand.GetDefaultRAT()}
+             'Metadata': (None, hBand.GetMetadata_Dict())[bShowMetadata],
+             'ColorTable': colorTable,
+             'RAT': rat}
+
+    if papszBandFields is not None:
+        bandDict = dict((k, v) for k, v in bandDict.items()
+                        if k in papszBandFields or k == 'BandNum')
+    return bandDict
+
+def _selectFields(papszFields):
+    """
+    splits a field selector like ['Size', 'SRS', 'Bands.Statistics'] into the
+    set of top level keys and the set of band keys. None selects everything.
+    Selecting 'Bands' selects every band key.
+    """
+    if papszFields is None:
+        return None, None
+
+    fields, bandFields = set(), set()
+    for field in papszFields:
+        if field.startswith('Bands.'):
+            fields.add('Bands')
+            bandFields.add(field[6:])
+        else:
+            fields.add(field)
+
+    if 'Bands' in papszFields:
+        bandFields = None
+    return fields, bandFields
+
+def _srsReport(hSRS):
+    """
+    describes hSRS without any text round trip: the EPSG code when the
+    definition carries one and the PROJJSON definition (GDAL >= 3.1)
+    """
+    srsDict = {'EPSG': None, 'PROJJSON': None}
+
+    if hSRS.GetAuthorityName(None) == 'EPSG':
+        srsDict['EPSG'] = int(hSRS.GetAuthorityCode(None))
+
+    if hasattr(hSRS, 'ExportToPROJJSON'):
+        srsDict['PROJJSON'] = json.loads(hSRS.ExportToPROJJSON())
+
+    return srsDict
+
+def _profileStart():
+    """
+    resets GDAL's network statistics (GDAL >= 3.2) and returns the number
+    of bytes in GDAL's block cache before a profiled run
+    """
+    if hasattr(gdal, 'NetworkStatsReset'):
+        gdal.SetConfigOption('CPL_VSIL_NETWORK_STATS_ENABLED', 'YES')
+        gdal.NetworkStatsReset()
+    return gdal.GetCacheUsed()
+
+def _profileReport(oTimer, bandTimes, nCacheUsed, verbose):
+    """
+    returns the seconds spent in each phase of a ydalinfo run and of each
+    band together with the GDAL block cache usage and, for /vsicurl/ and
+    the other network file systems, the bytes they downloaded
+    """
+    profile = OrderedDict(oTimer.times)
+    profile['Total'] = sum(oTimer.times.values())
+    profile['BandPhases'] = bandTimes
+
+    nCacheMax = gdal.GetCacheMax()
+    nCacheNow = gdal.GetCacheUsed()
+    profile['Cache'] = {'Max': nCacheMax, 'Used': nCacheNow,
+                        'Growth': nCacheNow - nCacheUsed}
 
+    if hasattr(gdal, 'NetworkStatsGetAsSerializedJSON'):
+        pszStats = gdal.NetworkStatsGetAsSerializedJSON()
+        profile['Network'] = json.loads(pszStats) if pszStats else None
+
+    if verbose:
+        print( "Profile (seconds):" )
+        print( "  " + " ".join("%s=%.3f" % (k, v) for k, v in
+                               oTimer.times.items()) )
+        for iBand, times in enumerate(bandTimes):
+            print( "  Band %d: " % (iBand + 1) +
+                   " ".join("%s=%.3f" % (k, v) for k, v in times.items()) )
+        print( "  Total=%.3f" % profile['Total'] )
+        print( "  GDAL block cache: %.1f of %.1f MB used (%+.1f MB)" % ( \
+                nCacheNow / 1048576.0, nCacheMax / 1048576.0,
+                (nCacheNow - nCacheUsed) / 1048576.0 ))
+
+    return profile
 
 def ydalinfo(pszFilename, bComputeMinMax=False, bSample=False,
              bShowGCPs=True, bShowMetadata=True, bShowRAT=True,
              bStats=False, bApproxStats=True, bShowColorTable=True,
              bComputeChecksum=False, bReportStemleaf=False,
              papszExtraMDDomains=None, pszProjection=None, hTransform=None,
-             bShowFileList=True, bJson=False, verbose=False):
+             bShowFileList=True, bJson=False, verbose=False, nThreads=None,
+             papszFields=None, bQuicklook=False, bProfile=False):
         
-    if papszExtraMDDomains is None:
-        papszExtraMDDomains = []
+    oTimer = _Timer(bProfile)
+    if bProfile:
+        pszNetworkStats = gdal.GetConfigOption('CPL_VSIL_NETWORK_STATS_ENABLED')
+        nCacheUsed = _profileStart()
 
+    try:
+        if papszExtraMDDomains is None:
+            papszExtraMDDomains = []
 
-    jsonDict = {'DatasetName' : pszFilename}
-    hDataset = gdal.Open( pszFilename, gdal.GA_ReadOnly )
+        # field selector, None reports everything
+        fields, bandFields = _selectFields(papszFields)
+        bWant = lambda key: fields is None or key in fields
 
-    if hDataset is None:
-        if verbose:
+
+        jsonDict = {'DatasetName' : pszFilename}
+        hDataset = gdal.Open( pszFilename, gdal.GA_ReadOnly )
+
+        if hDataset is None:
             msg = "ydalinfo failed - unable to open '%s'." % pszFilename
-            print(msg)
-            return
-        raise Exception(msg)    
+            if verbose:
+                print(msg)
+                return
+            raise Exception(msg)    
+        oTimer.lap('Open')
     
-    # Driver
-    hDriver = hDataset.GetDriver()
-    jsonDict['Driver'] = {'ShortName': hDriver.ShortName,
-                          'LongName': hDriver.LongName,
-                          'Metadata': hDriver.GetMetadata_Dict()}
+        # Driver
+        hDriver = hDataset.GetDriver()
+        if bWant('Driver'):
+            jsonDict['Driver'] = {'ShortName': hDriver.ShortName,
+                                  'LongName': hDriver.LongName,
+                                  'Metadata': hDriver.GetMetadata_Dict()}
     
-#    xml_str = jsonDict['Driver']['Metadata'].get('DMD_CREATIONOPTIONLIST', '')
-#    pretty_xml = xml.dom.minidom.parseString(xml_str).toprettyxml()
-#   jsonDict['Driver']['Metadata']['DMD_CREATIONOPTIONLIST'] = pretty_xml
+    #    xml_str = jsonDict['Driver']['Metadata'].get('DMD_CREATIONOPTIONLIST', '')
+    #    pretty_xml = xml.dom.minidom.parseString(xml_str).toprettyxml()
+    #   jsonDict['Driver']['Metadata']['DMD_CREATIONOPTIONLIST'] = pretty_xml
     
-    if verbose:
-        print("Driver: %s/%s" % (hDriver.ShortName, hDriver.LongName))
-
-    # FileList
-    papszFileList = hDataset.GetFileList()
-    jsonDict['FileList'] = papszFileList
+        if verbose:
+            print("Driver: %s/%s" % (hDriver.ShortName, hDriver.LongName))
+        oTimer.lap('Driver')
+
+        # FileList (may list a whole directory, so only when needed)
+        if bWant('FileList') or (bShowFileList and verbose):
+            papszFileList = hDataset.GetFileList()
+        if bWant('FileList'):
+            jsonDict['FileList'] = papszFileList
     
-    if bShowFileList and verbose:
-        if papszFileList is None or len(papszFileList) == 0:
-            print( "Files: none associated" )
-        else:
-            print( "Files: %s" % papszFileList[0] )
-            for i in xrange(1, len(papszFileList)):
-                print( "       %s" % papszFileList[i] )
+        if bShowFileList and verbose:
+            if papszFileList is None or len(papszFileList) == 0:
+                print( "Files: none associated" )
+            else:
+                print( "Files: %s" % papszFileList[0] )
+                for i in xrange(1, len(papszFileList)):
+                    print( "       %s" % papszFileList[i] )
+        oTimer.lap('FileList')
     
-    # Size      
-    jsonDict['Size'] = [hDataset.RasterXSize, hDataset.RasterYSize]
+        # Size      
+        if bWant('Size'):
+            jsonDict['Size'] = [hDataset.RasterXSize, hDataset.RasterYSize]
     
-    if verbose:
-        print( "Size is %d, %d" % (hDataset.RasterXSize, hDataset.RasterYSize))
+        if verbose:
+            print( "Size is %d, %d" % (hDataset.RasterXSize, hDataset.RasterYSize))
 
-    #Projection
-    pszProjection = hDataset.GetProjectionRef()
-    if pszProjection is not None:
+        #Projection
+        pszPrettyWkt = None
+        pszProjection = hDataset.GetProjectionRef()
+        if pszProjection is not None:
 
-        hSRS = osr.SpatialReference()
-        if hSRS.ImportFromWkt(pszProjection ) == gdal.CE_None:
-            pszPrettyWkt = hSRS.ExportToPrettyWkt(False)
+            hSRS = _spatialReference(pszProjection)
+            if hSRS is not None:
+                if bWant('CoordinateSystem'):
+                    jsonDict['CoordinateSystem'] = \
+                        _parseProjectionWkt(pszProjection)
+                if bWant('SRS'):
+                    jsonDict['SRS'] = _srsReport(hSRS)
+
+                if verbose:
+                    pszPrettyWkt = hSRS.ExportToPrettyWkt(False)
+                    print( "Coordinate System is:\n%s" % pszPrettyWkt )
+            else:
+                if verbose:
+                    print( "Coordinate System is `%s'" % pszProjection )
+
+        if bWant('SRS'):
+            jsonDict.setdefault('SRS', None)
+        if bWant('CoordinateSystem'):
+            jsonDict.setdefault('CoordinateSystem', None)
+        oTimer.lap('SRS')
+
+        # Geotransform
+        adfGeoTransform = hDataset.GetGeoTransform(can_return_null = True)
+        if bWant('Geotransform'):
+            jsonDict['Geotransform'] = adfGeoTransform
+    
+        if adfGeoTransform is not None and verbose:
 
-            if verbose:
-                print( "Coordinate System is:\n%s" % pszPrettyWkt )
-        else:
-            if verbose:
-                print( "Coordinate System is `%s'" % pszProjection )
-            
-    jsonDict['CoordinateSystem'] = _parseProjectionWkt(pszPrettyWkt)
+            if adfGeoTransform[2] == 0.0 and adfGeoTransform[4] == 0.0:
+                print( "Origin = (%.15f,%.15f)" % ( \
+                        adfGeoTransform[0], adfGeoTransform[3] ))
 
-    # Geotransform
-    adfGeoTransform = hDataset.GetGeoTransform(can_return_null = True)
-    jsonDict['Geotransform'] = adfGeoTransform
-    
-    if adfGeoTransform is not None and verbose:
+                print( "Pixel Size = (%.15f,%.15f)" % ( \
+                        adfGeoTransform[1], adfGeoTransform[5] ))
+
+            else:
+                print( "GeoTransform =\n" \
+                        "  %.16g, %.16g, %.16g\n" \
+                        "  %.16g, %.16g, %.16g" % ( \
+                        adfGeoTransform[0], \
+                        adfGeoTransform[1], \
+                        adfGeoTransform[2], \
+                        adfGeoTransform[3], \
+                        adfGeoTransform[4], \
+                        adfGeoTransform[5] ))
+
+        # GCPs
+        if bShowGCPs and hDataset.GetGCPCount() > 0 and verbose:
+
+            pszProjection = hDataset.GetGCPProjection()
+            if pszProjection is not None:
+
+                hSRS = osr.SpatialReference()
+                if hSRS.ImportFromWkt(pszProjection ) == gdal.CE_None:
+                    pszPrettyWkt = hSRS.ExportToPrettyWkt(False)
+                    print( "GCP Projection = \n%s" % pszPrettyWkt )
 
-        if adfGeoTransform[2] == 0.0 and adfGeoTransform[4] == 0.0:
-            print( "Origin = (%.15f,%.15f)" % ( \
-                    adfGeoTransform[0], adfGeoTransform[3] ))
+                else:
+                    print( "GCP Projection = %s" % \
+                            pszProjection )
 
-            print( "Pixel Size = (%.15f,%.15f)" % ( \
-                    adfGeoTransform[1], adfGeoTransform[5] ))
+            gcps = hDataset.GetGCPs()
+        
+            if verbose:
+                i = 0
+                for gcp in gcps:
+
+                    print( "GCP[%3d]: Id=%s, Info=%s\n" \
+                            "          (%.15g,%.15g) -> (%.15g,%.15g,%.15g)" % ( \
+                            i, gcp.Id, gcp.Info, \
+                            gcp.GCPPixel, gcp.GCPLine, \
+                            gcp.GCPX, gcp.GCPY, gcp.GCPZ ))
+                    i = i + 1
+
+        oTimer.lap('GCPs')
+
+        # Metadata
+        if bShowMetadata and verbose:
+            _metadataReport(hDataset, papszExtraMDDomains)
+        oTimer.lap('Metadata')
+        
+        # Setup projected to lat/long transform if appropriate.
+        bLatLong = verbose or bWant('CornerCoordinatesLatLong')
+        if bLatLong and pszProjection is not None and len(pszProjection) > 0:
+            hTransform = _latLongTransform(pszProjection)
+
+        # Corners
+        corners, latlong = _cornerReport(hDataset, adfGeoTransform, hTransform,
+                                         verbose)
+        if bWant('CornerCoordinates'):
+            jsonDict['CornerCoordinates'] = corners
+
+        if bWant('CornerCoordinatesLatLong'):
+            jsonDict['CornerCoordinatesLatLong'] = latlong
+        oTimer.lap('Corners')
+    
+        bandTimes = []
+        if verbose or bWant('Bands'):
+            jsonDict['Bands'] = []
+            # Loop over bands
+            for iBand in xrange(1, hDataset.RasterCount + 1):
+                oBandTimer = _Timer(bProfile)
+                bandopts = [hDataset, iBand, verbose, bComputeMinMax, bApproxStats,
+                            bStats, bReportStemleaf, bComputeChecksum,
+                            bShowMetadata, bShowRAT, nThreads, bSample, bandFields,
+                            bQuicklook, bShowColorTable, oBandTimer]
+                jsonDict['Bands'].append(_bandReport(*bandopts))
+                bandTimes.append(oBandTimer.times)
+        oTimer.lap('Bands')
+
+        if bProfile:
+            jsonDict['Profile'] = _profileReport(oTimer, bandTimes, nCacheUsed,
+                                                 verbose)
+
+        if bJson:
+            print(json.dumps(jsonDict, default=_jsonDefault))
+        return jsonDict
+    finally:
+        if bProfile:
+            gdal.SetConfigOption('CPL_VSIL_NETWORK_STATS_ENABLED',
+                                 pszNetworkStats)
+
+def _jsonDefault(obj):
+    """
+    json.dumps fallback for the values in jsonDict that aren't plain python.
+    Objects JSON can't represent (e.g. GDAL handles) are written as null.
+    """
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return obj.tolist()
+    return None
 
+def _expandPaths(papszPatterns):
+    """
+    yields the datasetnames matching each glob pattern. Names without glob
+    characters are passed through unchanged so GDAL virtual file system
+    paths (e.g. /vsicurl/) still work.
+    """
+    for pszPattern in papszPatterns:
+        if any(c in pszPattern for c in '*?['):
+            for pszFilename in sorted(glob(pszPattern)):
+                yield pszFilename
         else:
-            print( "GeoTransform =\n" \
-                    "  %.16g, %.16g, %.16g\n" \
-                    "  %.16g, %.16g, %.16g" % ( \
-                    adfGeoTransform[0], \
-                    adfGeoTransform[1], \
-                    adfGeoTransform[2], \
-                    adfGeoTransform[3], \
-                    adfGeoTransform[4], \
-                    adfGeoTransform[5] ))
-
-    # GCPs
-    if bShowGCPs and hDataset.GetGCPCount() > 0 and verbose:
-
-        pszProjection = hDataset.GetGCPProjection()
-        if pszProjection is not None:
+            yield pszPattern
+
+def configureGdal(nCacheMB=None, nReadAheadKB=None):
+    """
+    sets the size of GDAL's block cache (nCacheMB) and how much is fetched
+    per request by /vsicurl/ and the cloud file systems built on it
+    (nReadAheadKB). GDAL's defaults are kept for the values that are None.
+    These are process wide settings (the -cache and -readahead options)
+    shared by every dataset the process reads.
+    """
+    if nCacheMB is not None:
+        gdal.SetCacheMax(int(nCacheMB) * 1024 * 1024)
+    if nReadAheadKB is not None:
+        gdal.SetConfigOption('CPL_VSIL_CURL_CHUNK_SIZE',
+                             str(int(nReadAheadKB) * 1024))
+
+def _batchInit(nCacheMB=None, nReadAheadKB=None):
+    # runs once per worker process, not once per dataset
+    gdal.AllRegister()
+    configureGdal(nCacheMB, nReadAheadKB)
+
+def _batchWorker(args):
+    pszFilename, kwargs = args
+    try:
+        jsonDict = ydalinfo(pszFilename, **kwargs)
+    except Exception as e:
+        jsonDict = {'DatasetName': pszFilename, 'Error': str(e)}
+    return json.dumps(jsonDict, default=_jsonDefault)
+
+def _batchLines(papszPatterns, nProcesses=None, nProbes=None,
+                nCacheMB=None, nReadAheadKB=None, **kwargs):
+    """
+    yields one JSON encoded ydalinfo report per dataset as the workers
+    complete them. The workers are nProcesses processes, or nProbes threads
+    of this process when nProbes is given.
+    """
+    kwargs['verbose'] = False
+    kwargs['bJson'] = False
+    if kwargs.get('nThreads') is None:
+        kwargs['nThreads'] = 1
+
+    tasks = ((pszFilename, kwargs)
+             for pszFilename in _expandPaths(papszPatterns))
+
+    if nProbes is not None:
+        # GDAL's cache and network counters would mix concurrent datasets
+        if kwargs.get('bProfile'):
+            warnings.warn('profiling is disabled when datasets are probed '
+                          'concurrently')
+            kwargs['bProfile'] = False
+        configureGdal(nCacheMB, nReadAheadKB)
+        pool = ThreadPool(nProbes)
+    else:
+        pool = Pool(nProcesses, _batchInit, (nCacheMB, nReadAheadKB))
+    bDone = False
+    try:
+        for line in pool.imap_unordered(_batchWorker, tasks):
+            yield line
+        bDone = True
+    finally:
+        if bDone:
+            pool.close()
+        else:
+            pool.terminate()
+        pool.join()
 
-            hSRS = osr.SpatialReference()
-            if hSRS.ImportFromWkt(pszProjection ) == gdal.CE_None:
-                pszPrettyWkt = hSRS.ExportToPrettyWkt(False)
-                print( "GCP Projection = \n%s" % pszPrettyWkt )
+def ydalinfo_batch(papszPatterns, nProcesses=None, **kwargs):
+    """
+    Runs ydalinfo over every dataset matching papszPatterns (datasetnames or
+    glob patterns) in a pool of nProcesses worker processes and yields the
+    returned dicts in the order they complete. Datasets that can't be read
+    yield {'DatasetName': ..., 'Error': ...}.
+
+    Remote datasets (/vsicurl/ urls, network shares) are bound by latency
+    rather than cpu. For those pass nProbes to probe that many datasets at
+    a time from threads of this process instead. nCacheMB sets GDAL's block
+    cache and nReadAheadKB the size of each /vsicurl/ request.
+
+    kwargs are passed to ydalinfo. They must be picklable, so hTransform
+    can't be given. Values JSON can't represent come back as None.
+    """
+    for line in _batchLines(papszPatterns, nProcesses, **kwargs):
+        yield json.loads(line)
 
-            else:
-                print( "GCP Projection = %s" % \
-                        pszProjection )
+# ydalinfo_async runs at most this many datasets at a time
+_PROBE_THREADS = 16
 
-        gcps = hDataset.GetGCPs()
-        
-        if verbose:
-            i = 0
-            for gcp in gcps:
-
-                print( "GCP[%3d]: Id=%s, Info=%s\n" \
-                        "          (%.15g,%.15g) -> (%.15g,%.15g,%.15g)" % ( \
-                        i, gcp.Id, gcp.Info, \
-                        gcp.GCPPixel, gcp.GCPLine, \
-                        gcp.GCPX, gcp.GCPY, gcp.GCPZ ))
-                i = i + 1
-
-    # Metadata
-    if bShowMetadata and verbose:
-        _metadataReport(hDataset, papszExtraMDDomains)
-        
-    # Setup projected to lat/long transform if appropriate.
-    if pszProjection is not None and len(pszProjection) > 0:
-        hProj = osr.SpatialReference( pszProjection )
-        if hProj is not None:
-            hLatLong = hProj.CloneGeogCS()
-
-        if hLatLong is not None:
-            gdal.PushErrorHandler( 'CPLQuietErrorHandler' )
-            hTransform = osr.CoordinateTransformation( hProj, hLatLong )
-            gdal.PopErrorHandler()
-            if gdal.GetLastErrorMsg().find( 'Unable to load PROJ.4 library' ) != -1:
-                hTransform = None
-
-    # Corners
-    if verbose: print("Corner Coordinates:")
-    x, y = hDataset.RasterXSize, hDataset.RasterYSize
-    ul = _coordinateReport( hDataset, hTransform, "Upper Left", 0.0, 0.0, verbose)
-    ll = _coordinateReport( hDataset, hTransform, "Lower Left", 0.0, y, verbose)
-    ur = _coordinateReport( hDataset, hTransform, "Upper Right", x, 0.0, verbose)
-    lr = _coordinateReport( hDataset, hTransform, "Lower Right", x, y, verbose)
-    _coordinateReport( hDataset, hTransform, "Center", x/2.0, y/2.0, verbose)
+_probeExecutor = None
+_probeLock = threading.Lock()
 
-    
-    jsonDict['CornerCoordinates'] = { 'UpperLeft': ul,
-                                      'LowerLeft': ll,
-                                      'UpperRight': ur,
-                                      'LowerRight': lr }
-    
-    jsonDict['Bands'] = []
-    # Loop over bands
-    for iBand in xrange(1, hDataset.RasterCount + 1):
-        bandopts = [hDataset, iBand, verbose, bComputeMinMax, bApproxStats,
-                    bStats, bReportStemleaf, bComputeChecksum,
-                    bShowMetadata, bShowRAT]
-        jsonDict['Bands'].append(_bandReport(*bandopts))
-
-    if bJson:
-        print(json.dumps(jsonDict))
-    return jsonDict
+def _probes():
+    """
+    returns the thread pool shared by the ydalinfo_async calls
+    """
+    global _probeExecutor
+    with _probeLock:
+        if _probeExecutor is None:
+            _probeExecutor = ThreadPoolExecutor(_PROBE_THREADS)
+    return _probeExecutor
+
+def ydalinfo_async(pszFilename, executor=None, loop=None, nCacheMB=None,
+                   nReadAheadKB=None, **kwargs):
+    """
+    asyncio flavour of ydalinfo for latency bound datasets (/vsicurl/ urls,
+    network shares). The blocking GDAL calls run in a pool of _PROBE_THREADS
+    threads (or in executor) so at most that many datasets are probed at
+    once. Returns an awaitable that resolves to the jsonDict. Requires
+    python 3.7, loop defaults to the running loop.
+
+    Usage
+    -----
+
+    async def inventory(urls):
+        return await asyncio.gather(*[ydalinfo_async(url, nReadAheadKB=256)
+                                      for url in urls])
+
+    nCacheMB and nReadAheadKB are passed to configureGdal. They change
+    process wide settings, so they apply to every probe from then on.
+    kwargs are passed to ydalinfo. Datasets run concurrently, so bProfile
+    is ignored (see _batchLines).
+    """
+    if asyncio is None:
+        raise ImportError('ydalinfo_async requires asyncio (python 3)')
+
+    if kwargs.get('bProfile'):
+        warnings.warn('profiling is disabled when datasets are probed '
+                      'concurrently')
+        kwargs['bProfile'] = False
+
+    kwargs['verbose'] = False
+    kwargs['bJson'] = False
+    if kwargs.get('nThreads') is None:
+        kwargs['nThreads'] = 1
+
+    if nCacheMB is not None or nReadAheadKB is not None:
+        configureGdal(nCacheMB, nReadAheadKB)
+
+    if executor is None:
+        executor = _probes()
+    if loop is None:
+        loop = asyncio.get_running_loop()
+    return loop.run_in_executor(executor,
+                                functools.partial(ydalinfo, pszFilename,
+                                                  **kwargs))
 
 if __name__ == '__main__':
     version_num = int(gdal.VersionInfo('VERSION_NUM'))
@@ -611,13 +1810,23 @@ if __name__ == '__main__':
     bShowColorTable = True
     bComputeChecksum = False
     bReportStemleaf = False
+    bQuicklook = False
+    bProfile = False
     pszFilename = None
+    papszFilenames = []
     papszExtraMDDomains = []
     pszProjection = None
     hTransform = None
     bShowFileList = True
     bVerbose = True
     bJson = False
+    nThreads = None
+    papszFields = None
+    bBatch = False
+    nProcesses = None
+    nProbes = None
+    nCacheMB = None
+    nReadAheadKB = None
 
     # Parse arguments.
     i, nArgc = 1, len(argv)
@@ -631,15 +1840,24 @@ if __name__ == '__main__':
             bComputeMinMax = True
         elif lwr_arg == "-stemleaf":
             bReportStemleaf = True
+        elif lwr_arg == "-quicklook":
+            bReportStemleaf = True
+            bQuicklook = True
+        elif lwr_arg == "-profile":
+            bProfile = True
         elif lwr_arg == "-json":
             bVerbose = False
             bJson = True
         elif lwr_arg == "-nostats":
             bStats = False
             bApproxStats = False
+        elif lwr_arg == "-stats":
+            bStats = True
+            bApproxStats = False
         elif lwr_arg == "-approx_stats":
             bStats = True
             bApproxStats = True
+            bSample = True
         elif lwr_arg == "-sample":
             bSample = True
         elif lwr_arg == "-checksum":
@@ -657,19 +1875,68 @@ if __name__ == '__main__':
             papszExtraMDDomains.append( argv[i] )
         elif lwr_arg == "-nofl":
             bShowFileList = False
+        elif lwr_arg == "-threads" and i < nArgc-1:
+            i += 1
+            nThreads = int(argv[i])
+        elif lwr_arg == "-jsonl":
+            bBatch = True
+        elif lwr_arg == "-fields" and i < nArgc-1:
+            i += 1
+            papszFields = argv[i].split(',')
+        elif lwr_arg == "-processes" and i < nArgc-1:
+            i += 1
+            nProcesses = int(argv[i])
+        elif lwr_arg == "-probes" and i < nArgc-1:
+            i += 1
+            nProbes = int(argv[i])
+        elif lwr_arg == "-cache" and i < nArgc-1:
+            i += 1
+            nCacheMB = int(argv[i])
+        elif lwr_arg == "-readahead" and i < nArgc-1:
+            i += 1
+            nReadAheadKB = int(argv[i])
+        elif lwr_arg == "-filelist" and i < nArgc-1:
+            i += 1
+            with open(argv[i]) as f:
+                papszFilenames.extend(L.strip() for L in f if L.strip())
         elif argv[i][0] == '-':
             warnings.warn("Do not understand '%s' flag"%argv[i])
-        elif pszFilename is None:
-            pszFilename = argv[i]
         else:
-            warnings.warn("Could not parse '%s'"%argv[i])
+            papszFilenames.append(argv[i])
         
         i += 1
 
-    if pszFilename is None:
+    if len(papszFilenames) == 0:
         print(__doc__)
         sys.exit()
-    
+
+    if bBatch or len(papszFilenames) > 1:
+        for line in _batchLines(papszFilenames, nProcesses,
+                                nProbes=nProbes,
+                                nCacheMB=nCacheMB,
+                                nReadAheadKB=nReadAheadKB,
+                                bComputeMinMax=bComputeMinMax,
+                                bSample=bSample,
+                                bShowGCPs=bShowGCPs,
+                                bShowMetadata=bShowMetadata,
+                                bShowRAT=bShowRAT,
+                                bStats=bStats,
+                                bApproxStats=bApproxStats,
+                                bShowColorTable=bShowColorTable,
+                                bComputeChecksum=bComputeChecksum,
+                                bReportStemleaf=bReportStemleaf,
+                                bQuicklook=bQuicklook,
+                                bProfile=bProfile,
+                                papszExtraMDDomains=papszExtraMDDomains,
+                                bShowFileList=bShowFileList,
+                                nThreads=nThreads,
+                                papszFields=papszFields):
+            sys.stdout.write(line + '\n')
+            sys.stdout.flush()
+        sys.exit()
+
+    configureGdal(nCacheMB, nReadAheadKB)
+    pszFilename = papszFilenames[0]
     ydalinfo(pszFilename, 
              bComputeMinMax=bComputeMinMax, 
              bSample=bSample, 
@@ -681,9 +1948,13 @@ if __name__ == '__main__':
              bShowColorTable=bShowColorTable, 
              bComputeChecksum=bComputeChecksum, 
              bReportStemleaf=bReportStemleaf, 
+             bQuicklook=bQuicklook,
+             bProfile=bProfile,
              papszExtraMDDomains=papszExtraMDDomains, 
              pszProjection=pszProjection, 
              hTransform=hTransform, 
              bShowFileList=bShowFileList,
              bJson=bJson,
-             verbose=bVerbose)
+             verbose=bVerbose,
+             nThreads=nThreads,
+             papszFields=papszFields)